@@ -172,7 +172,6 @@ except:
     )
 import random
 import warnings
-from functools import wraps
 from math import fabs, floor
 
 try:  # Because Raspberry Pi is still on 3.4....
@@ -246,65 +245,6 @@ def timer_stop():
     return int(g_time_delta * 1000)
 
 
-def _timeit(func):
-    """
-    Put @_timeit as a decorator to a function to get the time spent in that function printed out
-
-    :param func: Decorated function
-    :type func:
-    :return:     Execution time for the decorated function
-    :rtype:
-    """
-
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        end = time.time()
-        print("{} executed in {:.4f} seconds".format(func.__name__, end - start))
-        return result
-
-    return wrapper
-
-
-_timeit_counter = 0
-MAX_TIMEIT_COUNT = 1000
-_timeit_total = 0
-
-
-def _timeit_summary(func):
-    """
-    Same as the timeit decorator except that the value is shown as an averave
-    Put @_timeit_summary as a decorator to a function to get the time spent in that function printed out
-
-    :param func: Decorated function
-    :type func:
-    :return:     Execution time for the decorated function
-    :rtype:
-    """
-
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        global _timeit_counter, _timeit_total
-
-        start = time.time()
-        result = func(*args, **kwargs)
-        end = time.time()
-        _timeit_counter += 1
-        _timeit_total += end - start
-        if _timeit_counter > MAX_TIMEIT_COUNT:
-            print(
-                "{} executed in {:.4f} seconds".format(
-                    func.__name__, _timeit_total / MAX_TIMEIT_COUNT
-                )
-            )
-            _timeit_counter = 0
-            _timeit_total = 0
-        return result
-
-    return wrapper
-
-
 def running_linux():
     """
     Determines the OS is Linux by using sys.platform
@@ -13181,7 +13121,6 @@ class Window:
             should_submit_window = False
         return should_submit_window
 
-    # @_timeit_summary
     def read(self, timeout=None, timeout_key=TIMEOUT_KEY, close=False):
         """
         THE biggest deal method in the Window class! This is how you get all of your data from your Window.
@@ -13257,7 +13196,6 @@ class Window:
 
         return results
 
-    # @_timeit
     def _read(self, timeout=None, timeout_key=TIMEOUT_KEY):
         """
         THE biggest deal method in the Window class! This is how you get all of your data from your Window.
@@ -19207,7 +19145,6 @@ def _make_ttk_scrollbar(element, orientation, window):
 #     root.mainloop()
 
 
-# @_timeit
 def PackFormIntoFrame(form, containing_frame, toplevel_form):
     """
 
@@ -0,0 +1,101 @@
+"""
+A global bandwidth budget shared by all running download jobs.
+
+The audio itself is fetched by yt-dlp inside each spotdl process, so the only
+place a rate can be enforced is yt-dlp's own ``--limit-rate``, a token bucket
+per download.  ``BandwidthBudget`` splits one global budget into per-job
+shares and each share over the job's download threads, and turns that into
+the ``--yt-dlp-args`` of the job.  Jobs get equal shares so a playlist with
+many threads cannot starve one with few.
+
+A running spotdl process cannot change its rate, so ``DownloadQueue`` applies
+a new share by restarting the job, which then resumes from its journal.
+"""
+
+import shlex
+from typing import List, Mapping, Optional
+
+# spotdl downloads this many tracks at once unless told otherwise
+DEFAULT_THREADS = 4
+MIN_RATE = 16 * 1024
+
+
+def threads_of(options: List[str]) -> int:
+    """Returns the ``--threads`` of a spotdl argument list."""
+    for option in options:
+        if option.startswith("--threads="):
+            return max(1, int(option.split("=", 1)[1]))
+    return DEFAULT_THREADS
+
+
+def with_rate_limit(options: List[str], rate: Optional[int]) -> List[str]:
+    """
+    Returns ``options`` with ``--limit-rate`` added to the yt-dlp arguments,
+    keeping any yt-dlp arguments the user gave.
+
+    :param rate: (int, optional) Bytes per second per download, None for no limit.
+    :raises ValueError: If the yt-dlp arguments have an unbalanced quote.
+    """
+    if rate is None:
+        return options
+    extra = []
+    result = []
+    for option in options:
+        if option.startswith("--yt-dlp-args="):
+            try:
+                extra = shlex.split(option.split("=", 1)[1])
+            except ValueError as e:  # e.g. a job resumed from an old journal
+                raise ValueError(f"Yt dlp args are not valid arguments: {e}")
+        else:
+            result.append(option)
+    if "--limit-rate" in extra:
+        del extra[extra.index("--limit-rate") : extra.index("--limit-rate") + 2]
+    extra += ["--limit-rate", str(rate)]
+    return result + ["--yt-dlp-args=" + shlex.join(extra)]
+
+
+class BandwidthBudget:
+    """Divides ``limit`` bytes per second between download jobs."""
+
+    def __init__(self, limit: Optional[int] = None, tolerance: float = 1.5):
+        """
+        :param limit: (int, optional) Total bytes per second, None for no limit.
+        :param tolerance: (float) How far a running job's rate may drift from its
+            share, as a factor, before it is worth restarting the job.
+        """
+        self.limit = limit or None
+        self.tolerance = tolerance
+
+    def rate(self, jobs: int, threads: int) -> Optional[int]:
+        """
+        Returns the ``--limit-rate`` for one download thread of a job when
+        ``jobs`` jobs share the budget, or None when there is no limit.
+        """
+        if self.limit is None:
+            return None
+        return max(MIN_RATE, self.limit // max(1, jobs) // max(1, threads))
+
+    def needs_restart(self, current: Optional[int], share: Optional[int]) -> bool:
+        """True if a job running at ``current`` is far enough from ``share``."""
+        if current is None or share is None:
+            return current != share
+        return current > share * self.tolerance or current * self.tolerance < share
+
+    def stale(
+        self,
+        running: Mapping[int, Optional[int]],
+        threads: Mapping[int, int],
+        jobs: int,
+    ) -> List[int]:
+        """
+        Returns the running jobs whose rate no longer matches their share.
+
+        :param running: (dict) Job id to the rate its spotdl process was started with.
+        :param threads: (dict) Job id to its number of download threads.
+        :param jobs: (int) The number of jobs sharing the budget.
+        """
+        return [
+            job_id
+            for job_id, current in running.items()
+            if self.needs_restart(current, self.rate(jobs, threads[job_id]))
+        ]
@@ -0,0 +1,218 @@
+"""
+Headless command line front end for SpotifyDL-GUI.
+
+Runs downloads through the same options model, output parser, journal and
+download queue as the GUI, but never imports tkinter or PySimpleGUI, so it
+starts quickly on machines without a display and can be run from cron:
+
+    python -m cli https://open.spotify.com/playlist/... --format opus --jobs 3
+    python -m cli --batch urls.txt --output ~/Music
+
+Every field of ``DownloadOptions`` is available as a ``--flag`` of the same
+name (``max_retries`` becomes ``--max-retries``).  Options that are not given
+are left to spotdl's own defaults, except ``--threads``, which is one per core
+but one as in the GUI.  The exit status is 0 when every job
+finished without a failed track and 1 otherwise.
+"""
+
+import argparse
+import os
+import sys
+import threading
+from dataclasses import fields
+from typing import List, Optional
+
+from bandwidth import BandwidthBudget
+from concurrency import ConcurrencyController
+from dependencies import verify_dependencies
+from download_queue import DownloadQueue, JobState
+from journal import JobJournal
+from log_tail import LogTail
+from loudness import LoudnessAnalyzer
+from match_cache import MatchCache
+from metadata_cache import MetadataCache
+from options import DownloadOptions, default_threads
+from supervisor import ProcessSupervisor
+from transcode import Transcoder
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Download Spotify playlists with spotdl."
+    )
+    parser.add_argument("urls", nargs="*", help="Spotify URLs to download.")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Read URLs from FILE, one per line ('-' for stdin).",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=2, help="Number of parallel spotdl processes."
+    )
+    parser.add_argument(
+        "--auto-tune",
+        action="store_true",
+        help="Tune --threads and the number of parallel jobs (up to --jobs) "
+        "to the download rate.",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        metavar="KIB",
+        help="Combined download limit of all jobs in KiB/s.",
+    )
+    parser.add_argument(
+        "--log",
+        default="command_output.txt",
+        help="File the spotdl output is appended to (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--metadata-ttl",
+        type=int,
+        default=60,
+        metavar="MINUTES",
+        help="Reuse track lists of playlists and albums fetched less than "
+        "MINUTES ago (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="File the timings of every track are appended to, as CSV if it "
+        "ends in .csv and as JSON lines otherwise (default: next to the log).",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Let spotdl only download and convert to --format in a separate "
+        "pool of FFmpeg processes, overlapping with the downloads (spotdl "
+        "converts itself when FFmpeg is not found).",
+    )
+    parser.add_argument(
+        "--transcode-workers",
+        type=int,
+        metavar="N",
+        help="FFmpeg processes of --pipeline (default: one per core).",
+    )
+    parser.add_argument(
+        "--replaygain",
+        action="store_true",
+        help="Measure the loudness of the downloaded files and add ReplayGain "
+        "tags (needs NumPy).",
+    )
+    parser.add_argument(
+        "--no-skip-present",
+        action="store_true",
+        help="Do not skip tracks already present in the output directory.",
+    )
+    options = parser.add_argument_group("spotdl options")
+    for option in fields(DownloadOptions):
+        flag = "--" + option.name.replace("_", "-")
+        if option.type is bool:
+            options.add_argument(flag, action="store_true", default=False)
+        else:
+            options.add_argument(flag, metavar=option.metadata["flag"].lstrip("-"))
+    return parser
+
+
+def read_urls(args: argparse.Namespace) -> List[str]:
+    urls = list(args.urls)
+    if args.batch:
+        if args.batch == "-":
+            urls += sys.stdin.read().split()
+        else:
+            with open(args.batch, encoding="utf-8") as file:
+                urls += file.read().split()
+    return urls
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    urls = read_urls(args)
+    if not urls:
+        parser.error("no Spotify URLs given")
+
+    values = {
+        option.name: getattr(args, option.name)
+        for option in fields(DownloadOptions)
+        if getattr(args, option.name) not in (None, False)
+    }
+    values.setdefault("threads", default_threads())
+    try:
+        options = DownloadOptions(**values).validated()
+    except (TypeError, ValueError) as e:
+        parser.error(str(e))
+    if options.output_dir:
+        os.makedirs(options.output_dir, exist_ok=True)
+
+    def notify(message: str, error: bool) -> None:
+        print(message, file=sys.stderr)
+
+    if not verify_dependencies(notify):
+        return 1
+
+    log_tail = LogTail(args.log)
+    while log_tail.read()[0]:
+        pass  # only show the output of this run
+    changed = threading.Event()
+    lock = threading.Lock()
+
+    def post(key, value) -> None:
+        if key == "-output-":
+            with lock:
+                while True:
+                    text, _reset = log_tail.read()
+                    if not text:
+                        break
+                    sys.stdout.write(text)
+                sys.stdout.flush()
+        elif key == "-job-":
+            changed.set()
+
+    controller = None
+    if args.auto_tune:
+        controller = ConcurrencyController(max_jobs=args.jobs)
+    transcoder = Transcoder(args.transcode_workers) if args.pipeline else None
+    replaygain = LoudnessAnalyzer() if args.replaygain else None
+    supervisor = ProcessSupervisor()
+    queue = DownloadQueue(
+        supervisor,
+        post,
+        args.log,
+        max_workers=controller.jobs if controller else args.jobs,
+        journal=JobJournal(),
+        skip_present=not args.no_skip_present,
+        controller=controller,
+        metadata=MetadataCache(ttl=args.metadata_ttl * 60),
+        matches=MatchCache(),
+        transcoder=transcoder,
+        replaygain=replaygain,
+        metrics_file=args.metrics or os.path.splitext(args.log)[0] + ".metrics.jsonl",
+        bandwidth=BandwidthBudget(args.bandwidth * 1024 if args.bandwidth else None),
+    )
+    for url in urls:
+        queue.submit(url, options.to_argv(url), options.output_dir or None)
+
+    try:
+        while any(job.active for job in queue.jobs):
+            changed.wait(1)
+            changed.clear()
+    except KeyboardInterrupt:
+        queue.stop()
+    finally:
+        supervisor.close()
+        if transcoder is not None:
+            transcoder.close()
+        if replaygain is not None:
+            replaygain.close()
+
+    jobs = queue.jobs
+    for job in jobs:
+        failed = f", {job.failed} failed" if job.failed else ""
+        print(f"[#{job.job_id}] {job.url}: {job.state.value} ({job.done} done{failed})")
+    succeeded = all(job.state is JobState.FINISHED and not job.failed for job in jobs)
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Pieces shared by the journal, the caches and the diagnostics.
+
+* ``APP_DIR``: the folder every persistent file of the app lives in;
+* ``Database``: a SQLite file created together with its tables on first
+  use, as the metadata, match and loudness caches keep them;
+* ``mutagen``: the tagging library, or None when it is not installed.
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Sequence
+
+try:
+    import mutagen  # installed together with spotdl
+except ImportError:
+    mutagen = None
+
+APP_DIR = Path.home() / ".spotifydl-gui"
+
+
+class Database:
+    """
+    A SQLite database whose folder and tables are created on the first
+    connection.  Every ``connect`` opens a new connection, so the database
+    can be used from any thread; close it with ``contextlib.closing``.
+    """
+
+    def __init__(self, path, schema: Sequence[str], pragmas: Sequence[str] = ()):
+        """
+        :param path: Location of the database file.
+        :param schema: (list) ``CREATE ... IF NOT EXISTS`` statements run once.
+        :param pragmas: (list) ``PRAGMA`` settings applied to every connection,
+            e.g. ``synchronous = NORMAL``.
+        """
+        self.path = Path(path)
+        self.schema = schema
+        self.pragmas = pragmas
+        self._ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=10)
+        for pragma in self.pragmas:
+            connection.execute(f"PRAGMA {pragma}")
+        if not self._ready:
+            with connection:
+                for statement in self.schema:
+                    connection.execute(statement)
+            self._ready = True
+        return connection
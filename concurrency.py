@@ -0,0 +1,167 @@
+"""
+Adaptive tuning of spotdl concurrency.
+
+A fixed ``--threads os.cpu_count() - 1`` is wrong in both directions:
+downloading is network bound, so the core count says little about the right
+number of threads, and on a single core machine it gives 0.
+``ConcurrencyController`` measures finished tracks per minute and the share
+of failed tracks from the parsed spotdl output and tunes two knobs with an
+AIMD style hill climb:
+
+* while throughput does not fall it adds one thread per job, and once more
+  threads stop helping, one more concurrent job (additive increase);
+* an increase that did not improve throughput is undone, and the value it
+  was undone to becomes the ceiling for that knob;
+* when the failure rate crosses a threshold (usually provider rate limiting)
+  the thread count is halved and one job is dropped (multiplicative
+  decrease).
+
+The thread count is applied to jobs as they start; spotdl cannot change it
+for a running process.  ``set_bounds`` changes the upper bounds and forgets
+the ceilings, so every batch of downloads starts probing afresh.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Decision:
+    threads: int
+    jobs: int
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{self.reason}: {self.threads} threads per job, {self.jobs} jobs"
+
+
+class ConcurrencyController:
+    """Tunes threads per job and concurrent jobs from track outcomes."""
+
+    def __init__(
+        self,
+        threads: int = 4,
+        jobs: int = 1,
+        max_threads: int = 16,
+        max_jobs: int = 4,
+        interval: float = 60.0,
+        window: float = 60.0,
+        min_samples: int = 5,
+        failure_threshold: float = 0.2,
+        tolerance: float = 0.05,
+    ):
+        """
+        :param threads: (int) Threads per job to start with.
+        :param jobs: (int) Concurrent jobs to start with.
+        :param max_threads: (int) Upper bound for threads per job.
+        :param max_jobs: (int) Upper bound for concurrent jobs.
+        :param interval: (float) Seconds between two decisions.
+        :param window: (float) Seconds of history the measurements cover.
+        :param min_samples: (int) Finished tracks needed before deciding anything.
+        :param failure_threshold: (float) Failure rate that triggers a back-off.
+        :param tolerance: (float) Relative throughput change treated as noise.
+        """
+        self.threads = max(1, threads)
+        self.jobs = max(1, jobs)
+        self.interval = interval
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.tolerance = tolerance
+        self._samples: Deque[Tuple[float, bool]] = deque()
+        self._last_decision: Optional[float] = None
+        self._last_rate: Optional[float] = None
+        self._last_step: Optional[str] = None
+        self._ceilings: Dict[str, int] = {}
+        self.set_bounds(max_threads, max_jobs)
+
+    def set_bounds(
+        self, max_threads: Optional[int] = None, max_jobs: Optional[int] = None
+    ) -> None:
+        """
+        Changes the upper bounds, clamping the current values to them, and
+        forgets the ceilings learned from undone increases.
+
+        :param max_threads: (int, optional) New upper bound for threads per job.
+        :param max_jobs: (int, optional) New upper bound for concurrent jobs.
+        """
+        if max_threads is not None:
+            self.max_threads = max(1, max_threads)
+        if max_jobs is not None:
+            self.max_jobs = max(1, max_jobs)
+        self.threads = min(self.threads, self.max_threads)
+        self.jobs = min(self.jobs, self.max_jobs)
+        self._ceilings = {"threads": self.max_threads, "jobs": self.max_jobs}
+        self._last_step = None
+
+    def record(self, ok: bool, now: Optional[float] = None) -> None:
+        """
+        Records a finished track.
+
+        :param ok: (bool) False if spotdl reported the track as failed.
+        :param now: (float, optional) ``time.monotonic()`` timestamp, for tests.
+        """
+        self._samples.append((time.monotonic() if now is None else now, ok))
+
+    def measure(self, now: Optional[float] = None) -> Tuple[float, float, int]:
+        """
+        Returns ``(tracks_per_minute, failure_rate, samples)`` over the window.
+        """
+        now = time.monotonic() if now is None else now
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+        total = len(self._samples)
+        if not total:
+            return 0.0, 0.0, 0
+        failed = sum(1 for _when, ok in self._samples if not ok)
+        return (total - failed) * 60.0 / self.window, failed / total, total
+
+    def evaluate(self, now: Optional[float] = None) -> Optional[Decision]:
+        """
+        Runs one step of the policy if ``interval`` has passed.
+
+        :return: (Decision) The new settings if they changed, else None.
+        """
+        now = time.monotonic() if now is None else now
+        if self._last_decision is None:
+            self._last_decision = now
+        if now - self._last_decision < self.interval:
+            return None
+        self._last_decision = now
+        rate, failure_rate, samples = self.measure(now)
+        if samples < self.min_samples:
+            return None
+
+        before = (self.threads, self.jobs)
+        reason = None
+        improved = self._last_rate is None or rate > self._last_rate * (
+            1 + self.tolerance
+        )
+        if failure_rate > self.failure_threshold:
+            self.threads = max(1, self.threads // 2)
+            self.jobs = max(1, self.jobs - 1)
+            self._last_step = None
+            reason = f"{failure_rate:.0%} of tracks failed, backing off"
+        elif self._last_step is not None and not improved:
+            # The last increase did not pay off: undo it and remember the
+            # value as the ceiling for that knob.
+            setattr(self, self._last_step, getattr(self, self._last_step) - 1)
+            self._ceilings[self._last_step] = getattr(self, self._last_step)
+            self._last_step = None
+            reason = f"throughput {rate:.1f} tracks/min did not improve, undoing"
+        elif improved or rate >= self._last_rate * (1 - self.tolerance):
+            for knob, limit in (("threads", self.max_threads), ("jobs", self.max_jobs)):
+                if getattr(self, knob) < min(limit, self._ceilings[knob]):
+                    setattr(self, knob, getattr(self, knob) + 1)
+                    self._last_step = knob
+                    break
+            else:
+                self._last_step = None
+            reason = f"throughput {rate:.1f} tracks/min, probing upwards"
+        self._last_rate = rate
+
+        if reason is None or (self.threads, self.jobs) == before:
+            return None
+        return Decision(self.threads, self.jobs, reason)
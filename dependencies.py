@@ -0,0 +1,124 @@
+"""
+Startup checks for pip and spotdl.
+
+Running ``python -m pip --version`` and ``spotdl --version`` on every launch
+costs seconds before the window can appear.  The checks now run on a
+background thread once the window is shown, and a successful result is
+persisted together with a fingerprint of the environment: the interpreter
+path, the PATH entries and the modification times of the interpreter and the
+spotdl executable.  As long as the fingerprint matches, no subprocess is
+started at all.
+
+Nothing in here touches the GUI; progress messages are reported through a
+``notify(message, error)`` callable.
+"""
+
+import ensurepip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from typing import Callable, Optional
+
+from common import APP_DIR
+
+PROBE_CACHE = APP_DIR / "probe.json"
+
+Notify = Callable[[str, bool], None]
+
+
+def fingerprint() -> str:
+    """Returns a digest of everything a successful probe depends on."""
+    parts = [sys.executable, os.environ.get("PATH", "")]
+    for path in (sys.executable, shutil.which("spotdl")):
+        if path is None:
+            parts.append("missing")
+            continue
+        try:
+            parts.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def _cached_fingerprint(cache_file) -> Optional[str]:
+    try:
+        with open(cache_file, encoding="utf-8") as file:
+            return json.load(file).get("fingerprint")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _store_fingerprint(cache_file) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as file:
+            json.dump({"fingerprint": fingerprint()}, file)
+    except OSError:
+        pass  # the probe simply runs again on the next start
+
+
+def ensure_pip(notify: Notify) -> bool:
+    """Ensure pip is installed. If not, install it using ensurepip."""
+    try:
+        # Check if pip is available
+        subprocess.run(
+            [sys.executable, "-m", "pip", "--version"],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        notify("pip is not installed. Installing pip...", False)
+        try:
+            ensurepip.bootstrap()
+            notify("pip installed successfully.", False)
+        except Exception as e:
+            notify(f"Failed to install pip: {e}", True)
+            return False
+    return True
+
+
+def check_and_install_spotdl(notify: Notify) -> bool:
+    """Check if spotdl is installed. If not, install it using pip."""
+    if not ensure_pip(notify):  # Ensure pip is available
+        return False
+    try:
+        # Check if spotdl is available
+        subprocess.run(
+            ["spotdl", "--version"],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        notify("spotdl is not installed. Installing now...", False)
+        try:
+            # Install spotdl using pip
+            subprocess.run(
+                [sys.executable, "-m", "pip", "install", "spotdl"], check=True
+            )
+            notify("spotdl installed successfully.", False)
+        except subprocess.CalledProcessError as e:
+            notify(f"Failed to install spotdl: {e}", True)
+            return False
+    return True
+
+
+def verify_dependencies(notify: Notify, cache_file=PROBE_CACHE) -> bool:
+    """
+    Makes sure pip and spotdl are available, skipping the probe entirely when
+    the environment did not change since the last successful one.
+
+    :param notify: (callable) Receives ``(message, is_error)`` progress messages.
+    :param cache_file: Where the fingerprint of the last successful probe is kept.
+    :return: (bool) True if spotdl can be used.
+    """
+    if _cached_fingerprint(cache_file) == fingerprint():
+        return True
+    if not check_and_install_spotdl(notify):
+        return False
+    _store_fingerprint(cache_file)  # after a possible install changed it
+    return True
@@ -0,0 +1,184 @@
+"""
+Opt-in profiling for diagnosing a stuttering GUI.
+
+Set the ``SPOTIFYDL_PROFILE`` environment variable to enable it: ``1`` writes
+to ``~/.spotifydl-gui/diagnostics``, any other value is taken as the folder
+to write to.  Every session gets a sub-folder named after its start time
+with:
+
+* ``main.pstats``: cProfile of the GUI thread running ``main_gui``;
+* ``supervisor.pstats``: cProfile of the process supervisor thread, which
+  runs ``exec_command`` and every download job.  From Python 3.12 on
+  cProfile is built on ``sys.monitoring``, which sees every thread and allows
+  one profile at a time, so there the supervisor is in ``main.pstats``;
+* ``events.txt``: how long the GUI thread spent handling each kind of event,
+  i.e. how long the window could not repaint (this replaces the ``_timeit``
+  helpers that used to sit unused in the vendored PySimpleGUI);
+* ``tracemalloc-NNN.txt``: the allocations that grew most since the
+  previous snapshot, taken every ``interval`` seconds and at exit.
+
+Open the ``.pstats`` files with ``python -m pstats`` or snakeviz.
+"""
+
+import asyncio
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from common import APP_DIR
+
+ENV = "SPOTIFYDL_PROFILE"
+DIAGNOSTICS_DIR = APP_DIR / "diagnostics"
+
+# Before Python 3.12 a cProfile profile only sees the thread it was enabled on
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+class Profiler:
+    """Collects cProfile, event timing and tracemalloc data for one session."""
+
+    def __init__(self, directory: Path, interval: float = 60.0, top: int = 25):
+        """
+        :param directory: (Path) Folder the session sub-folder is created in.
+        :param interval: (float) Seconds between two tracemalloc snapshots.
+        :param top: (int) Number of allocation sites listed per snapshot.
+        """
+        self.directory = Path(directory) / datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.interval = interval
+        self.top = top
+        self._main = cProfile.Profile()
+        self._loop_profile: Optional[cProfile.Profile] = None
+        # event -> [count, total seconds, max seconds]
+        self._events: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self._stopped = threading.Event()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshots = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_environment(cls) -> Optional["Profiler"]:
+        """Returns a profiler if ``SPOTIFYDL_PROFILE`` is set, else None."""
+        value = os.environ.get(ENV, "").strip()
+        if value in ("", "0"):
+            return None
+        return cls(DIAGNOSTICS_DIR if value == "1" else Path(value))
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts profiling the calling thread and taking snapshots."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start(10)
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        self._thread = threading.Thread(
+            target=self._take_snapshots, name="profiler", daemon=True
+        )
+        self._thread.start()
+        self._main.enable()
+
+    def stop(self) -> None:
+        """Stops profiling and writes everything that was collected."""
+        self._main.disable()
+        self._main.dump_stats(self.directory / "main.pstats")
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._write_snapshot()
+        tracemalloc.stop()
+        self._write_events()
+
+    def watch(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Profiles the thread running ``loop`` as well; nothing to do from
+        Python 3.12 on, where the main profile covers it.
+        """
+        if not PER_THREAD_PROFILES:
+            return
+
+        def enable() -> None:
+            self._loop_profile = cProfile.Profile()
+            self._loop_profile.enable()
+
+        loop.call_soon_threadsafe(enable)
+
+    def unwatch(self, loop: asyncio.AbstractEventLoop, timeout: float = 5.0) -> None:
+        """Stops profiling ``loop`` and writes its stats; call before it stops."""
+        if not PER_THREAD_PROFILES:
+            return
+
+        async def disable() -> None:
+            if self._loop_profile is not None:
+                # A profile can only be disabled on the thread it runs on
+                self._loop_profile.disable()
+                self._loop_profile.dump_stats(self.directory / "supervisor.pstats")
+
+        asyncio.run_coroutine_threadsafe(disable(), loop).result(timeout)
+
+    def timed(self, read: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wraps ``Window.read`` to measure how long the caller spends handling
+        each event before it reads the next one.
+        """
+        last = None
+
+        def timed_read(*args, **kwargs):
+            nonlocal last
+            if last is not None:
+                event, returned = last
+                elapsed = time.perf_counter() - returned
+                stats = self._events[str(event)]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+            result = read(*args, **kwargs)
+            last = (result[0], time.perf_counter())
+            return result
+
+        return timed_read
+
+    def _take_snapshots(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        self._snapshots += 1
+        path = self.directory / f"tracemalloc-{self._snapshots:03d}.txt"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(
+                f"{datetime.now().isoformat(timespec='seconds')}: "
+                f"{current / 2**20:.1f} MiB traced, peak {peak / 2**20:.1f} MiB\n"
+                f"Top {self.top} differences since the previous snapshot:\n"
+            )
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[: self.top]:
+                file.write(f"{stat}\n")
+        self._snapshot = snapshot
+
+    def _write_events(self) -> None:
+        rows = sorted(self._events.items(), key=lambda item: item[1][1], reverse=True)
+        with open(self.directory / "events.txt", "w", encoding="utf-8") as file:
+            file.write(f"{'event':<30} {'count':>7} {'mean ms':>9} {'max ms':>9}\n")
+            for event, (count, total, longest) in rows:
+                file.write(
+                    f"{event[:30]:<30} {count:>7} "
+                    f"{total / count * 1000:>9.2f} {longest * 1000:>9.2f}\n"
+                )
@@ -0,0 +1,734 @@
+"""
+Download queue with a bounded number of concurrent spotdl processes.
+
+Every submitted URL becomes a ``DownloadJob``.  Each job is a coroutine on the
+``ProcessSupervisor`` loop that waits for one of at most ``max_workers`` slots,
+so several playlists download at the same time while new URLs can be queued
+at any moment, without an OS thread per job.  The queue never touches the
+GUI: it reports job changes through a ``post(key, value)`` callable, normally
+``Window.write_event_value``.
+
+With a ``ConcurrencyController`` the queue also feeds every finished track to
+the controller, applies its thread count to jobs as they start and its job
+count to the concurrency limit, and logs each decision.  A
+``BandwidthBudget`` caps the combined download rate of all jobs; see
+``bandwidth.py``.  With a ``Transcoder`` the queue runs in pipeline mode:
+spotdl only downloads, and the encoding to the chosen format happens in the
+transcoder's process pool while the downloads go on; see ``transcode.py``.
+A ``LoudnessAnalyzer`` adds ReplayGain tags to the files of every finished
+job; see ``loudness.py``.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from bandwidth import BandwidthBudget, threads_of, with_rate_limit
+from concurrency import ConcurrencyController
+from journal import JobJournal, song_display_name
+from library import TrackIndex
+from loudness import LoudnessAnalyzer, recent_files
+from match_cache import MatchCache, audio_provider
+from metadata_cache import MetadataCache, normalize_url
+from metrics import JobMetrics
+from progress import ProgressReporter
+from spotdl_output import Downloaded, Failed, Found, Skipped, parse_line
+from supervisor import Limiter, ProcessSupervisor
+from transcode import (
+    TranscodeTask,
+    Transcoder,
+    file_name,
+    find_ffmpeg,
+    native_format,
+    split_options,
+)
+
+_URL = re.compile(r"https?://\S+")
+
+# spotdl options that change how a URL is resolved into its track list
+SAVE_FLAGS = (
+    "--auth-token",
+    "--cache-path",
+    "--client-id",
+    "--client-secret",
+    "--cookie-file",
+    "--fetch-albums",
+    "--headless",
+    "--log-level",
+    "--max-retries",
+    "--no-cache",
+    "--proxy",
+    "--use-cache-file",
+    "--user-auth",
+)
+
+
+def save_options(options: List[str]) -> List[str]:
+    """Returns the options of a job that ``spotdl save`` needs as well."""
+    return [option for option in options if option.split("=", 1)[0] in SAVE_FLAGS]
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    STOPPED = "stopped"
+
+
+@dataclass
+class DownloadJob:
+    job_id: int
+    url: str
+    options: List[str]
+    output_dir: Optional[str] = None
+    state: JobState = JobState.QUEUED
+    resumed: int = 0
+    done: int = 0
+    failed: int = 0
+    total: Optional[int] = None
+    returncode: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in (JobState.QUEUED, JobState.RUNNING)
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed
+
+
+class DownloadQueue:
+    """
+    Runs queued spotdl downloads on the supervisor loop, at most
+    ``max_workers`` at a time.
+
+    Posts ``("-job-", DownloadJob)`` whenever a job changes state or makes
+    progress (progress is throttled per job) and ``("-output-", None)`` after
+    output was appended to the shared log file. Both stdout and stderr of
+    spotdl end up in the log and are parsed with ``parse_line`` to track
+    progress.
+    """
+
+    def __init__(
+        self,
+        supervisor: ProcessSupervisor,
+        post: Callable[[Any, Any], None],
+        output_file: str,
+        max_workers: int = 2,
+        idle_timeout: Optional[float] = None,
+        finish_grace: float = 30.0,
+        journal: Optional[JobJournal] = None,
+        skip_present: bool = True,
+        controller: Optional[ConcurrencyController] = None,
+        bandwidth: Optional[BandwidthBudget] = None,
+        metrics_file: Optional[str] = None,
+        metadata: Optional[MetadataCache] = None,
+        matches: Optional[MatchCache] = None,
+        transcoder: Optional[Transcoder] = None,
+        replaygain: Optional[LoudnessAnalyzer] = None,
+    ):
+        """
+        :param supervisor: (ProcessSupervisor) Runs the spotdl processes.
+        :param post: (callable) Receives ``(key, value)`` events for the GUI.
+        :param output_file: (str) Log file shared by all jobs.
+        :param max_workers: (int) Maximum number of spotdl processes running at once.
+        :param idle_timeout: (float, optional) Fail a job whose spotdl process
+            prints nothing for this many seconds.
+        :param finish_grace: (float) Seconds spotdl gets to exit by itself
+            once every track is processed, e.g. to write the ``--m3u``
+            playlist and the ``--save-file``, before it is terminated.
+        :param journal: (JobJournal, optional) Records finished tracks so an
+            interrupted job resumes where it stopped when queued again.
+        :param skip_present: (bool) Drop tracks that already have a file of
+            the job's format in its output directory (see ``TrackIndex``)
+            before spotdl starts, unless the job is run with ``--redownload``.
+        :param controller: (ConcurrencyController, optional) Tunes ``--threads``
+            and the concurrency limit from the download rate. Without one the
+            options of each job are used as given.
+        :param bandwidth: (BandwidthBudget, optional) Shares a download rate
+            limit between the running jobs.
+        :param metrics_file: (str, optional) File the stage timings of every
+            track are appended to (see ``JobMetrics``); ``.csv`` or JSON lines.
+        :param metadata: (MetadataCache, optional) Caches the track lists of
+            playlists and albums between runs.
+        :param matches: (MatchCache, optional) Remembers the audio match of
+            every downloaded track and fills known ones into the ``.spotdl``
+            files, so spotdl does not search for them again. Jobs run with
+            ``--no-cache`` do not use it.
+        :param transcoder: (Transcoder, optional) Runs the encoding to the
+            job's format apart from spotdl, which then keeps the downloaded
+            stream as is. A job only uses it when its track list is known.
+        :param replaygain: (LoudnessAnalyzer, optional) Measures the files a
+            job wrote once it is done and adds ReplayGain tags to them.
+        """
+        self.supervisor = supervisor
+        self.post = post
+        self.output_file = output_file
+        self.idle_timeout = idle_timeout
+        self.finish_grace = finish_grace
+        self.journal = journal
+        self.skip_present = skip_present
+        self.controller = controller
+        self.bandwidth = bandwidth or BandwidthBudget()
+        self.metrics_file = metrics_file
+        self.metadata = metadata
+        self.matches = matches
+        self.transcoder = transcoder
+        self.replaygain = replaygain
+        # job id -> {display name: .spotdl song} of the tracks being downloaded
+        self._songs: Dict[int, Dict[str, dict]] = {}
+        # job id -> (staging folder, encoding options) of pipelined jobs
+        self._pipelines: Dict[int, Tuple[Path, dict]] = {}
+        # job id -> (process, rate, threads) of the spotdl processes running
+        self._running: Dict[int, Tuple[Any, Optional[int], int]] = {}
+        self._restarts: Set[int] = set()
+        self._libraries: Dict[str, TrackIndex] = {}
+        self._limiter = Limiter(max_workers)
+        self._jobs: Dict[int, DownloadJob] = {}
+        self._tasks: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return self._limiter.limit
+
+    @property
+    def jobs(self) -> List[DownloadJob]:
+        with self._lock:
+            return [replace(job) for job in self._jobs.values()]
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """
+        Changes the concurrency limit. Queued jobs start right away when the
+        limit grows; running jobs are never interrupted when it shrinks.
+        """
+        self.supervisor.submit(self._limiter.set_limit(max_workers))
+
+    def set_bandwidth(self, limit: Optional[int]) -> None:
+        """
+        Changes the combined rate limit in bytes per second (None for none).
+        Running jobs whose share changes a lot are restarted with the new one.
+        """
+        self.supervisor.call_soon(self._set_bandwidth, limit)
+
+    def _set_bandwidth(self, limit: Optional[int]) -> None:
+        self.bandwidth.limit = limit or None
+        self._rebalance()
+
+    def submit(
+        self, url: str, options: List[str], output_dir: Optional[str] = None
+    ) -> DownloadJob:
+        """
+        Queues a download.
+
+        :param url: (str) The Spotify URL to download.
+        :param options: (list) The spotdl arguments for the job, without the query
+            (see ``DownloadOptions.to_argv``).
+        :param output_dir: (str, optional) The directory spotdl writes to.
+        :return: (DownloadJob) A snapshot of the queued job.
+        """
+        job = DownloadJob(next(self._ids), url, options, output_dir)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._tasks[job.job_id] = self.supervisor.submit(self._run(job))
+        self._notify(job)
+        return replace(job)
+
+    def stop(self, job_id: Optional[int] = None) -> int:
+        """
+        Stops one job, or every queued and running job when ``job_id`` is None.
+
+        :return: (int) The number of jobs that were stopped.
+        """
+        stopped = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.active and job_id in (None, job.job_id):
+                    job.state = JobState.STOPPED
+                    self._tasks[job.job_id].cancel()
+                    stopped.append(replace(job))
+        for job in stopped:
+            self.post("-job-", job)
+        return len(stopped)
+
+    def _notify(self, job: DownloadJob) -> None:
+        with self._lock:
+            snapshot = replace(job)
+        self.post("-job-", snapshot)
+
+    def _write(self, text: str) -> None:
+        with open(self.output_file, "a", encoding="utf-8") as file:
+            file.write(text)
+        self.post("-output-", None)
+
+    def _set_state(self, job: DownloadJob, state: JobState) -> None:
+        with self._lock:
+            if job.active:
+                job.state = state
+
+    def _tune(self, ok: bool) -> None:
+        controller = self.controller
+        if controller is None:
+            return
+        controller.record(ok)
+        decision = controller.evaluate()
+        if decision is None:
+            return
+        self._write(f"[auto] {decision}\n")
+        if decision.jobs != self._limiter.limit:
+            self.set_max_workers(decision.jobs)
+
+    def _learn(self, job: DownloadJob, event: Downloaded) -> None:
+        if self.matches is None or "--no-cache" in job.options:
+            return
+        song = self._songs.get(job.job_id, {}).get(event.song)
+        if song and song.get("url") and "://" in event.url:
+            self.matches.put(song["url"], event.url, audio_provider(job.options))
+
+    def _forget(self, event: Failed, prefix: str) -> None:
+        """Drops the match of a download that failed, e.g. a removed video."""
+        if self.matches is None:
+            return
+        for url in _URL.findall(event.message):
+            if self.matches.forget(url):
+                self._write(f"{prefix}Removed the cached match {url}: it failed.\n")
+
+    def _options(self, job: DownloadJob) -> List[str]:
+        options = job.options
+        if self.controller is not None:
+            options = [o for o in options if not o.startswith("--threads=")]
+            options = options + [f"--threads={self.controller.threads}"]
+        pipeline = self._pipelines.get(job.job_id)
+        if pipeline is not None:
+            staging, encoding = pipeline
+            options, _encoding = split_options(options)
+            options = [o for o in options if not o.startswith("--output=")]
+            options += [
+                f"--format={native_format(encoding['format'])}",
+                "--bitrate=disable",
+                f"--output={staging / '{track-id}.{output-ext}'}",
+            ]
+        return options
+
+    async def _hand_over(
+        self,
+        job: DownloadJob,
+        event: Downloaded,
+        transcoder: Transcoder,
+        pending: List[asyncio.Future],
+        prefix: str,
+    ) -> None:
+        """Queues the encoding of a track spotdl downloaded to the staging folder."""
+        staging, encoding = self._pipelines[job.job_id]
+        song = self._songs[job.job_id].get(event.song)
+        source = None
+        if song is not None and song.get("song_id"):
+            source = staging / f"{song['song_id']}.{native_format(encoding['format'])}"
+        if source is None or not source.exists():
+            done = asyncio.get_running_loop().create_future()
+            done.set_exception(FileNotFoundError("the downloaded file was not found"))
+        else:
+            target = os.path.join(
+                job.output_dir or ".", file_name(song, encoding["format"])
+            )
+            done = await transcoder.put(TranscodeTask(str(source), target, **encoding))
+        done.add_done_callback(
+            lambda future: self._converted(job, event.song, future, prefix)
+        )
+        pending.append(done)
+
+    def _converted(
+        self,
+        job: DownloadJob,
+        song: str,
+        future: asyncio.Future,
+        prefix: str,
+    ) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            conversion = future.result()
+            action = "remuxed" if conversion.copied else "re-encoded"
+            self._write(
+                f"{prefix}{song}: {conversion.codec or 'unknown'} source, {action} "
+                f"({conversion.cpu_seconds:.2f} CPU seconds)\n"
+            )
+            if self.journal is not None:
+                self.journal.record(job.url, song, "downloaded")
+            return
+        job.done -= 1
+        job.failed += 1
+        self._write(f"{prefix}Could not convert {song}: {error}\n")
+        self._notify(job)
+
+    def _sharing(self) -> int:
+        """The number of jobs the bandwidth is divided between."""
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.active)
+        return max(1, min(self._limiter.limit, active), len(self._running))
+
+    def _rebalance(self) -> None:
+        """Restarts running jobs whose bandwidth share changed too much."""
+        running = {job_id: rate for job_id, (_p, rate, _t) in self._running.items()}
+        threads = {job_id: t for job_id, (_p, _r, t) in self._running.items()}
+        for job_id in self.bandwidth.stale(running, threads, self._sharing()):
+            job = self._jobs[job_id]
+            if job_id in self._restarts or (
+                self.journal is None and self._library(job) is None
+            ):
+                continue  # a restart would lose the progress made so far
+            self._restarts.add(job_id)
+            try:
+                self._running[job_id][0].terminate()
+            except ProcessLookupError:
+                pass  # exited on its own in the meantime
+
+    async def _tag_loudness(
+        self, job: DownloadJob, analyzer: LoudnessAnalyzer, since: float, prefix: str
+    ) -> None:
+        """Adds ReplayGain tags to the audio files written since ``since``."""
+        if not analyzer.available():
+            self._write(f"{prefix}ReplayGain tags need NumPy (pip install numpy).\n")
+            return
+        if find_ffmpeg() is None:
+            self._write(
+                f"{prefix}ReplayGain tags need FFmpeg (Install/Check FFmpeg).\n"
+            )
+            return
+        loop = asyncio.get_running_loop()
+        paths = await loop.run_in_executor(
+            None, recent_files, job.output_dir or ".", since
+        )
+        if not paths:
+            return
+        self._write(f"{prefix}Measuring the loudness of {len(paths)} files...\n")
+        started = loop.time()
+        results = await analyzer.analyze_all(paths)
+        tagged = cached = 0
+        for path, result in results.items():
+            name = os.path.basename(path)
+            if isinstance(result, Exception):
+                self._write(f"{prefix}ReplayGain failed for {name}: {result}\n")
+            elif result[0] is None:
+                self._write(
+                    f"{prefix}ReplayGain skipped {name}: silent or untaggable\n"
+                )
+            else:
+                tagged += 1
+                cached += result[1]
+        elapsed = loop.time() - started
+        self._write(
+            f"{prefix}ReplayGain: tagged {tagged} of {len(results)} files "
+            f"({cached} from the cache) at {len(results) / max(elapsed, 1e-3):.1f} "
+            "files/s.\n"
+        )
+
+    def _library(self, job: DownloadJob) -> Optional[TrackIndex]:
+        if not self.skip_present or not job.output_dir:
+            return None
+        if "--redownload" in job.options:
+            return None  # spotdl is asked to overwrite what is there
+        with self._lock:
+            library = self._libraries.get(job.output_dir)
+            if library is None:
+                library = self._libraries[job.output_dir] = TrackIndex(job.output_dir)
+        return library
+
+    async def _prepare_query(self, job: DownloadJob, prefix: str) -> str:
+        """
+        Returns the spotdl query for a job: the URL itself, or a ``.spotdl``
+        file with only the tracks that are neither recorded as finished in the
+        journal nor already present in the output directory.  With a metadata
+        cache the track list of playlists and albums comes from the cache
+        whenever it is fresh, so spotdl skips resolving the URL.
+        """
+        finished = self.journal.completed(job.url) if self.journal else set()
+        library = self._library(job)
+        if library is not None:
+            scanned = await asyncio.get_running_loop().run_in_executor(
+                None, library.refresh
+            )
+            if scanned:
+                self._write(f"{prefix}Indexed {scanned} files in {job.output_dir}\n")
+        cached = (
+            self.metadata is not None
+            and normalize_url(job.url) is not None
+            and "--fetch-albums" not in job.options  # a different track list
+        )
+        pipelined = self.transcoder is not None
+        if not finished and not library and not cached and not pipelined:
+            return job.url
+
+        if finished:
+            self._write(
+                f"{prefix}Resuming: {len(finished)} tracks finished in an earlier run.\n"
+            )
+        if cached:
+            songs, source = await self.metadata.track_list(
+                job.url, lambda url: self._fetch_track_list(url, job.options, prefix)
+            )
+            message = {
+                "cached": "Using the cached track list.",
+                "unchanged": "The track list did not change since it was cached.",
+                "stale": "Could not refresh the track list, using the cached one.",
+            }.get(source)
+            if message:
+                self._write(f"{prefix}{message}\n")
+        else:
+            songs = await self._fetch_track_list(job.url, job.options, prefix)
+        if songs is None:
+            self._write(f"{prefix}Could not fetch the track list, downloading all.\n")
+            return job.url
+
+        remaining = songs
+        if finished:
+            remaining = self.journal.remaining(remaining, finished)
+        if library:
+            remaining = library.missing(
+                remaining, split_options(job.options)[1]["format"]
+            )
+        self._songs[job.job_id] = {song_display_name(song): song for song in remaining}
+        if self.matches is not None and "--no-cache" not in job.options:
+            hits = self.matches.apply(remaining, audio_provider(job.options))
+            if remaining:
+                self._write(
+                    f"{prefix}{hits} of {len(remaining)} tracks have a known match.\n"
+                )
+            self.post("-matches-", self.matches.stats())
+        save_file = self._save_file(job.url)
+        with open(save_file, "w", encoding="utf-8") as file:
+            json.dump(remaining, file, ensure_ascii=False)
+        job.resumed = job.done = len(songs) - len(remaining)
+        job.total = len(songs)
+        self._write(
+            f"{prefix}{job.resumed} of {len(songs)} tracks are already done, "
+            f"{len(remaining)} left.\n"
+        )
+        return str(save_file)
+
+    async def _fetch_track_list(
+        self, url: str, options: List[str], prefix: str
+    ) -> Optional[List[dict]]:
+        """
+        Resolves the track list of ``url`` with ``spotdl save``, passing on
+        the job's options that affect resolving, such as ``--proxy``.
+        """
+        self._write(f"{prefix}Fetching the track list...\n")
+        save_file = self._save_file(url)
+        returncode = await self.supervisor.run(
+            ["spotdl", "save", url, "--save-file", str(save_file)]
+            + save_options(options),
+            lambda _stream, line: self._write(prefix + line),
+            idle_timeout=self.idle_timeout,
+        )
+        try:
+            with open(save_file, encoding="utf-8") as file:
+                songs = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if returncode != 0 or not isinstance(songs, list):
+            return None
+        return songs
+
+    def _save_file(self, query: str) -> Path:
+        if self.journal is not None:
+            return self.journal.save_file_for(query)
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        return Path(tempfile.gettempdir()) / f"spotifydl-{digest}.spotdl"
+
+    async def _run(self, job: DownloadJob) -> None:
+        progress = ProgressReporter(
+            lambda _key, _value: self._notify(job),
+            call_later=asyncio.get_running_loop().call_later,
+        )
+        prefix = f"[#{job.job_id}] "
+        metrics = JobMetrics(job.job_id, job.url, self.metrics_file)
+        transcoder = self.transcoder
+        analyzer = self.replaygain
+        since = time.time()
+        converting: List[asyncio.Future] = []
+
+        def on_line(_stream: str, line: str) -> Optional[Awaitable]:
+            nonlocal finishing, lingering
+            handing_over = None
+            event = parse_line(line)
+            if event is not None:
+                metrics.record(event)
+            if isinstance(event, Found):
+                job.total = event.total + job.resumed
+                progress.update(job.processed, job.total)
+            elif isinstance(event, Failed):
+                self._forget(event, prefix)
+                # Errors such as AudioProviderError name no song, but once
+                # the track list is known every error is about one track
+                if event.song or (job.total and job.processed < job.total):
+                    job.failed += 1
+                    progress.update(job.processed, job.total)
+                    self._tune(False)
+            elif isinstance(event, (Downloaded, Skipped)):
+                # Prepend number to 'Downloaded' and 'Skipping' lines
+                job.done += 1
+                pipelined = job.job_id in self._pipelines
+                if isinstance(event, Downloaded) and pipelined:
+                    # Recorded in the journal once it is converted
+                    handing_over = self._hand_over(
+                        job, event, transcoder, converting, prefix
+                    )
+                elif self.journal is not None:
+                    status = (
+                        "downloaded" if isinstance(event, Downloaded) else "skipped"
+                    )
+                    self.journal.record(job.url, event.song, status)
+                line = f"{job.done}. {line}"
+                progress.update(job.processed, job.total)
+                if isinstance(event, Downloaded):
+                    self._tune(True)
+                    self._learn(job, event)
+
+            self._write(prefix + line)
+            if job.total and job.processed >= job.total and not finishing:
+                finishing = True
+                self._running.pop(job.job_id, None)
+                # spotdl still writes --m3u and --save-file files after the
+                # last track; only stop it if it does not exit by itself
+                lingering = asyncio.get_running_loop().call_later(
+                    self.finish_grace, terminate
+                )
+            return handing_over
+
+        def terminate() -> None:
+            self._write(f"{prefix}spotdl did not exit after the last track.\n")
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                pass  # exited in the meantime
+
+        def on_start(started) -> None:
+            nonlocal process
+            process = started
+            self._running[job.job_id] = (process, rate, threads)
+            self._rebalance()
+
+        process = None
+        finishing = False
+        lingering = None  # terminates spotdl if it lingers once finished
+        unconverted = 0  # tracks downloaded but not converted
+        try:
+            async with self._limiter:
+                self._set_state(job, JobState.RUNNING)
+                self._notify(job)
+                self._write(f"{prefix}Starting {job.url}\n")
+                query = await self._prepare_query(job, prefix)
+                if transcoder is not None and job.job_id in self._songs:
+                    if transcoder.available():
+                        staging = Path(tempfile.mkdtemp(prefix="spotifydl-staging-"))
+                        self._pipelines[job.job_id] = (
+                            staging,
+                            split_options(job.options)[1],
+                        )
+                    else:
+                        self._write(
+                            f"{prefix}FFmpeg was not found, spotdl converts the "
+                            "tracks itself.\n"
+                        )
+                if job.total is not None and job.processed >= job.total:
+                    self._write(f"{prefix}Nothing left to download.\n")
+                while job.total is None or job.processed < job.total:
+                    options = self._options(job)
+                    threads = threads_of(options)
+                    rate = self.bandwidth.rate(self._sharing(), threads)
+                    if rate is not None:
+                        self._write(
+                            f"{prefix}Limiting each of {threads} downloads to "
+                            f"{rate // 1024} KiB/s\n"
+                        )
+                    metrics.begin(threads, query)
+                    try:
+                        job.returncode = await self.supervisor.run(
+                            ["spotdl", query, *with_rate_limit(options, rate)],
+                            on_line,
+                            idle_timeout=self.idle_timeout,
+                            on_start=on_start,
+                        )
+                    finally:
+                        self._running.pop(job.job_id, None)
+                        if lingering is not None:
+                            lingering.cancel()
+                    if finishing or job.job_id not in self._restarts:
+                        break
+                    self._restarts.discard(job.job_id)
+                    self._write(f"{prefix}Restarting with a new bandwidth share\n")
+                    job.failed = 0  # failed tracks are tried again
+                    query = await self._prepare_query(job, prefix)
+            if converting:
+                # Outside the limiter, so the next job downloads meanwhile
+                self._write(f"{prefix}Waiting for {len(converting)} conversions...\n")
+                await asyncio.wait(converting)
+                done = [f.result() for f in converting if not f.exception()]
+                unconverted = len(converting) - len(done)
+                copied = sum(1 for conversion in done if conversion.copied)
+                cpu = sum(conversion.cpu_seconds for conversion in done)
+                self._write(
+                    f"{prefix}Converted {len(done)} of {len(converting)} tracks in "
+                    f"the background ({copied} remuxed, {cpu:.1f} CPU seconds).\n"
+                )
+            if finishing and unconverted:
+                self._write(
+                    f"\n{prefix}Downloaded {job.done} of {job.total} songs, "
+                    f"{unconverted} could not be converted.\n"
+                )
+            elif finishing:
+                self._write(
+                    f"\n{prefix}Downloaded successfully {job.done} of {job.total} songs.\n"
+                )
+            if analyzer is not None and job.done > job.resumed:
+                await self._tag_loudness(job, analyzer, since, prefix)
+            complete = job.total is not None and job.processed >= job.total
+            if complete and not unconverted and self.journal is not None:
+                self.journal.clear(job.url)
+            if job.total is None:  # spotdl never said how many tracks to expect
+                complete = job.returncode == 0
+            self._set_state(job, JobState.FINISHED if complete else JobState.FAILED)
+        except asyncio.CancelledError:
+            self._set_state(job, JobState.STOPPED)
+        except Exception as e:
+            self._write(f"{prefix}Error: {e}\n")
+            self._set_state(job, JobState.FINISHED if finishing else JobState.FAILED)
+        finally:
+            self._restarts.discard(job.job_id)
+            for future in converting:
+                future.cancel()  # when stopped or failed while converting
+            pipeline = self._pipelines.pop(job.job_id, None)
+            if pipeline is not None and unconverted and any(pipeline[0].iterdir()):
+                self._write(
+                    f"{prefix}The downloads that could not be converted are kept "
+                    f"in {pipeline[0]}\n"
+                )
+            elif pipeline is not None:
+                shutil.rmtree(pipeline[0], ignore_errors=True)
+            songs = self._songs.pop(job.job_id, None)
+            if songs is not None and self.matches is not None:
+                self.post("-matches-", self.matches.stats())
+            summary = metrics.format_summary()
+            if summary:
+                self._write(
+                    f"{prefix}Timings:\n"
+                    + "".join(prefix + line for line in summary.splitlines(True))
+                )
+            progress.flush()
+            self._notify(job)
+            self._rebalance()
@@ -0,0 +1,87 @@
+"""
+Persistent journal of finished tracks, used to resume interrupted downloads.
+
+Each playlist (or album, or any other spotdl query) gets an append-only JSON
+lines file in which every track spotdl reports as downloaded or skipped is
+recorded as soon as the output parser sees it.  When the same URL is queued
+again the queue asks spotdl for the track list (``spotdl save``), drops the
+tracks the journal already knows about and downloads only the rest from a
+``.spotdl`` file.  The journal of a job is cleared once the job finishes.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable, List, Set
+
+from common import APP_DIR
+
+
+def song_display_name(song: dict) -> str:
+    """
+    Returns the name spotdl prints for a song of a ``.spotdl`` file, e.g.
+    ``Artist - Title``.
+    """
+    artist = song.get("artist") or ", ".join(song.get("artists") or [])
+    return f"{artist} - {song.get('name', '')}"
+
+
+class JobJournal:
+    """Stores one ``<hash>.jsonl`` journal per query in ``directory``."""
+
+    def __init__(self, directory: os.PathLike = APP_DIR / "journal"):
+        """
+        :param directory: Folder holding the journal and ``.spotdl`` files.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _stem(self, query: str) -> str:
+        return hashlib.sha1(query.strip().encode("utf-8")).hexdigest()
+
+    def path_for(self, query: str) -> Path:
+        return self.directory / f"{self._stem(query)}.jsonl"
+
+    def save_file_for(self, query: str) -> Path:
+        """Returns the ``.spotdl`` file used to resume ``query``."""
+        return self.directory / f"{self._stem(query)}.spotdl"
+
+    def record(self, query: str, song: str, status: str) -> None:
+        """
+        Appends a finished track to the journal of ``query``.
+
+        :param query: (str) The URL the job was started with.
+        :param song: (str) The track as printed by spotdl (``Artist - Title``).
+        :param status: (str) How the track finished, e.g. ``downloaded``.
+        """
+        entry = {"song": song, "status": status, "time": time.time()}
+        with open(self.path_for(query), "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def completed(self, query: str) -> Set[str]:
+        """Returns the tracks of ``query`` finished in earlier runs."""
+        songs = set()
+        try:
+            with open(self.path_for(query), encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        songs.add(json.loads(line)["song"])
+                    except (ValueError, KeyError):
+                        continue  # a line cut short by a crash
+        except FileNotFoundError:
+            pass
+        return songs
+
+    def remaining(self, songs: Iterable[dict], finished: Set[str]) -> List[dict]:
+        """Filters the songs of a ``.spotdl`` file down to unfinished ones."""
+        return [song for song in songs if song_display_name(song) not in finished]
+
+    def clear(self, query: str) -> None:
+        """Forgets the progress of ``query`` once it has been fully processed."""
+        for path in (self.path_for(query), self.save_file_for(query)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
@@ -79,6 +79,18 @@ download_settings_tab = sg.Tab(
                     [
                         sg.Text("FFmpeg Args:", size=(13, 1)),
                         sg.InputText(key="FFMPEG_ARGS", expand_x=True),
+                        sg.Checkbox(
+                            "Convert Separately",
+                            key="PIPELINE",
+                            tooltip="Let spotdl only download and convert to the "
+                            "format in a pool of FFmpeg processes meanwhile",
+                        ),
+                        sg.Checkbox(
+                            "ReplayGain",
+                            key="REPLAYGAIN",
+                            tooltip="Measure the loudness of new files and tag "
+                            "them so players even out the volume (needs NumPy)",
+                        ),
                     ],
                     [
                         sg.Text("Log Level:"),
@@ -98,6 +110,28 @@ download_settings_tab = sg.Tab(
                             default_value="INFO",
                             readonly=True,
                         ),
+                        sg.Text("Parallel Jobs:"),
+                        sg.Spin(
+                            list(range(1, 9)),
+                            initial_value=2,
+                            key="MAX_JOBS",
+                            readonly=True,
+                            size=(5, 1),
+                        ),
+                        sg.Checkbox(
+                            "Auto-tune",
+                            key="AUTO_TUNE",
+                            default=False,
+                            tooltip="Adjust threads and parallel jobs to the download "
+                            "rate, starting from one job and going up to the number "
+                            "of Parallel Jobs",
+                        ),
+                        sg.Push(),
+                        sg.Button(
+                            "Load Older",
+                            key="-older-",
+                            tooltip="Show the output that no longer fits in the view",
+                        ),
                     ],
                     [
                         sg.Multiline(
@@ -168,6 +202,25 @@ advanced_settings_tab = sg.Tab(
                         sg.Text("YT-DLP Args:", size=(18, 1)),
                         sg.InputText(key="YT_DLP_ARGS"),
                     ],
+                    [
+                        sg.Text("Track List Cache (min):", size=(18, 1)),
+                        sg.InputText(
+                            "60",
+                            key="METADATA_TTL",
+                            tooltip="Reuse the track list of a playlist or album "
+                            "fetched less than this many minutes ago",
+                        ),
+                    ],
+                    [
+                        sg.Text("Match Cache:", size=(18, 1)),
+                        sg.Text("", key="MATCH_STATS", expand_x=True),
+                        sg.Button(
+                            "Warm From Library",
+                            key="-warm-matches-",
+                            tooltip="Import the matches of tracks downloaded earlier "
+                            "so they are not searched for again",
+                        ),
+                    ],
                 ],
                 expand_x=True,
                 expand_y=True,
@@ -195,12 +248,41 @@ connection_settings_tab = sg.Tab(
                         sg.Text("Port:", size=(10, 1)),
                         sg.InputText(key="PORT", expand_x=True),
                     ],
+                    [
+                        sg.Text("Bandwidth:", size=(10, 1)),
+                        sg.InputText(
+                            key="BANDWIDTH",
+                            expand_x=True,
+                            tooltip="Combined download limit of all jobs in KiB/s, "
+                            "empty for no limit",
+                        ),
+                    ],
                 ]
             )
         ]
     ],
 )
 
+# Download Queue Tab
+download_queue_tab = sg.Tab(
+    "Download Queue",
+    [
+        [
+            sg.Table(
+                [],
+                headings=["#", "URL", "State", "Progress"],
+                col_widths=[4, 40, 10, 10],
+                auto_size_columns=False,
+                justification="left",
+                num_rows=10,
+                expand_x=True,
+                expand_y=True,
+                key="JOBS",
+            )
+        ]
+    ],
+)
+
 # Main Layout
 layout = [
     [
@@ -217,8 +299,8 @@ layout = [
                     )
                 ],
                 [
-                    sg.Text("Spotify Playlist URL:", size=(15, 1)),
-                    sg.InputText(key="URL", expand_y=True, expand_x=True),
+                    sg.Text("Spotify URLs:\n(one per line)", size=(15, 2)),
+                    sg.Multiline(key="URL", size=(None, 3), expand_x=True),
                 ],
                 [
                     sg.Text("Output Directory:", size=(15, 1)),
@@ -236,12 +318,14 @@ layout = [
                                 download_settings_tab,
                                 advanced_settings_tab,
                                 connection_settings_tab,
+                                download_queue_tab,
                             ]
                         ],
                         expand_x=True,
                     )
                 ],
                 [
+                    sg.Text("", key="STATUS", expand_x=True),
                     sg.Col(
                         [
                             [
@@ -251,7 +335,7 @@ layout = [
                             ]
                         ],
                         justification="r",
-                    )
+                    ),
                 ],
             ]
         )
@@ -0,0 +1,179 @@
+"""
+Persistent index of the audio files already present in an output directory.
+
+spotdl only notices that a track exists after it has looked the track up and
+matched it, which is the slow part of a run.  ``TrackIndex`` keeps a JSON
+index of the output directory keyed by normalized ``artist - title`` so the
+download queue can drop already present tracks before spotdl is started.  A
+track only counts as present in the format being downloaded, so switching
+formats downloads the library again.
+
+Rescans are incremental: a directory whose mtime did not change since the last
+scan keeps its entries without listing or stat-ing its files, and a file whose
+mtime and size did not change keeps its keys without reading its tags.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from common import APP_DIR, mutagen
+
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".ogg", ".opus", ".m4a", ".wav"}
+
+_NOT_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes an ``artist - title`` string so that names that only differ in
+    case, accents, punctuation or characters spotdl strips from file names
+    compare equal.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NOT_WORD.sub(" ", text).strip()
+
+
+def song_keys(song: dict) -> Set[str]:
+    """Returns the index keys a song of a ``.spotdl`` file can be found under."""
+    name = song.get("name", "")
+    artists = song.get("artists") or []
+    keys = {normalize(f"{', '.join(artists)} - {name}")}
+    if song.get("artist"):
+        keys.add(normalize(f"{song['artist']} - {name}"))
+    return keys
+
+
+def _file_keys(path: str) -> List[str]:
+    keys = [normalize(os.path.splitext(os.path.basename(path))[0])]
+    if mutagen is not None:
+        try:
+            tags = mutagen.File(path, easy=True)
+        except Exception:  # mutagen raises many unrelated types on bad files
+            tags = None
+        if tags is not None and tags.get("artist") and tags.get("title"):
+            artist = ", ".join(tags["artist"])
+            keys.append(normalize(f"{artist} - {tags['title'][0]}"))
+    return keys
+
+
+class TrackIndex:
+    """Index of the audio files below ``root``, persisted between runs."""
+
+    def __init__(self, root: str, index_dir: os.PathLike = APP_DIR / "index"):
+        """
+        :param root: (str) The output directory to index.
+        :param index_dir: Folder where the index files are stored.
+        """
+        self.root = os.path.abspath(root)
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()
+        self.index_file = Path(index_dir) / f"{digest}.json"
+        self._dirs: Dict[str, dict] = {}
+        self._keys: Dict[str, Set[str]] = {}  # key -> extensions it exists in
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_file, encoding="utf-8") as file:
+                self._dirs = json.load(file)["dirs"]
+        except (OSError, ValueError, KeyError):
+            self._dirs = {}
+        self._rebuild_keys()
+
+    def _save(self) -> None:
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.index_file.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"root": self.root, "dirs": self._dirs}, file)
+        os.replace(temporary, self.index_file)
+
+    def _rebuild_keys(self) -> None:
+        self._keys = {}
+        for directory in self._dirs.values():
+            for name, (_mtime, _size, keys) in directory["files"].items():
+                extension = os.path.splitext(name)[1].lower()
+                for key in keys:
+                    self._keys.setdefault(key, set()).add(extension)
+
+    def __len__(self) -> int:
+        return sum(len(directory["files"]) for directory in self._dirs.values())
+
+    def refresh(self) -> int:
+        """
+        Brings the index up to date with the directory tree.
+
+        :return: (int) The number of files whose keys had to be (re)read.
+        """
+        with self._lock:
+            scanned = 0
+            dirs = {}
+            stack = [self.root]
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                old = self._dirs.get(path)
+                if old is not None and old["mtime"] == mtime:
+                    dirs[path] = old
+                    stack.extend(os.path.join(path, sub) for sub in old["subdirs"])
+                    continue
+
+                old_files = old["files"] if old is not None else {}
+                files, subdirs = {}, []
+                try:
+                    entries = list(os.scandir(path))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in AUDIO_EXTENSIONS:
+                        continue
+                    stat = entry.stat()
+                    previous = old_files.get(entry.name)
+                    if previous and previous[:2] == [stat.st_mtime_ns, stat.st_size]:
+                        files[entry.name] = previous
+                        continue
+                    keys = _file_keys(entry.path)
+                    files[entry.name] = [stat.st_mtime_ns, stat.st_size, keys]
+                    scanned += 1
+                dirs[path] = {"mtime": mtime, "subdirs": subdirs, "files": files}
+                stack.extend(os.path.join(path, sub) for sub in subdirs)
+
+            changed = dirs != self._dirs
+            self._dirs = dirs
+            if changed:
+                self._rebuild_keys()
+                self._save()
+            return scanned
+
+    def contains(self, song: dict, extension: Optional[str] = None) -> bool:
+        """
+        Returns True if a file for the ``.spotdl`` song is in the index.
+
+        :param extension: (str, optional) Only count files of this format,
+            e.g. ``mp3``.
+        """
+        if extension is not None:
+            extension = "." + extension.lstrip(".").lower()
+        for key in song_keys(song):
+            extensions = self._keys.get(key)
+            if extensions and (extension is None or extension in extensions):
+                return True
+        return False
+
+    def missing(
+        self, songs: Iterable[dict], extension: Optional[str] = None
+    ) -> List[dict]:
+        """Filters the songs of a ``.spotdl`` file down to those not present."""
+        return [song for song in songs if not self.contains(song, extension)]
@@ -0,0 +1,69 @@
+"""
+Incremental reader for the command output log.
+
+The GUI used to re-read the whole ``command_output.txt`` every time its size
+changed, which made each refresh cost proportional to the size of the log.
+``LogTail`` keeps a byte offset into the file and only returns the bytes that
+were appended since the previous call, so the cost of a refresh depends only
+on how much new output arrived.
+"""
+
+import codecs
+import os
+from typing import Optional, Tuple
+
+
+class LogTail:
+    """
+    Follows a log file that another thread or process appends to.
+
+    The reader copes with the file being deleted, truncated or replaced
+    (log rotation).  In all of those cases it starts again from the beginning
+    of the file and reports a reset so the caller can clear its view.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 64 * 1024):
+        """
+        :param path: (str) Path of the log file to follow.
+        :param chunk_size: (int) Maximum number of bytes returned by a single read.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._offset = 0
+        self._identity: Optional[Tuple[int, int]] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _restart(self, identity: Optional[Tuple[int, int]]) -> None:
+        self._offset = 0
+        self._identity = identity
+        self._decoder.reset()
+
+    def read(self) -> Tuple[str, bool]:
+        """
+        Returns the text appended to the file since the last call.
+
+        :return: (tuple) ``(text, reset)`` where ``reset`` is True when the file
+            was (re)created or truncated and previously returned text is stale.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._identity is not None:
+                self._restart(None)
+                return "", True
+            return "", False
+
+        identity = (stat.st_dev, stat.st_ino)
+        reset = False
+        if identity != self._identity or stat.st_size < self._offset:
+            self._restart(identity)
+            reset = True
+
+        if stat.st_size == self._offset:
+            return "", reset
+
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            data = file.read(min(stat.st_size - self._offset, self.chunk_size))
+        self._offset += len(data)
+        return self._decoder.decode(data), reset
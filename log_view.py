@@ -0,0 +1,99 @@
+"""
+Bounded in-memory view of the command output log.
+
+Appending every line of a session to the OUTPUT Multiline lets the widget grow
+without limit; after a few large playlists it holds hundreds of megabytes.
+``LogBuffer`` keeps only the last ``capacity`` lines in a ring buffer and
+reports how many lines fell out of it, so the GUI can drop the same lines
+from the widget.  The complete history stays in the log file on disk, and
+``older`` pages backwards through it, starting from the first line that is
+still in memory.
+"""
+
+from collections import deque
+from typing import Deque, Tuple
+
+
+class LogBuffer:
+    """The last ``capacity`` lines of a log file that is being followed."""
+
+    def __init__(self, path: str, capacity: int = 5000, page: int = 1000):
+        """
+        :param path: (str) The log file the text comes from, read by ``older``.
+        :param capacity: (int) Number of complete lines kept in memory.
+        :param page: (int) Number of lines ``older`` returns per call.
+        """
+        self.path = path
+        self.capacity = capacity
+        self.page = page
+        self.clear()
+
+    def clear(self) -> None:
+        """Forgets all text; call when the log file was reset."""
+        # (byte offset in the file, line including its "\n")
+        self._lines: Deque[Tuple[int, str]] = deque()
+        self._partial = ""
+        self._offset = 0  # offset of the start of self._partial
+        self._older = None  # where the next ``older`` page ends
+
+    def __len__(self) -> int:
+        return len(self._lines) + (1 if self._partial else 0)
+
+    @property
+    def first_offset(self) -> int:
+        """Byte offset in the file of the first line held in memory."""
+        return self._lines[0][0] if self._lines else self._offset
+
+    def append(self, text: str) -> int:
+        """
+        Adds text read from the end of the log file.
+
+        :return: (int) The number of lines dropped from the start of the view.
+        """
+        if not text:
+            return 0
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            line += "\n"
+            self._lines.append((self._offset, line))
+            self._offset += len(line.encode("utf-8"))
+        dropped = max(0, len(self._lines) - self.capacity)
+        for _ in range(dropped):
+            self._lines.popleft()
+        return dropped
+
+    def text(self) -> str:
+        """Returns the text currently held in memory."""
+        return "".join(line for _offset, line in self._lines) + self._partial
+
+    def older(self) -> str:
+        """
+        Returns up to ``page`` lines from the file that come before the ones
+        returned by the previous call, or before the ones held in memory on
+        the first call.  Returns "" once the start of the file was reached,
+        and starts over from the lines in memory on the next call.
+        """
+        end = self.first_offset if self._older is None else self._older
+        if end <= 0:
+            self._older = None
+            return ""
+        start = end
+        chunks = []
+        newlines = 0
+        try:
+            with open(self.path, "rb") as file:
+                while start > 0 and newlines <= self.page:
+                    size = min(64 * 1024, start)
+                    start -= size
+                    file.seek(start)
+                    chunk = file.read(size)
+                    chunks.insert(0, chunk)
+                    newlines += chunk.count(b"\n")
+        except OSError:
+            self._older = None
+            return ""
+        lines = b"".join(chunks)[: end - start].splitlines(keepends=True)
+        lines = lines[-self.page :]
+        self._older = end - sum(len(line) for line in lines)
+        return b"".join(lines).decode("utf-8", errors="replace")
@@ -11,7 +11,7 @@ Key Features:
 - Advanced settings for filtering results, headless operation, and cache management.
 - Logging tab for monitoring download processes and actions.
 
-The program's main GUI loop handles user interactions, capturing input data and triggering appropriate actions based on user choices. It uses threading to ensure the UI remains responsive during downloads. The `exec_command` function is a core component that executes external commands and manages output for both downloading and non-downloading processes.
+The program's main GUI loop handles user interactions, capturing input data and triggering appropriate actions based on user choices. It runs every external command on an asyncio process supervisor thread so the UI remains responsive during downloads. Downloads go through a queue that runs several spotdl processes at once, while the `exec_command` coroutine handles general commands such as the FFmpeg installation.
 
 Usage:
 Run the script and interact with the GUI to choose playlists and download settings. The program will handle the rest, providing updates and logs directly within the GUI.
@@ -27,215 +27,302 @@ Version: 0.0.1
 Date: 12.02.2023
 """
 
-import ensurepip
 import os
-import subprocess
-import sys
 import threading
 from pathlib import Path
+from typing import List, Optional
 
+from concurrency import ConcurrencyController
+from dependencies import verify_dependencies
+from diagnostics import Profiler
+from download_queue import DownloadQueue
+from journal import JobJournal
 from layout import sg, window
-
-current_process = None
-
-
-def ensure_pip():
-    """Ensure pip is installed. If not, install it using ensurepip."""
-    try:
-        # Check if pip is available
-        subprocess.run(
-            [sys.executable, "-m", "pip", "--version"],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-    # sg.popup_notify("pip is already installed.")
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        sg.popup_notify("pip is not installed. Installing pip...")
-        try:
-            ensurepip.bootstrap()
-            sg.popup_notify("pip installed successfully.")
-        except Exception as e:
-            sg.popup_error(f"Failed to install pip: {e}")
-            sys.exit(1)  # Exit the program if pip installation fails
-
-
-def check_and_install_spotdl():
-    """Check if spotdl is installed. If not, install it using pip."""
-    ensure_pip()  # Ensure pip is available
-    try:
-        # Check if spotdl is available
-        subprocess.run(
-            ["spotdl", "--version"],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        # sg.popup_notify("spotdl is already installed.")
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        sg.popup_notify("spotdl is not installed. Installing now...")
-        try:
-            # Install spotdl using pip
-            subprocess.run(
-                [sys.executable, "-m", "pip", "install", "spotdl"], check=True
-            )
-            sg.popup_notify("spotdl installed successfully.")
-        except subprocess.CalledProcessError as e:
-            sg.popup_error(f"Failed to install spotdl: {e}")
-            sys.exit(1)  # Exit the program if installation fails
-
-
-def exec_command(
-    commands: str,
+from log_tail import LogTail
+from log_view import LogBuffer
+from loudness import LoudnessAnalyzer
+from match_cache import MatchCache
+from metadata_cache import MetadataCache
+from notifications import Notifier
+from options import DownloadOptions, default_threads
+from supervisor import ProcessSupervisor
+from transcode import Transcoder
+
+
+async def exec_command(
+    supervisor: ProcessSupervisor,
+    commands: List[str],
     output_file,
     windows: sg.Window,
-    dl: bool = True,
 ) -> None:
     """
-    Executes a given command in a subprocess and handles output.
+    Executes a general (non-download) command in a subprocess and handles output.
+
+    This coroutine runs the command on the supervisor loop. It answers "y" to
+    the command's first prompt and writes its stdout and stderr to the
+    specified file. Downloads are run by the ``DownloadQueue`` instead.
 
-    This function executes a specified command using the subprocess module.
-    It captures the command's output and writes it to a specified file.
-    If the 'dl' parameter is True, it specifically handles downloading processes,
-    updating a progress bar in the GUI and managing the download state.
-    For non-downloading processes (when 'dl' is False), it simply writes the command output to the file.
+    ``-output-`` is posted with ``Window.write_event_value`` whenever new output
+    was written to the file and ``-done-`` once the process has finished.
+    Cancelling the returned future terminates the process.
 
     Parameters:
 
-    :param commands: (str) The command to be executed in the subprocess.
+    :param supervisor: (ProcessSupervisor) The supervisor the command runs on.
+    :param commands: (list) The program to execute and its arguments.
     :param output_file: The file path where the command's output will be written.
-    :param windows: (sg.Window): The PySimpleGUI window object used for updating the GUI elements.
-    :param dl: (bool, optional) A flag to indicate whether the command
-        is for downloading (True) or a general command (False). Defaults to True.
+    :param windows: (sg.Window): The PySimpleGUI window the events are posted to.
 
     Returns:
     - None
     """
-    global current_process
+    with open(output_file, "a", encoding="utf-8") as file:
+
+        def on_line(_stream: str, line: str) -> None:
+            file.write(line)
+            file.flush()
+            windows.write_event_value("-output-", None)
+
+        try:
+            await supervisor.run(commands, on_line, stdin_data="y\n")
+        except OSError as e:
+            file.write(f"Error: {e}\n")
+        finally:
+            windows.write_event_value("-done-", None)
+
+
+def job_rows(jobs) -> list:
+    """Formats ``DownloadJob`` snapshots as rows of the JOBS table."""
+    rows = []
+    for job in jobs:
+        progress = f"{job.processed}/{job.total}" if job.total else str(job.done)
+        if job.failed:
+            progress += f" ({job.failed} failed)"
+        rows.append([job.job_id, job.url, job.state.value, progress])
+    return rows
+
+
+def whole_number(values: dict, key: str, label: str, unit: str) -> int:
+    """Reads a non-negative whole number field, empty meaning 0."""
     try:
-        current_process = subprocess.Popen(
-            commands,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            universal_newlines=True,
-        )
-        if dl:
-            num_songs_downloaded = 0
-            total_songs = None
-            windows["-download-"].update(disabled=True)
-            windows["-stop-"].update(disabled=False)
-            with open(output_file, "a", encoding="utf-8") as file:
-                for line in current_process.stdout:
-                    if "Found" in line and "songs" in line:
-                        total_songs = int(line.split()[1]) - 1
-                        windows["PROGRESS_BAR"].update_bar(
-                            0, total_songs
-                        )  # Initialize the progress bar
-                    # Prepend number to 'Downloaded' lines
-                    if "Downloaded" in line or "Skipping" in line:
-                        num_songs_downloaded += 1
-                        line = f"{num_songs_downloaded}. {line}"
-                        windows["PROGRESS_BAR"].update_bar(
-                            num_songs_downloaded
-                        )  # Update the progress bar
-
-                    file.write(line)
-                    file.flush()
-                    if total_songs and num_songs_downloaded == total_songs:
-                        file.write(f"\nDownloaded successfully {total_songs} songs.")
-                        windows["-download-"].update(disabled=False)
-                        current_process.terminate()
-                        break
-        else:
-            with open(output_file, "a") as file:
-                current_process.stdin.write("y\n")
-                current_process.stdin.flush()
-
-                for line in iter(current_process.stdout.readline, ""):
-                    file.write(line)
-                    file.flush()
-
-        current_process.wait()
-    except threading.ThreadError as e:
-        windows["OUTPUT"].print(f"Error: {e}\n")
-        windows["-stop-"].update(disabled=True)
-    finally:
-        current_process = None
-        windows["-stop-"].update(disabled=True)
-
-
-def main_gui() -> None:
+        number = int(str(values[key]).strip() or 0)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ValueError(f"{label} must be a whole number of {unit}")
+    return number
+
+
+def match_summary(stats: dict) -> str:
+    return (
+        f"{stats['entries']} matches ({stats['bytes'] // 1024} KiB), "
+        f"{stats['hits']} hits / {stats['misses']} misses this session"
+    )
+
+
+def warm_matches(windows: sg.Window, matches: MatchCache, folder: str) -> None:
+    """
+    Imports the matches of earlier downloads below ``folder`` on a background
+    thread and posts ``-warmed-`` with ``(matches, files)`` when done.
+    """
+    threading.Thread(
+        target=lambda: windows.write_event_value("-warmed-", matches.warm(folder)),
+        daemon=True,
+    ).start()
+
+
+def check_dependencies(windows: sg.Window, notifier: Notifier) -> None:
+    """
+    Verifies pip and spotdl on a background thread. Messages go to the status
+    strip through ``notifier`` and the outcome is posted as a
+    ``-dependencies-`` event.
+    """
+    threading.Thread(
+        target=lambda: windows.write_event_value(
+            "-dependencies-", verify_dependencies(notifier.notify)
+        ),
+        daemon=True,
+    ).start()
+
+
+def main_gui(profiler: Optional[Profiler] = None) -> None:
     output_file = "command_output.txt"  # Define the output file
-    if os.path.isfile(output_file):
-        os.remove(output_file)
-    last_size = -1
+    metrics_file = "command_output.metrics.jsonl"  # Timings of every track
+    for path in (output_file, metrics_file):
+        if os.path.isfile(path):
+            os.remove(path)
+    log_tail = LogTail(output_file)
+    log_buffer = LogBuffer(output_file)
+    supervisor = ProcessSupervisor()
+    metadata = MetadataCache()
+    matches = MatchCache()
+    transcoder = Transcoder()  # its pool only starts when first used
+    replaygain = LoudnessAnalyzer()
+    read = window.read
+    if profiler is not None:
+        profiler.watch(supervisor.loop)
+        read = profiler.timed(window.read)
+    downloads = DownloadQueue(
+        supervisor,
+        window.write_event_value,
+        output_file,
+        idle_timeout=15 * 60,
+        journal=JobJournal(),
+        metrics_file=metrics_file,
+        metadata=metadata,
+        matches=matches,
+    )
+    controller = ConcurrencyController()
+    command = None  # Future of the running general command, if any
+    jobs = {}
+
+    # Show the window right away and verify spotdl in the background
+    window.finalize()
+    window["-download-"].update(disabled=True)
+    window["Install/Check FFmpeg"].update(disabled=True)
+    notifier = Notifier(window.write_event_value)
+    window["MATCH_STATS"].update(match_summary(matches.stats()))
+    check_dependencies(window, notifier)
     while True:
-        event, values = window.read(1)
+        event, values = read()
 
         if event == sg.WIN_CLOSED or event == "Exit":
+            downloads.stop()
+            if profiler is not None:
+                profiler.unwatch(supervisor.loop)
+            supervisor.close()
+            transcoder.close()
+            replaygain.close()
             break
         elif event == "-stop-":
-            if current_process is not None:
-                current_process.terminate()
-                current_process.wait()
-                window["-download-"].update(disabled=False)
-                window["-stop-"].update(disabled=True)
-                sg.popup("Download stopped.")
+            stopped = downloads.stop()
+            if command is not None and command.cancel():
+                stopped += 1
+            if stopped:
+                notifier.notify("Download stopped.")
             else:
                 sg.popup_error("No active process to stop.")
         elif event == "-download-":
-            if not values["URL"]:
+            urls = values["URL"].split()
+            if not urls:
                 sg.popup_error("Add a valid spotify link")
                 continue
-            command = f"spotdl {values['URL']} --threads {os.cpu_count()-1} "
-            if values["AUDIO_SOURCE"]:
-                command += f" --audio {values['AUDIO_SOURCE']}"
-            if values["LYRICS_SOURCE"]:
-                command += f" --lyrics {values['LYRICS_SOURCE']}"
-            if values["FORMAT"]:
-                command += f" --format {values['FORMAT']}"
-            if values["BITRATE"]:
-                command += f" --bitrate {values['BITRATE']}"
-            if values["FFMPEG_ARGS"]:
-                command += f" --ffmpeg-args \"{values['FFMPEG_ARGS']}\""
-            if values["OUTPUT-DIRECTORY"]:
-                Path(values["OUTPUT-DIRECTORY"]).mkdir(parents=True, exist_ok=True)
-                command += f" --output \"{values['OUTPUT-DIRECTORY']}\""
-
-            threading.Thread(
-                target=exec_command,
-                args=(command, output_file, window, True),
-                daemon=True,
-            ).start()
+            try:
+                options = DownloadOptions.from_values(values, threads=default_threads())
+            except ValueError as e:
+                sg.popup_error(str(e))
+                continue
+            try:
+                bandwidth = whole_number(values, "BANDWIDTH", "Bandwidth", "KiB/s")
+                ttl = whole_number(
+                    values, "METADATA_TTL", "Track list cache", "minutes"
+                )
+            except ValueError as e:
+                sg.popup_error(str(e))
+                continue
+            if options.output_dir:
+                Path(options.output_dir).mkdir(parents=True, exist_ok=True)
+            downloads.set_bandwidth(bandwidth * 1024 or None)
+            downloads.transcoder = transcoder if values["PIPELINE"] else None
+            downloads.replaygain = replaygain if values["REPLAYGAIN"] else None
+            metadata.ttl = ttl * 60
+
+            max_jobs = int(values["MAX_JOBS"])
+            if values["AUTO_TUNE"]:
+                # The spin box becomes the upper bound of the controller
+                controller.set_bounds(max_jobs=max_jobs)
+                downloads.controller = controller
+                downloads.set_max_workers(controller.jobs)
+            else:
+                downloads.controller = None
+                downloads.set_max_workers(max_jobs)
+            for url in urls:
+                downloads.submit(url, options.to_argv(url), options.output_dir or None)
+            window["URL"].update("")
+            window["-stop-"].update(disabled=False)
 
         elif event == "Install/Check FFmpeg":
-            threading.Thread(
-                target=exec_command,
-                args=(
-                    "spotdl --download-ffmpeg",
-                    output_file,
-                    window,
-                    False,
-                ),
-                daemon=True,
-            ).start()
-
-        if os.path.exists(output_file):
-            current_size = os.path.getsize(output_file)
-            if current_size != last_size:
-                with open(output_file, "r", encoding="utf-8") as file:
-                    window["OUTPUT"].update(file.read())
-                last_size = current_size
+            window["-stop-"].update(disabled=False)
+            command = supervisor.submit(
+                exec_command(
+                    supervisor, ["spotdl", "--download-ffmpeg"], output_file, window
+                )
+            )
+
+        elif event == "-job-":
+            job = values[event]
+            jobs[job.job_id] = job
+            window["JOBS"].update(values=job_rows(jobs.values()))
+            done = sum(job.processed for job in jobs.values())
+            total = sum(job.total or job.processed for job in jobs.values())
+            window["PROGRESS_BAR"].update(current_count=done, max=max(total, 1))
+
+        elif event == "-done-":
+            command = None
+
+        elif event == "-matches-":
+            window["MATCH_STATS"].update(match_summary(values[event]))
+
+        elif event == "-warm-matches-":
+            folder = sg.popup_get_folder(
+                "Import the matches of tracks downloaded to:",
+                default_path=values["OUTPUT-DIRECTORY"],
+            )
+            if folder:
+                window["-warm-matches-"].update(disabled=True)
+                warm_matches(window, matches, folder)
+
+        elif event == "-warmed-":
+            imported, files = values[event]
+            notifier.notify(f"Imported {imported} matches from {files} files.")
+            window["-warm-matches-"].update(disabled=False)
+            window["MATCH_STATS"].update(match_summary(matches.stats()))
+
+        elif event == "-older-":
+            older = log_buffer.older()
+            if older:
+                sg.popup_scrolled(
+                    older, title="Older output", size=(100, 30), non_blocking=True
+                )
+            else:
+                notifier.notify("No older output in the log.")
+
+        elif event == "-status-":
+            message, error = values[event]
+            window["STATUS"].update(
+                message, text_color="red" if error else sg.theme_text_color()
+            )
+
+        elif event == "-dependencies-":
+            window["-download-"].update(disabled=not values[event])
+            window["Install/Check FFmpeg"].update(disabled=not values[event])
+
+        if event in ("-job-", "-done-"):
+            busy = any(job.active for job in jobs.values())
+            busy = busy or (command is not None and not command.done())
+            window["-stop-"].update(disabled=not busy)
+
+        if event in ("-output-", "-done-"):
+            while True:
+                new_output, reset = log_tail.read()
+                if reset:
+                    log_buffer.clear()
+                    window["OUTPUT"].update("")
+                if not new_output:
+                    break
+                dropped = log_buffer.append(new_output)
+                window["OUTPUT"].update(new_output, append=True)
+                if dropped:
+                    # Keep the widget in step with the ring buffer
+                    window["OUTPUT"].Widget.delete("1.0", f"{dropped + 1}.0")
     window.close()
 
 
 if __name__ == "__main__":
-    # Check if spotdl is installed
-    check_and_install_spotdl()
-
-    # Run the GUI in the main thread
-    main_gui()
+    # Run the GUI in the main thread; spotdl is checked once the window is up
+    profiler = Profiler.from_environment()  # SPOTIFYDL_PROFILE=1
+    if profiler is None:
+        main_gui()
+    else:
+        with profiler:
+            main_gui(profiler)
@@ -0,0 +1,286 @@
+"""
+Cache of the audio matches spotdl found for Spotify tracks.
+
+Searching the audio providers is the slowest part of downloading a track,
+and spotdl forgets the result once the track is saved.  It does however skip
+the search for every entry of a ``.spotdl`` file that already has a
+``download_url``.  ``MatchCache`` remembers the Spotify URL to download URL
+pairs spotdl reports ('Downloaded "Artist - Title": <url>') in a SQLite
+database, and fills them into the ``.spotdl`` files the download queue
+prepares, so re-downloads skip the search.
+
+Matches are kept per audio provider (``--audio``), so switching providers
+does not reuse the URLs another one found, and a match whose download fails
+is forgotten so the next run searches again.  The cache is capped by entries
+and by bytes; when either cap is exceeded the least recently used matches
+are evicted.  ``warm`` imports matches from earlier downloads: the tags
+spotdl writes into every audio file (the Spotify URL in WOAS, the download
+URL in the comment) and ``.spotdl`` files saved with results; their provider
+is told by the host of the download URL.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from common import APP_DIR, Database, mutagen
+from library import AUDIO_EXTENSIONS
+
+MATCH_CACHE = APP_DIR / "matches.sqlite3"
+
+DEFAULT_PROVIDER = "youtube-music"  # spotdl's default --audio
+
+
+def audio_provider(options: List[str]) -> str:
+    """Returns the ``--audio`` provider of a spotdl argument list."""
+    for option in options:
+        if option.startswith("--audio="):
+            return option.split("=", 1)[1].strip() or DEFAULT_PROVIDER
+    return DEFAULT_PROVIDER
+
+
+def provider_of(download_url: str) -> str:
+    """Tells the audio provider of an imported match by its download URL."""
+    host = (urlsplit(download_url).hostname or "").split(".")
+    if host[:1] in (["www"], ["m"]):
+        host = host[1:]
+    host = ".".join(host)
+    if host == "music.youtube.com":
+        return "youtube-music"
+    if host in ("youtube.com", "youtu.be"):
+        return "youtube"
+    for provider in ("soundcloud", "bandcamp"):
+        if host == f"{provider}.com" or host.endswith(f".{provider}.com"):
+            return provider
+    if host.endswith("slider.kz"):
+        return "slider-kz"
+    return host
+
+
+def _text(value) -> Optional[str]:
+    """Returns the first string in a mutagen tag value of any format."""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    for attribute in ("url", "text"):
+        if hasattr(value, attribute):
+            return _text(getattr(value, attribute))
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def read_tags(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns ``(spotify_url, download_url)`` from the tags spotdl wrote into
+    an audio file, or None if the file has none or mutagen is missing.
+    """
+    if mutagen is None:
+        return None
+    try:
+        audio = mutagen.File(path)
+    except Exception:  # mutagen raises many unrelated types on bad files
+        return None
+    if audio is None or audio.tags is None:
+        return None
+    tags = audio.tags
+    if hasattr(tags, "getall"):  # ID3 (mp3)
+        woas, comments = tags.getall("WOAS"), tags.getall("COMM")
+    else:  # MP4 and Vorbis comments
+        woas = tags.get("----:spotdl:WOAS") or tags.get("woas")
+        comments = tags.get("\xa9cmt") or tags.get("comment")
+    spotify_url, download_url = _text(woas), _text(comments)
+    if not spotify_url or not download_url or "://" not in download_url:
+        return None
+    return spotify_url, download_url
+
+
+class MatchCache:
+    """Spotify URL to download URL matches per provider, bounded with LRU eviction."""
+
+    def __init__(
+        self,
+        path=MATCH_CACHE,
+        max_entries: int = 50000,
+        max_bytes: int = 16 * 2**20,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param path: Location of the SQLite database, created when missing.
+        :param max_entries: (int) Matches kept at most.
+        :param max_bytes: (int) Combined size of the stored URLs kept at most.
+        :param clock: (callable) Returns the current time, for tests.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._database = Database(
+            self.path,
+            [
+                "CREATE TABLE IF NOT EXISTS matches ("
+                "url TEXT NOT NULL, provider TEXT NOT NULL, "
+                "download_url TEXT NOT NULL, used REAL NOT NULL, "
+                "size INTEGER NOT NULL, PRIMARY KEY (url, provider))",
+                "CREATE INDEX IF NOT EXISTS matches_used ON matches (used)",
+                "CREATE INDEX IF NOT EXISTS matches_download_url "
+                "ON matches (download_url)",
+            ],
+            pragmas=["synchronous = NORMAL"],
+        )
+
+    def apply(self, songs: List[dict], provider: str = DEFAULT_PROVIDER) -> int:
+        """
+        Fills in the known ``download_url`` of every song in a ``.spotdl``
+        track list that has none, and counts the hits and misses.
+
+        :param provider: (str) The audio provider the songs are downloaded from.
+        :return: (int) The number of songs that got a match.
+        """
+        wanted = [s for s in songs if s.get("url") and not s.get("download_url")]
+        if not wanted:
+            return 0
+        found: Dict[str, str] = {}
+        urls = [song["url"] for song in wanted]
+        with closing(self._database.connect()) as connection, connection:
+            for start in range(0, len(urls), 500):  # SQLite variable limit
+                batch = urls[start : start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(
+                    connection.execute(
+                        "SELECT url, download_url FROM matches "
+                        f"WHERE provider = ? AND url IN ({marks})",
+                        [provider, *batch],
+                    ).fetchall()
+                )
+                connection.execute(
+                    "UPDATE matches SET used = ? "
+                    f"WHERE provider = ? AND url IN ({marks})",
+                    [self.clock(), provider, *batch],
+                )
+        for song in wanted:
+            if song["url"] in found:
+                song["download_url"] = found[song["url"]]
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+        return len(found)
+
+    def put_many(
+        self, matches: Iterable[Tuple[str, str]], provider: Optional[str] = None
+    ) -> int:
+        """
+        Stores ``(spotify_url, download_url)`` pairs, then evicts the least
+        recently used matches beyond the caps.
+
+        :param provider: (str, optional) The audio provider that found the
+            matches; told from each download URL when not given.
+        :return: (int) The number of pairs stored.
+        """
+        now = self.clock()
+        rows = [
+            (
+                url,
+                provider or provider_of(download),
+                download,
+                now,
+                len(url.encode()) + len(download.encode()),
+            )
+            for url, download in matches
+        ]
+        if not rows:
+            return 0
+        with closing(self._database.connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?)", rows
+            )
+            connection.execute(
+                "DELETE FROM matches WHERE rowid IN (SELECT rowid "
+                "FROM matches ORDER BY used DESC, url LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            connection.execute(
+                "DELETE FROM matches WHERE rowid IN (SELECT rowid FROM ("
+                "SELECT rowid, SUM(size) OVER (ORDER BY used DESC, url, provider) "
+                "AS total FROM matches) WHERE total > ?)",
+                (self.max_bytes,),
+            )
+        return len(rows)
+
+    def put(self, spotify_url: str, download_url: str, provider: str) -> None:
+        self.put_many([(spotify_url, download_url)], provider)
+
+    def forget(self, download_url: str) -> int:
+        """
+        Removes the matches pointing to a download URL, e.g. one whose video
+        was taken down, so the tracks are searched for again.
+
+        :return: (int) The number of matches removed.
+        """
+        with closing(self._database.connect()) as connection, connection:
+            return connection.execute(
+                "DELETE FROM matches WHERE download_url = ?", (download_url,)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the entries and bytes stored and this session's hits and misses."""
+        with closing(self._database.connect()) as connection:
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM matches"
+            ).fetchone()
+        with self._lock:
+            return {
+                "entries": entries,
+                "bytes": size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        with closing(self._database.connect()) as connection, connection:
+            connection.execute("DELETE FROM matches")
+
+    def warm(self, directory: str) -> Tuple[int, int]:
+        """
+        Imports the matches of earlier downloads found below ``directory``:
+        the tags of audio files and ``.spotdl`` files with download URLs.
+
+        :return: (tuple) ``(matches imported, files they came from)``.
+        """
+        matches: Dict[str, str] = {}
+        files = 0
+        for root, _dirs, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                extension = os.path.splitext(name)[1].lower()
+                found = []
+                if extension == ".spotdl":
+                    try:
+                        with open(path, encoding="utf-8") as file:
+                            songs = json.load(file)
+                    except (OSError, ValueError):
+                        continue
+                    if isinstance(songs, list):
+                        found = [
+                            (song["url"], song["download_url"])
+                            for song in songs
+                            if isinstance(song, dict)
+                            and song.get("url")
+                            and song.get("download_url")
+                        ]
+                elif extension in AUDIO_EXTENSIONS:
+                    match = read_tags(path)
+                    found = [match] if match else []
+                if found:
+                    files += 1
+                    matches.update(found)
+        return self.put_many(matches.items()), files
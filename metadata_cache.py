@@ -0,0 +1,167 @@
+"""
+Persistent cache of resolved playlist and album track lists.
+
+Resolving a large playlist through Spotify takes spotdl a noticeable time on
+every run, although the track list rarely changes between two clicks of
+Download.  ``MetadataCache`` keeps the track lists in a SQLite database,
+keyed by the normalized URL, so the download queue can hand spotdl a saved
+``.spotdl`` file instead of the URL:
+
+* an entry younger than ``ttl`` is used as is;
+* an older one is resolved again, and if resolving fails (offline, rate
+  limited) the old entry is still used rather than failing the job.
+
+Resolving itself is done by a ``resolver`` coroutine passed in by the caller,
+normally ``spotdl save``, so any stub can stand in for it.
+"""
+
+import hashlib
+import json
+import re
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from common import APP_DIR, Database
+
+METADATA_CACHE = APP_DIR / "metadata.sqlite3"
+
+# Kinds of Spotify URLs whose track list is worth caching
+CACHED_KINDS = ("playlist", "album")
+
+Resolver = Callable[[str], Awaitable[Optional[List[dict]]]]
+
+_URI = re.compile(r"spotify:(?P<kind>[a-z]+):(?P<id>[A-Za-z0-9]+)$")
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Returns the canonical ``https://open.spotify.com/<kind>/<id>`` form of a
+    playlist or album URL or URI, or None for anything else.
+
+    Share links add ``?si=...`` and localized ones ``/intl-xx/``; neither
+    changes the track list.
+    """
+    url = url.strip()
+    match = _URI.match(url)
+    if match:
+        kind, item = match["kind"], match["id"]
+    else:
+        parts = urlsplit(url)
+        if parts.hostname != "open.spotify.com":
+            return None
+        path = [part for part in parts.path.split("/") if part]
+        if path and path[0].startswith("intl-"):
+            path = path[1:]
+        if len(path) != 2:
+            return None
+        kind, item = path
+    if kind not in CACHED_KINDS:
+        return None
+    return f"https://open.spotify.com/{kind}/{item}"
+
+
+def _digest(songs: List[dict]) -> str:
+    data = json.dumps(songs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class MetadataCache:
+    """Track lists of playlists and albums with a time to live."""
+
+    def __init__(
+        self,
+        path=METADATA_CACHE,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param path: Location of the SQLite database, created when missing.
+        :param ttl: (float) Seconds an entry is used without resolving again;
+            0 resolves every time but still falls back to the cache on errors.
+        :param clock: (callable) Returns the current time, for tests.
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        self.clock = clock
+        self._database = Database(
+            self.path,
+            [
+                "CREATE TABLE IF NOT EXISTS track_lists ("
+                "url TEXT PRIMARY KEY, fetched REAL NOT NULL, "
+                "digest TEXT NOT NULL, songs TEXT NOT NULL)"
+            ],
+        )
+
+    def get(self, url: str) -> Optional[Tuple[List[dict], float]]:
+        """
+        Returns ``(songs, age_in_seconds)`` for a cached URL, however old, or
+        None if the URL is not cached or cannot be cached.
+        """
+        key = normalize_url(url)
+        if key is None:
+            return None
+        with closing(self._database.connect()) as connection:
+            row = connection.execute(
+                "SELECT fetched, songs FROM track_lists WHERE url = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[1]), self.clock() - row[0]
+
+    def put(self, url: str, songs: List[dict]) -> bool:
+        """
+        Stores a freshly resolved track list.
+
+        :return: (bool) True if it differs from the one cached before.
+        """
+        key = normalize_url(url)
+        if key is None:
+            return True
+        digest = _digest(songs)
+        with closing(self._database.connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT digest FROM track_lists WHERE url = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0] == digest:
+                connection.execute(
+                    "UPDATE track_lists SET fetched = ? WHERE url = ?",
+                    (self.clock(), key),
+                )
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO track_lists VALUES (?, ?, ?, ?)",
+                (key, self.clock(), digest, json.dumps(songs, ensure_ascii=False)),
+            )
+        return True
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Forgets one URL, or every cached track list when ``url`` is None."""
+        with closing(self._database.connect()) as connection, connection:
+            if url is None:
+                connection.execute("DELETE FROM track_lists")
+            else:
+                connection.execute(
+                    "DELETE FROM track_lists WHERE url = ?", (normalize_url(url),)
+                )
+
+    async def track_list(
+        self, url: str, resolver: Resolver
+    ) -> Tuple[Optional[List[dict]], str]:
+        """
+        Returns the track list of ``url`` and where it came from: "cached"
+        (within the TTL), "resolved", "unchanged" (resolved, same as cached),
+        "stale" (resolving failed, older cache entry used) or "failed".
+        """
+        cached = self.get(url)
+        if cached is not None and cached[1] < self.ttl:
+            return cached[0], "cached"
+        songs = await resolver(url)
+        if songs is None:
+            if cached is not None:
+                return cached[0], "stale"
+            return None, "failed"
+        changed = self.put(url, songs)
+        return songs, "resolved" if changed or cached is None else "unchanged"
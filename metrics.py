@@ -0,0 +1,160 @@
+"""
+Per-track timing of download jobs.
+
+``JobMetrics`` timestamps the parsed spotdl events of one job and derives how
+long each track spent in each stage:
+
+* ``lookup``: from the start of spotdl to "Found N songs", i.e. fetching the
+  playlist metadata (once per spotdl run);
+* ``search``: from the moment a download thread became free for the track to
+  "Downloading ... using", i.e. finding the audio (``--log-level DEBUG`` only);
+* ``download``: from "Downloading ... using" to "Downloaded", which includes
+  the FFmpeg conversion and tagging since spotdl logs nothing in between;
+* ``total``: from the moment a thread became free for the track to its outcome.
+
+spotdl does not log when it starts a track.  It starts them in playlist
+order as its ``--threads`` slots free up, so a track is assumed to start when
+the oldest unclaimed slot became free: when "Found" was printed for the first
+``threads`` tracks, and when an earlier track finished for the others.  spotdl
+prints no "Found" for a ``.spotdl`` file, whose tracks are known up front, so
+there the first slots are free as soon as spotdl is started.
+
+Every finished track is appended to a metrics file, as JSON lines or, if the
+file name ends in ``.csv``, as CSV.  ``summary`` returns p50/p95/max per stage.
+"""
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from spotdl_output import TRACK_DONE, Downloaded, DownloadStarted, Event, Found, Skipped
+
+STAGES = ("lookup", "search", "download", "total")
+FIELDS = ("time", "job", "url", "song", "status", "search", "download", "total")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the nearest-rank ``q`` percentile (0-100) of ``values``."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil without floats
+    return ordered[int(rank) - 1]
+
+
+class JobMetrics:
+    """Collects stage durations for the tracks of one download job."""
+
+    def __init__(self, job_id: int, url: str, path: Optional[str] = None):
+        """
+        :param job_id: (int) The job the tracks belong to.
+        :param url: (str) The URL of the job.
+        :param path: (str, optional) Metrics file the tracks are appended to.
+        """
+        self.job_id = job_id
+        self.url = url
+        self.path = path
+        self.threads = 1
+        self.started = time.monotonic()
+        self.durations: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._free: Deque[float] = deque()  # times download slots became free
+        self._tracks: Dict[str, Dict[str, float]] = {}
+
+    def begin(self, threads: int, query: str = "", now: Optional[float] = None) -> None:
+        """
+        Call right before spotdl is started for the job.
+
+        :param threads: (int) The ``--threads`` spotdl runs with.
+        :param query: (str) The query spotdl is started with; for a ``.spotdl``
+            file the first ``threads`` tracks start right away.
+        """
+        self.threads = max(1, threads)
+        self._free.clear()
+        self._tracks.clear()
+        self.started = time.monotonic() if now is None else now
+        if query.endswith(".spotdl"):
+            self._free.extend([self.started] * self.threads)
+
+    def _track(self, song: str, now: float) -> Dict[str, float]:
+        track = self._tracks.get(song)
+        if track is None:
+            start = self._free.popleft() if self._free else now
+            track = self._tracks[song] = {"start": min(start, now)}
+        return track
+
+    def record(self, event: Event, now: Optional[float] = None) -> None:
+        """Timestamps one parsed event."""
+        now = time.monotonic() if now is None else now
+        if isinstance(event, Found):
+            self.durations["lookup"].append(now - self.started)
+            if not self._free and not self._tracks:  # not seeded by ``begin``
+                self._free.extend([now] * self.threads)
+        elif isinstance(event, DownloadStarted):
+            self._track(event.song, now)["download"] = now
+        elif isinstance(event, TRACK_DONE) and event.song:
+            track = self._track(event.song, now)
+            del self._tracks[event.song]
+            self._free.append(now)
+            row = {"total": now - track["start"], "search": None, "download": None}
+            if "download" in track:
+                row["search"] = track["download"] - track["start"]
+                row["download"] = now - track["download"]
+            if isinstance(event, Downloaded):
+                status = "downloaded"
+            elif isinstance(event, Skipped):
+                status = "skipped"
+            else:
+                status = "failed"
+            if status != "skipped":  # skipped tracks would drag the stats down
+                for stage in ("search", "download", "total"):
+                    if row[stage] is not None:
+                        self.durations[stage].append(row[stage])
+            self._write(event.song, status, row)
+
+    def _write(self, song: str, status: str, row: Dict[str, Optional[float]]) -> None:
+        if self.path is None:
+            return
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "job": self.job_id,
+            "url": self.url,
+            "song": song,
+            "status": status,
+            **{k: None if v is None else round(v, 3) for k, v in row.items()},
+        }
+        try:
+            if self.path.endswith(".csv"):
+                new = not os.path.exists(self.path)
+                with open(self.path, "a", encoding="utf-8", newline="") as file:
+                    writer = csv.DictWriter(file, FIELDS)
+                    if new:
+                        writer.writeheader()
+                    writer.writerow(record)
+            else:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # metrics must never break a download
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns ``{stage: {"count", "p50", "p95", "max"}}`` for measured stages."""
+        return {
+            stage: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+            for stage, values in self.durations.items()
+            if values
+        }
+
+    def format_summary(self) -> str:
+        """Returns the summary as one line per stage for the log."""
+        return "".join(
+            f"{stage:>8}: p50 {s['p50']:.1f}s  p95 {s['p95']:.1f}s  "
+            f"max {s['max']:.1f}s  (n={s['count']})\n"
+            for stage, s in self.summary().items()
+        )
@@ -0,0 +1,93 @@
+"""
+Non-blocking notifications for the in-window status strip.
+
+``sg.popup_notify`` plays a fade-in, display and fade-out animation that
+blocks the calling thread for seconds per message.  ``Notifier`` instead
+collects messages from any thread, collapses the ones that arrive in quick
+succession into a single line and posts that line as an event for the GUI
+thread to show.  Informational lines are cleared again after a while; errors
+stay until the next message replaces them.
+"""
+
+import threading
+from typing import Any, Callable, List
+
+
+def _start_timer(delay: float, callback: Callable[[], None]) -> threading.Timer:
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class Notifier:
+    """Posts ``(text, is_error)`` status updates through ``post(key, value)``."""
+
+    def __init__(
+        self,
+        post: Callable[[Any, Any], None],
+        key: Any = "-status-",
+        coalesce: float = 0.3,
+        display: float = 6.0,
+        max_shown: int = 3,
+        call_later: Callable[[float, Callable[[], None]], Any] = _start_timer,
+    ):
+        """
+        :param post: (callable) Normally ``Window.write_event_value``.
+        :param key: The event key used when posting.
+        :param coalesce: (float) Seconds to wait for further messages before posting.
+        :param display: (float) Seconds an informational line stays visible.
+        :param max_shown: (int) Messages shown in one line; older ones are counted.
+        :param call_later: (callable) Schedules the posting and the clearing and
+            returns a handle with a ``cancel()`` method. Defaults to a
+            ``threading.Timer``.
+        """
+        self.post = post
+        self.key = key
+        self.coalesce = coalesce
+        self.display = display
+        self.max_shown = max_shown
+        self.call_later = call_later
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._error = False
+        self._flush_timer: Any = None
+        self._clear_timer: Any = None
+        self._generation = 0
+
+    def notify(self, message: str, error: bool = False) -> None:
+        """Queues a message. Never blocks; safe to call from any thread."""
+        with self._lock:
+            if message not in self._pending:
+                self._pending.append(message)
+            self._error = self._error or error
+            if self._flush_timer is None:
+                self._flush_timer = self.call_later(self.coalesce, self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            messages, self._pending = self._pending, []
+            error, self._error = self._error, False
+            self._flush_timer = None
+            if self._clear_timer is not None:
+                self._clear_timer.cancel()
+                self._clear_timer = None
+            self._generation += 1
+            if not error:
+                generation = self._generation
+                self._clear_timer = self.call_later(
+                    self.display, lambda: self._clear(generation)
+                )
+        if not messages:
+            return
+        text = " | ".join(messages[-self.max_shown :])
+        if len(messages) > self.max_shown:
+            text += f" (+{len(messages) - self.max_shown} more)"
+        self.post(self.key, (text, error))
+
+    def _clear(self, generation: int) -> None:
+        with self._lock:
+            if self._pending or generation != self._generation:
+                return  # a newer line is on screen or about to be
+            self._clear_timer = None
+        self.post(self.key, ("", False))
@@ -0,0 +1,150 @@
+"""
+Typed model of the spotdl options exposed by the GUI.
+
+Every field of ``DownloadOptions`` is tied to the key of the widget it is
+read from and to the spotdl flag it is passed as, so building the command
+line is a single loop over the fields.  ``from_values`` converts and
+validates the PySimpleGUI values dictionary and raises ``ValueError`` with a
+message fit for a popup when a field is invalid.
+"""
+
+import os
+import shlex
+from dataclasses import dataclass, field, fields
+from typing import List, Mapping, Optional
+
+
+def default_threads() -> int:
+    """The ``--threads`` the app runs spotdl with: one per core but one."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _option(key: Optional[str], flag: str, default=None, **kwargs):
+    return field(default=default, metadata={"key": key, "flag": flag, **kwargs})
+
+
+@dataclass
+class DownloadOptions:
+    # Download Settings tab
+    audio_source: str = _option("AUDIO_SOURCE", "--audio", "")
+    lyrics_source: str = _option("LYRICS_SOURCE", "--lyrics", "")
+    format: str = _option("FORMAT", "--format", "")
+    bitrate: str = _option("BITRATE", "--bitrate", "")
+    ffmpeg_args: str = _option("FFMPEG_ARGS", "--ffmpeg-args", "", split=True)
+    log_level: str = _option("LOG_LEVEL", "--log-level", "")
+    output_dir: str = _option("OUTPUT-DIRECTORY", "--output", "")
+    threads: Optional[int] = _option(None, "--threads", minimum=1)
+
+    # Advanced Settings tab
+    no_filter: bool = _option("NO_FILTER", "--dont-filter-results", False)
+    verified_results: bool = _option(
+        "VERIFIED_RESULTS", "--only-verified-results", False
+    )
+    headless: bool = _option("HEADLESS", "--headless", False)
+    no_cache: bool = _option("NO_CACHE", "--no-cache", False)
+    preload: bool = _option("PRELOAD", "--preload", False)
+    save_file: bool = _option("SAVE_FILE", "--save-file", False)
+    use_cache_file: bool = _option("USE_CACHE_FILE", "--use-cache-file", False)
+    m3u: bool = _option("M3U", "--m3u", False)
+    fetch_albums: bool = _option("FETCH_ALBUMS", "--fetch-albums", False)
+    generate_lyrics: bool = _option("GEN_LYRICS", "--generate-lrc", False)
+    detect_formats: bool = _option("DETECT_FORMATS", "--detect-formats", False)
+    sponsor_block: bool = _option("SPONSOR_BLOCK", "--sponsor-block", False)
+    redownload: bool = _option("REDOWNLOAD", "--redownload", False)
+    keep_alive: bool = _option("KEEP_ALIVE", "--keep-alive", False)
+    max_retries: Optional[int] = _option("MAX_RETRIES", "--max-retries", minimum=0)
+    max_filename_length: Optional[int] = _option(
+        "MAX_FILENAME_LENGTH", "--max-filename-length", minimum=1
+    )
+    yt_dlp_args: str = _option("YT_DLP_ARGS", "--yt-dlp-args", "", split=True)
+
+    # Connection Settings tab
+    proxy: str = _option("PROXY", "--proxy", "")
+    host: str = _option("HOST", "--host", "")
+    port: Optional[int] = _option("PORT", "--port", minimum=1, maximum=65535)
+
+    @classmethod
+    def from_values(cls, values: Mapping, **overrides) -> "DownloadOptions":
+        """
+        Builds the options from the values returned by ``window.read()``.
+
+        :param values: (dict) The PySimpleGUI values dictionary.
+        :param overrides: Field values that do not come from a widget, e.g. ``threads``.
+        :return: (DownloadOptions) The validated options.
+        """
+        kwargs = {}
+        for option in fields(cls):
+            key = option.metadata["key"]
+            if key is None or key not in values:
+                continue
+            value = values[key]
+            if option.type is bool:
+                kwargs[option.name] = bool(value)
+            else:
+                kwargs[option.name] = str(value or "").strip()
+        kwargs.update(overrides)
+        return cls(**kwargs).validated()
+
+    def validated(self) -> "DownloadOptions":
+        """
+        Converts numeric fields to int, checks every field's range and that
+        argument fields split like a shell command line, as they are split
+        before reaching yt-dlp and FFmpeg.
+        """
+        for option in fields(self):
+            value = getattr(self, option.name)
+            label = option.name.replace("_", " ").capitalize()
+            if option.metadata.get("split") and value:
+                try:
+                    shlex.split(value)
+                except ValueError as e:
+                    raise ValueError(f"{label} are not valid arguments: {e}")
+            if option.type != Optional[int] or value is None:
+                continue
+            if value == "":
+                setattr(self, option.name, None)
+                continue
+            try:
+                number = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{label} must be a whole number, got {value!r}")
+            minimum = option.metadata.get("minimum")
+            maximum = option.metadata.get("maximum")
+            if minimum is not None and number < minimum:
+                raise ValueError(f"{label} must be at least {minimum}")
+            if maximum is not None and number > maximum:
+                raise ValueError(f"{label} must be at most {maximum}")
+            setattr(self, option.name, number)
+        if self.proxy and "://" not in self.proxy:
+            raise ValueError("Proxy must be a URL such as http://host:port")
+        return self
+
+    def save_file_path(self, url: str) -> str:
+        """Returns where ``--save-file`` stores the track list of ``url``."""
+        name = url.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0] or "download"
+        return os.path.join(self.output_dir or ".", f"{name}.spotdl")
+
+    def to_argv(self, url: str = "") -> List[str]:
+        """
+        Returns the spotdl arguments for these options, without the program
+        name and the query.
+
+        :param url: (str) The URL of the job, used to name the ``--save-file``.
+        """
+        argv = []
+        for option in fields(self):
+            value = getattr(self, option.name)
+            flag = option.metadata["flag"]
+            if value is None or value == "" or value is False:
+                continue
+            if value is True:
+                argv.append(flag)
+                if option.name == "save_file":
+                    argv.append(self.save_file_path(url))
+                elif option.name == "detect_formats" and self.format:
+                    argv.append(self.format)
+            else:
+                # "--flag=value" keeps values such as "-vn" from being
+                # mistaken for flags of spotdl itself.
+                argv.append(f"{flag}={value}")
+        return argv
@@ -0,0 +1,92 @@
+"""
+Throttled progress reporting from worker threads.
+
+Workers can produce a progress update for every line spotdl prints.  Posting
+each of them to the window would flood the GUI event queue, so
+``ProgressReporter`` coalesces them: only the most recent value is kept and it
+is posted at most ``fps`` times per second.  A trailing update is always
+delivered, so the bar never stays behind the real value once the worker goes
+quiet.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+
+def _start_timer(delay: float, callback: Callable[[], None]) -> threading.Timer:
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class ProgressReporter:
+    """
+    Coalesces ``(current, maximum)`` progress values and posts them through
+    ``post(key, value)``, normally ``Window.write_event_value``.
+    """
+
+    def __init__(
+        self,
+        post: Callable[[Any, Any], None],
+        key: Any = "-progress-",
+        fps: float = 20.0,
+        call_later: Callable[[float, Callable[[], None]], Any] = _start_timer,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param post: (callable) Called as ``post(key, (current, maximum))`` from
+            whichever thread delivers the update.
+        :param key: The event key used when posting.
+        :param fps: (float) Maximum number of updates posted per second.
+        :param call_later: (callable) Schedules the trailing update and returns a
+            handle with a ``cancel()`` method. Defaults to a ``threading.Timer``;
+            pass ``loop.call_later`` when updates come from an asyncio loop.
+        :param clock: (callable) Returns the current time in seconds, on the
+            clock ``call_later`` counts in; for tests.
+        """
+        self.post = post
+        self.key = key
+        self.interval = 1.0 / fps
+        self.call_later = call_later
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._pending: Optional[Tuple[int, Optional[int]]] = None
+        self._last_post = float("-inf")  # the first update is posted at once
+        self._timer: Any = None
+
+    def update(self, current: int, maximum: Optional[int] = None) -> None:
+        """
+        Records a new progress value, posting it now or on the trailing edge
+        of the current frame.
+
+        :param current: (int) Number of finished items.
+        :param maximum: (int, optional) Total number of items, if known.
+        """
+        with self._lock:
+            self._pending = (current, maximum)
+            if self._timer is not None:
+                return
+            delay = self._last_post + self.interval - self.clock()
+            if delay > 0:
+                self._timer = self.call_later(delay, self.flush)
+                return
+            value = self._take()
+        self.post(self.key, value)
+
+    def flush(self) -> None:
+        """Posts the pending value immediately, if there is one."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending is None:
+                return
+            value = self._take()
+        self.post(self.key, value)
+
+    def _take(self) -> Tuple[int, Optional[int]]:
+        value, self._pending = self._pending, None
+        self._last_post = self.clock()
+        return value
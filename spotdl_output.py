@@ -0,0 +1,138 @@
+"""
+Parser for the console output of spotdl.
+
+Every line is matched once against a single precompiled alternation of all
+known message formats; the name of the alternative that matched selects the
+event class from a dispatch table.  Lines that match nothing produce
+``None`` and are simply logged by the caller.
+
+The formats follow spotdl 4.x:
+
+    Found 25 songs in My Playlist (Playlist)
+    Downloading Artist - Title using https://music.youtube.com/watch?v=...
+    Downloaded "Artist - Title": https://music.youtube.com/watch?v=...
+    Skipping Artist - Title (file already exists) (duplicate)
+    Skipping Artist - Title (skip file found)
+    Skipping explicit song: Artist - Title
+    LookupError: No results found for song: Artist - Title
+    AudioProviderError: YT-DLP download error - https://...
+    No lyrics found for song: Artist - Title
+
+Other lines starting with "Skipping", such as the warning about local tracks
+in a playlist, are not about a track of the download and produce no event.
+"Downloading ... using" is only printed with ``--log-level DEBUG``, which also
+prefixes every line with the time, the level and the thread name and appends
+the source location; both are ignored.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Union
+
+
+@dataclass(frozen=True)
+class Found:
+    total: int
+    name: str
+
+
+@dataclass(frozen=True)
+class DownloadStarted:
+    song: str
+    url: str
+
+
+@dataclass(frozen=True)
+class Downloaded:
+    song: str
+    url: str
+
+
+@dataclass(frozen=True)
+class Skipped:
+    song: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class Failed:
+    song: str
+    error: str
+    message: str
+
+
+@dataclass(frozen=True)
+class LyricsMissing:
+    song: str
+
+
+Event = Union[Found, DownloadStarted, Downloaded, Skipped, Failed, LyricsMissing]
+
+# Events that mean spotdl is done with a track, whatever the outcome.
+TRACK_DONE = (Downloaded, Skipped, Failed)
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+_PATTERNS = {
+    "found": r"Found (?P<found_total>\d+) songs? in (?P<found_name>.*?)",
+    "started": r"Downloading (?P<started_song>.*) using (?P<started_url>\S+)",
+    "downloaded": r'Downloaded "(?P<downloaded_song>.*)": (?P<downloaded_url>\S*)',
+    "skipped": (
+        r"Skipping (?:explicit song: (?P<skipped_explicit>.*?)|(?P<skipped_song>.*?) "
+        r"(?P<skipped_reason>\((?:file already exists|skip file found)\)"
+        r"(?: \(duplicate\))?))"
+    ),
+    "lyrics": r"No lyrics found for (?:song: )?(?P<lyrics_song>.*?)",
+    "failed": (
+        r"(?P<failed_error>\w+(?:Error|Exception)): (?P<failed_message>"
+        r"(?:.*?(?:song|for): (?P<failed_song>.*?))|.*?)"
+    ),
+}
+
+# "[12:00:00] DEBUG    MainThread - " and "    downloader.py:716" in debug mode
+# (the patterns end in lazy groups so the suffix does not end up in them)
+_DEBUG_PREFIX = r"(?:\[[\d:]+\]\s+[A-Z]+\s+[\w-]+ - )?"
+_DEBUG_SUFFIX = r"(?:\s+\w+\.py:\d+)?"
+
+_MATCHER = re.compile(
+    r"\s*"
+    + _DEBUG_PREFIX
+    + "(?:"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _PATTERNS.items())
+    + ")"
+    + _DEBUG_SUFFIX
+    + r"\s*$"
+)
+
+
+def _skipped(match: re.Match) -> Skipped:
+    if match["skipped_explicit"] is not None:
+        return Skipped(match["skipped_explicit"], "(explicit)")
+    return Skipped(match["skipped_song"], match["skipped_reason"])
+
+
+_DISPATCH: Dict[str, Callable[[re.Match], Event]] = {
+    "found": lambda m: Found(int(m["found_total"]), m["found_name"]),
+    "started": lambda m: DownloadStarted(m["started_song"], m["started_url"]),
+    "downloaded": lambda m: Downloaded(m["downloaded_song"], m["downloaded_url"]),
+    "skipped": _skipped,
+    "lyrics": lambda m: LyricsMissing(m["lyrics_song"]),
+    "failed": lambda m: Failed(
+        m["failed_song"] or "", m["failed_error"], m["failed_message"]
+    ),
+}
+
+
+def parse_line(line: str) -> Optional[Event]:
+    """
+    Turns one line of spotdl output into an event.
+
+    :param line: (str) A line of spotdl output, with or without the newline.
+    :return: The matching event, or None for lines that carry no event.
+    """
+    if "\x1b" in line:
+        line = _ANSI_ESCAPE.sub("", line)
+    match = _MATCHER.match(line)
+    if match is None:
+        return None
+    return _DISPATCH[match.lastgroup](match)
@@ -0,0 +1,236 @@
+"""
+asyncio supervisor for child processes.
+
+All spotdl (and helper) processes are started and watched from a single
+event loop that runs on a dedicated thread.  Their stdout and stderr pipes
+are drained concurrently by coroutines instead of reader threads, and
+timeouts and cancellation are plain asyncio operations, so the number of OS
+threads stays the same however many jobs are queued.
+
+Code on other threads hands work to the loop with ``ProcessSupervisor.submit``
+and gets results back through the returned ``concurrent.futures.Future`` or
+through its own ``post`` callbacks (``Window.write_event_value`` for the GUI).
+"""
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+_executables: Dict[str, str] = {}
+
+
+def resolve_executable(name: str) -> str:
+    """
+    Returns the absolute path of a program found on PATH, caching hits.
+
+    Passing ``Popen`` an absolute path (together with ``close_fds=False``) lets
+    CPython start the child with ``posix_spawn`` instead of fork + exec, and
+    saves the PATH walk on every launch. Misses are not cached so a program
+    installed while the app runs is picked up.
+    """
+    path = _executables.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is None:
+            return name
+        _executables[name] = path
+    return path
+
+
+def _use_pidfd_child_watcher(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Python < 3.12 watches every child with a thread of its own
+    (``ThreadedChildWatcher``). Where the kernel supports pidfds, switch to
+    ``PidfdChildWatcher``, which waits on the event loop instead.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+def _retrieve(future: asyncio.Future) -> None:
+    """Marks the outcome of an abandoned future as seen."""
+    if not future.cancelled():
+        future.exception()
+
+
+class Limiter:
+    """
+    An ``asyncio.Semaphore`` whose number of slots can be changed while
+    coroutines are waiting on it.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._changed = asyncio.Condition()
+
+    async def set_limit(self, limit: int) -> None:
+        async with self._changed:
+            self.limit = max(1, limit)
+            self._changed.notify_all()
+
+    async def __aenter__(self) -> "Limiter":
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_use < self.limit)
+            self.in_use += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._changed:
+            self.in_use -= 1
+            self._changed.notify_all()
+
+
+class ProcessSupervisor:
+    """Owns the event-loop thread that runs and watches child processes."""
+
+    def __init__(self, terminate_grace: float = 5.0):
+        """
+        :param terminate_grace: (float) Seconds a cancelled child gets to exit
+            after ``terminate()`` before it is killed.
+        """
+        self.terminate_grace = terminate_grace
+        self.loop = asyncio.new_event_loop()
+        _use_pidfd_child_watcher(self.loop)
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="process-supervisor", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedules a coroutine on the supervisor loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call_soon(self, callback: Callable, *args: Any) -> None:
+        """Runs ``callback(*args)`` on the supervisor loop from any thread."""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def close(self) -> None:
+        """
+        Cancels everything still running, waits (at most ``terminate_grace``
+        seconds plus a little) for the children to be stopped and ends the loop.
+        """
+
+        async def _shutdown():
+            current = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not current]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if not self.loop.is_running():
+            return
+        try:
+            self.submit(_shutdown()).result(self.terminate_grace + 1)
+        except Exception:
+            pass  # stop the loop anyway
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def run(
+        self,
+        argv: List[str],
+        on_line: Callable[[str, str], Optional[Awaitable]],
+        stdin_data: Optional[str] = None,
+        idle_timeout: Optional[float] = None,
+        on_start: Optional[Callable[[asyncio.subprocess.Process], None]] = None,
+    ) -> int:
+        """
+        Runs a command and feeds its output to ``on_line`` until it exits.
+
+        Must be awaited on the supervisor loop. Cancelling the awaiting task
+        terminates the child (and kills it after ``terminate_grace`` seconds).
+
+        :param argv: (list) The program and its arguments. No shell is involved,
+            so the process that is terminated is the program itself.
+        :param on_line: (callable) Called as ``on_line(stream, line)`` for every
+            line of stdout (``STDOUT``) and stderr (``STDERR``), in arrival order.
+            If it returns an awaitable, that stream is not read any further
+            until it is done, which holds the child back once its pipe fills.
+        :param stdin_data: (str, optional) Text written to the child's stdin,
+            which is closed afterwards.
+        :param idle_timeout: (float, optional) Terminate the child when it
+            prints nothing for this many seconds; raises ``asyncio.TimeoutError``.
+        :param on_start: (callable, optional) Called with the process once started.
+        :return: (int) The exit code of the process.
+        """
+        process = await asyncio.create_subprocess_exec(
+            resolve_executable(argv[0]),
+            *argv[1:],
+            stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            limit=1024 * 1024,
+            # File descriptors are non-inheritable by default, so there is
+            # nothing to close; keeping this False allows posix_spawn.
+            close_fds=os.name != "posix",
+        )
+        if on_start is not None:
+            on_start(process)
+        activity = asyncio.Event()
+
+        async def pump(name: str, stream: asyncio.StreamReader) -> None:
+            while True:
+                data = await stream.readline()
+                if not data:
+                    return
+                activity.set()
+                pending = on_line(name, data.decode("utf-8", errors="replace"))
+                if pending is not None:
+                    await pending
+                    activity.set()
+
+        readers = asyncio.gather(
+            pump(STDOUT, process.stdout), pump(STDERR, process.stderr)
+        )
+        try:
+            if stdin_data is not None:
+                process.stdin.write(stdin_data.encode("utf-8"))
+                await process.stdin.drain()
+                process.stdin.close()
+            while idle_timeout is not None and not readers.done():
+                waiter = asyncio.ensure_future(activity.wait())
+                try:
+                    done, _ = await asyncio.wait(
+                        {readers, waiter},
+                        timeout=idle_timeout,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                finally:
+                    waiter.cancel()
+                if not done:
+                    raise asyncio.TimeoutError(f"no output for {idle_timeout} seconds")
+                activity.clear()
+            await readers
+            return await process.wait()
+        except BaseException:
+            readers.cancel()
+            readers.add_done_callback(_retrieve)
+            await self._stop(process)
+            raise
+
+    async def _stop(self, process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), self.terminate_grace)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
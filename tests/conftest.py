@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules live in the repository root rather than in a package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
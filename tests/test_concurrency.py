@@ -0,0 +1,135 @@
+"""
+Tests of ``ConcurrencyController`` against a synthetic workload model: a
+function from ``(threads, jobs)`` to the tracks finished per minute and the
+share of them that failed.  Every simulated minute the outcomes are recorded
+evenly over the minute and the controller takes one decision.
+"""
+
+import random
+
+from concurrency import ConcurrencyController
+
+
+def saturating(per_thread=10.0, useful_threads=6, capacity=120.0):
+    """More threads help up to ``useful_threads`` per job, up to a bandwidth cap."""
+
+    def model(threads, jobs):
+        return min(capacity, jobs * per_thread * min(threads, useful_threads)), 0.0
+
+    return model
+
+
+def rate_limited(per_stream=10.0, limit=8, failure_rate=0.5):
+    """
+    Every stream adds tracks, but above ``limit`` streams the provider fails
+    a share of them.  The rate returned counts the tracks that succeeded.
+    """
+
+    def model(threads, jobs):
+        streams = threads * jobs
+        return per_stream * streams, failure_rate if streams > limit else 0.0
+
+    return model
+
+
+def noisy(model, seed=0, jitter=0.02):
+    rng = random.Random(seed)
+
+    def noisy_model(threads, jobs):
+        rate, failed = model(threads, jobs)
+        return rate * rng.uniform(1 - jitter, 1 + jitter), failed
+
+    return noisy_model
+
+
+class Simulation:
+    def __init__(self, controller: ConcurrencyController, model):
+        self.controller = controller
+        self.model = model
+        self.now = 0.0
+        self.history = []  # (threads, jobs, tracks downloaded, decision)
+
+    def run(self, minutes: int) -> "Simulation":
+        controller = self.controller
+        for _ in range(minutes):
+            rate, failure_rate = self.model(controller.threads, controller.jobs)
+            total = round(rate / (1 - failure_rate))
+            failed = round(total * failure_rate)
+            for number in range(total):
+                when = self.now + (number + 0.5) * 60 / total
+                controller.record(number >= failed, now=when)
+            self.now += 60
+            decision = controller.evaluate(now=self.now)
+            self.history.append((controller.threads, controller.jobs, rate, decision))
+        return self
+
+    @property
+    def settings(self):
+        return self.controller.threads, self.controller.jobs
+
+
+def test_climbs_to_the_knee_and_stays():
+    simulation = Simulation(ConcurrencyController(), saturating()).run(40)
+    assert simulation.settings == (6, 2)
+    # Nothing changes once the knee is found
+    assert all(decision is None for *_, decision in simulation.history[-20:])
+    assert simulation.history[-1][2] == 120.0
+
+
+def test_noise_within_the_tolerance_is_ignored():
+    simulation = Simulation(ConcurrencyController(), noisy(saturating())).run(60)
+    assert simulation.settings == (6, 2)
+
+
+def test_backs_off_when_tracks_fail():
+    simulation = Simulation(ConcurrencyController(), rate_limited()).run(120)
+    streams = [threads * jobs for threads, jobs, *_ in simulation.history]
+    reasons = [str(decision) for *_, decision in simulation.history if decision]
+    assert any("backing off" in reason for reason in reasons)
+    # At most one step above the limit, and for a small share of the time
+    assert max(streams) <= 9
+    assert sum(1 for streams in streams if streams > 8) / len(streams) < 0.2
+    # Yet most of the possible throughput is used
+    rates = [rate for *_, rate, _decision in simulation.history]
+    assert sum(rates) / len(rates) > 0.6 * 80
+
+
+def test_stays_within_the_bounds():
+    controller = ConcurrencyController(threads=1, max_threads=3, max_jobs=2)
+    simulation = Simulation(controller, rate_limited(limit=1000)).run(30)
+    assert simulation.settings == (3, 2)
+
+
+def test_needs_enough_samples():
+    controller = ConcurrencyController(min_samples=5)
+    simulation = Simulation(controller, lambda threads, jobs: (4.0, 0.0)).run(10)
+    assert simulation.settings == (4, 1)
+    assert all(decision is None for *_, decision in simulation.history)
+
+
+def test_set_bounds_forgets_the_ceilings():
+    model = {"capacity": 120.0}
+    simulation = Simulation(
+        ConcurrencyController(max_jobs=8),
+        lambda threads, jobs: saturating(capacity=model["capacity"])(threads, jobs),
+    ).run(30)
+    assert simulation.settings == (6, 2)
+
+    # More bandwidth alone does not help: jobs 3 was found not to pay off
+    model["capacity"] = 240.0
+    simulation.run(30)
+    assert simulation.settings == (6, 2)
+
+    # A new batch starts probing afresh
+    simulation.controller.set_bounds(max_jobs=8)
+    simulation.run(30)
+    assert simulation.settings == (6, 4)
+
+
+def test_set_bounds_clamps_the_current_values():
+    controller = ConcurrencyController(threads=8, jobs=4, max_threads=16, max_jobs=4)
+    controller.set_bounds(max_threads=2, max_jobs=1)
+    assert (controller.threads, controller.jobs) == (2, 1)
+    controller.set_bounds(max_jobs=3)
+    assert (controller.max_threads, controller.max_jobs) == (2, 3)
+    assert (controller.threads, controller.jobs) == (2, 1)
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import dependencies
+from dependencies import fingerprint, verify_dependencies
+
+
+class Commands:
+    """Stands in for ``subprocess.run``, failing the commands in ``failing``."""
+
+    def __init__(self, *failing: str):
+        self.failing = set(failing)
+        self.calls = []
+
+    def __call__(self, argv, check=False, **kwargs):
+        command = " ".join(argv[1:] if argv[0] == sys.executable else argv)
+        self.calls.append(command)
+        if command in self.failing:
+            if argv[0] == "spotdl":
+                raise FileNotFoundError(argv[0])
+            raise subprocess.CalledProcessError(1, argv)
+        return subprocess.CompletedProcess(argv, 0)
+
+
+@pytest.fixture
+def spotdl(tmp_path, monkeypatch):
+    """An executable ``spotdl`` that is the only program on PATH."""
+    folder = tmp_path / "bin"
+    folder.mkdir()
+    program = folder / "spotdl"
+    program.write_text("#!/bin/sh\n")
+    program.chmod(0o755)
+    monkeypatch.setenv("PATH", str(folder))
+    return program
+
+
+@pytest.fixture
+def messages():
+    return []
+
+
+def verify(messages, cache_file, commands, monkeypatch) -> bool:
+    monkeypatch.setattr(dependencies.subprocess, "run", commands)
+    return verify_dependencies(lambda *message: messages.append(message), cache_file)
+
+
+def test_successful_probe_is_not_repeated(spotdl, tmp_path, monkeypatch, messages):
+    cache_file = tmp_path / "probe" / "probe.json"
+    commands = Commands()
+    assert verify(messages, cache_file, commands, monkeypatch)
+    assert commands.calls == ["-m pip --version", "spotdl --version"]
+    assert verify(messages, cache_file, commands, monkeypatch)
+    assert len(commands.calls) == 2
+    assert messages == []
+
+
+def test_changed_spotdl_is_probed_again(spotdl, tmp_path, monkeypatch, messages):
+    cache_file = tmp_path / "probe.json"
+    commands = Commands()
+    verify(messages, cache_file, commands, monkeypatch)
+    before = fingerprint()
+    stamp = os.stat(spotdl).st_mtime_ns + 10**9
+    os.utime(spotdl, ns=(stamp, stamp))  # e.g. upgraded with pip
+    assert fingerprint() != before
+    assert verify(messages, cache_file, commands, monkeypatch)
+    assert len(commands.calls) == 4
+
+
+def test_missing_spotdl_is_installed(spotdl, tmp_path, monkeypatch, messages):
+    cache_file = tmp_path / "probe.json"
+    commands = Commands("spotdl --version")
+    assert verify(messages, cache_file, commands, monkeypatch)
+    assert commands.calls[-1] == "-m pip install spotdl"
+    assert messages == [
+        ("spotdl is not installed. Installing now...", False),
+        ("spotdl installed successfully.", False),
+    ]
+    assert cache_file.exists()
+
+
+def test_failed_install_is_reported_and_retried(
+    spotdl, tmp_path, monkeypatch, messages
+):
+    cache_file = tmp_path / "probe.json"
+    commands = Commands("spotdl --version", "-m pip install spotdl")
+    assert not verify(messages, cache_file, commands, monkeypatch)
+    assert messages[-1][0].startswith("Failed to install spotdl")
+    assert messages[-1][1] is True
+    assert not cache_file.exists()
+    assert not verify(messages, cache_file, commands, monkeypatch)
+    assert commands.calls.count("-m pip install spotdl") == 2
+
+
+def test_missing_pip_is_bootstrapped(spotdl, tmp_path, monkeypatch, messages):
+    monkeypatch.setattr(dependencies.ensurepip, "bootstrap", lambda: None)
+    commands = Commands("-m pip --version")
+    assert verify(messages, tmp_path / "probe.json", commands, monkeypatch)
+    assert messages == [
+        ("pip is not installed. Installing pip...", False),
+        ("pip installed successfully.", False),
+    ]
+
+
+def test_unreadable_cache_file_means_probing(spotdl, tmp_path, monkeypatch, messages):
+    cache_file = tmp_path / "probe.json"
+    cache_file.write_text("[]", encoding="utf-8")
+    commands = Commands()
+    assert verify(messages, cache_file, commands, monkeypatch)
+    assert len(commands.calls) == 2
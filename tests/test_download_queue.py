@@ -0,0 +1,337 @@
+"""
+Tests of ``DownloadQueue`` against ``tools/fake_spotdl.py``, which is put on
+PATH as ``spotdl``.  The fake is seeded, so every run prints the same tracks
+and failures.
+
+``data/download_queue.golden`` holds the log of a job in which spotdl fails
+some tracks without naming them, followed by the job's counters.  After an
+intended change, rewrite it with ``UPDATE_GOLDEN=1 python -m pytest`` and
+review its diff.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import supervisor as supervisor_module
+from download_queue import DownloadQueue, JobState, save_options
+from journal import JobJournal
+from metadata_cache import MetadataCache
+from supervisor import ProcessSupervisor
+from transcode import TranscodeTask, Transcoder
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA = Path(__file__).resolve().parent / "data"
+GOLDEN = DATA / "download_queue.golden"
+URL = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def fake_spotdl(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("bin")
+    fake = ROOT / "tools" / "fake_spotdl.py"
+    if os.name == "nt":
+        (directory / "spotdl.cmd").write_text(f'@"{sys.executable}" "{fake}" %*\n')
+    else:
+        launcher = directory / "spotdl"
+        launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n')
+        launcher.chmod(0o755)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("PATH", f"{directory}{os.pathsep}{os.environ['PATH']}")
+        for name, value in {"RATE": 0, "NOISE": 0, "SEED": 0}.items():
+            patch.setenv(f"FAKE_SPOTDL_{name}", str(value))
+        yield
+
+
+@pytest.fixture(autouse=True)
+def spotdl_looked_up_again():
+    """``resolve_executable`` caches paths; each test may put its own first."""
+    supervisor_module._executables.pop("spotdl", None)
+    yield
+    supervisor_module._executables.pop("spotdl", None)
+
+
+class Events:
+    """Stands in for ``Window.write_event_value`` and waits for jobs to end."""
+
+    def __init__(self):
+        self.jobs = {}
+        self._changed = threading.Condition()
+
+    def post(self, key, value) -> None:
+        if key == "-job-":
+            with self._changed:
+                self.jobs[value.job_id] = value
+                self._changed.notify_all()
+
+    def wait(self, job_id: int, timeout: float = 30, until=None):
+        """Returns the job once it ended, or once ``until(job)`` holds."""
+        until = until or (lambda job: not job.active)
+        with self._changed:
+            reached = self._changed.wait_for(
+                lambda: job_id in self.jobs and until(self.jobs[job_id]), timeout
+            )
+        assert reached, f"job {job_id} did not get there"
+        return self.jobs[job_id]
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = ProcessSupervisor(terminate_grace=1)
+    yield supervisor
+    supervisor.close()
+
+
+@pytest.fixture
+def events():
+    return Events()
+
+
+def make_queue(supervisor, events, tmp_path, **kwargs) -> DownloadQueue:
+    return DownloadQueue(
+        supervisor, events.post, str(tmp_path / "output.txt"), **kwargs
+    )
+
+
+def log_of(tmp_path) -> str:
+    return (tmp_path / "output.txt").read_text(encoding="utf-8")
+
+
+def wait_until_ended(tmp_path, job_id: int) -> None:
+    """A stopped job logs its timings once its spotdl process has exited."""
+    deadline = time.monotonic() + 10
+    while f"[#{job_id}] Timings:" not in log_of(tmp_path):
+        assert time.monotonic() < deadline, "spotdl was not stopped"
+        time.sleep(0.05)
+
+
+def test_unnamed_failures_are_counted(supervisor, events, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SPOTDL_SONGS", "20")
+    monkeypatch.setenv("FAKE_SPOTDL_FAIL", "0.1")
+    monkeypatch.setenv("FAKE_SPOTDL_SEED", "8")
+    queue = make_queue(supervisor, events, tmp_path)
+    job = events.wait(queue.submit(URL, []).job_id)
+
+    # The timings and the stderr lines (racing stdout) vary from run to run
+    log = log_of(tmp_path).split("[#1] Timings:")[0]
+    lines = [line for line in log.splitlines() if "Failed to download" not in line]
+    lines.append(f"-- {job.state.value}: {job.done} done, {job.failed} failed")
+    if os.environ.get("UPDATE_GOLDEN"):
+        GOLDEN.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert lines == GOLDEN.read_text(encoding="utf-8").splitlines()
+    assert "AudioProviderError" in log
+    assert (job.done, job.failed, job.total) == (17, 3, 20)
+    assert job.state == JobState.FINISHED
+
+
+def stand_in(directory: Path, monkeypatch, script: str) -> None:
+    """Puts a ``spotdl`` that runs ``script`` with Python before the fake."""
+    directory.mkdir()
+    program = directory / "spotdl.py"
+    program.write_text(script, encoding="utf-8")
+    if os.name == "nt":
+        (directory / "spotdl.cmd").write_text(f'@"{sys.executable}" "{program}" %*\n')
+    else:
+        launcher = directory / "spotdl"
+        launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{program}" "$@"\n')
+        launcher.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_missing_tracks_fail_the_job_despite_exit_status_0(
+    supervisor, events, tmp_path, monkeypatch
+):
+    stand_in(
+        tmp_path / "bin",
+        monkeypatch,
+        'print("Found 3 songs in Short Playlist (Playlist)")\n'
+        "print('Downloaded \"A - B\": https://music.youtube.com/watch?v=x')\n",
+    )
+    queue = make_queue(supervisor, events, tmp_path)
+    job = events.wait(queue.submit(URL, []).job_id)
+    assert job.returncode == 0
+    assert (job.done, job.failed, job.total) == (1, 0, 3)
+    assert job.state == JobState.FAILED
+
+
+def fail_second_song(task: TranscodeTask) -> None:
+    if "Song 2" in task.target:
+        raise RuntimeError("conversion failed")
+    shutil.copyfile(task.source, task.target)
+
+
+def test_unconverted_tracks_are_failed_tracks(
+    supervisor, events, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("FAKE_SPOTDL_SONGS", "3")
+    monkeypatch.setenv("FAKE_SPOTDL_FAIL", "0")
+    monkeypatch.setenv("FAKE_SPOTDL_SKIP", "0")
+    transcoder = Transcoder(1, encoder=fail_second_song, prober=None)
+    queue = make_queue(supervisor, events, tmp_path, transcoder=transcoder)
+    try:
+        job = queue.submit(URL, ["--format=mp3"], str(tmp_path / "music"))
+        job = events.wait(job.job_id)
+    finally:
+        transcoder.close()
+    assert (job.done, job.failed, job.total) == (2, 1, 3)
+    assert job.state == JobState.FINISHED  # what the CLI exits 1 for
+    assert "1 could not be converted" in log_of(tmp_path)
+
+
+def test_spotdl_save_gets_the_options_for_resolving(
+    supervisor, events, tmp_path, monkeypatch
+):
+    calls = tmp_path / "calls.jsonl"
+    stand_in(
+        tmp_path / "bin",
+        monkeypatch,
+        "import json, sys\n"
+        f"with open({str(calls)!r}, 'a') as file:\n"
+        "    file.write(json.dumps(sys.argv[1:]) + '\\n')\n"
+        "with open(sys.argv[sys.argv.index('--save-file') + 1], 'w') as file:\n"
+        "    json.dump([], file)\n",
+    )
+    metadata = MetadataCache(tmp_path / "metadata.sqlite3")
+    queue = make_queue(supervisor, events, tmp_path, metadata=metadata)
+    options = ["--format=opus", "--proxy=http://127.0.0.1:8080", "--user-auth"]
+    events.wait(queue.submit(URL, options).job_id)
+    (argv,) = [json.loads(line) for line in calls.read_text().splitlines()]
+    assert argv[:2] == ["save", URL]
+    assert argv[4:] == ["--proxy=http://127.0.0.1:8080", "--user-auth"]
+
+
+def test_save_options():
+    options = ["--format=mp3", "--fetch-albums", "--cookie-file=c.txt", "--m3u"]
+    assert save_options(options) == ["--fetch-albums", "--cookie-file=c.txt"]
+
+
+def test_spotdl_writes_its_playlist_after_the_last_track(
+    supervisor, events, tmp_path, monkeypatch
+):
+    playlist = tmp_path / "Short Playlist.m3u8"
+    stand_in(
+        tmp_path / "bin",
+        monkeypatch,
+        "import time\n"
+        'print("Found 1 songs in Short Playlist (Playlist)", flush=True)\n'
+        "print('Downloaded \"A - B\": https://music.youtube.com/watch?v=x', "
+        "flush=True)\n"
+        "time.sleep(0.5)\n"
+        f"open({str(playlist)!r}, 'w').write('A - B.mp3\\n')\n",
+    )
+    queue = make_queue(supervisor, events, tmp_path, finish_grace=10)
+    job = events.wait(queue.submit(URL, ["--m3u"]).job_id)
+    assert job.state == JobState.FINISHED
+    assert job.returncode == 0
+    assert playlist.read_text() == "A - B.mp3\n"
+
+
+def test_lingering_spotdl_is_stopped_after_the_grace_time(
+    supervisor, events, tmp_path, monkeypatch
+):
+    stand_in(
+        tmp_path / "bin",
+        monkeypatch,
+        "import time\n"
+        'print("Found 1 songs in Short Playlist (Playlist)", flush=True)\n'
+        "print('Downloaded \"A - B\": https://music.youtube.com/watch?v=x', "
+        "flush=True)\n"
+        "time.sleep(60)\n",
+    )
+    queue = make_queue(supervisor, events, tmp_path, finish_grace=0.2)
+    job = events.wait(queue.submit(URL, []).job_id, timeout=10)
+    assert job.state == JobState.FINISHED
+    assert job.returncode != 0
+    assert "did not exit after the last track" in log_of(tmp_path)
+
+
+def test_stopping_a_running_job_ends_spotdl(supervisor, events, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SPOTDL_RATE", "20")
+    queue = make_queue(supervisor, events, tmp_path)
+    job_id = queue.submit(URL, []).job_id
+    events.wait(job_id, until=lambda job: job.done >= 2)
+    assert queue.stop(job_id) == 1
+    assert events.wait(job_id).state == JobState.STOPPED
+    assert queue.stop(job_id) == 0  # already stopped
+    wait_until_ended(tmp_path, job_id)
+    (job,) = queue.jobs
+    assert job.state == JobState.STOPPED
+    assert job.done < 50
+
+
+def test_stopping_a_queued_job_never_starts_it(
+    supervisor, events, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("FAKE_SPOTDL_RATE", "20")
+    queue = make_queue(supervisor, events, tmp_path, max_workers=1)
+    first = queue.submit(URL, []).job_id
+    second = queue.submit(URL + "x", []).job_id
+    events.wait(first, until=lambda job: job.done >= 1)
+    assert queue.stop(second) == 1
+    assert queue.stop() == 1  # every job left, i.e. the first
+    assert events.wait(first).state == JobState.STOPPED
+    wait_until_ended(tmp_path, first)
+    assert "[#2]" not in log_of(tmp_path)
+    assert [job.state for job in queue.jobs] == [JobState.STOPPED] * 2
+
+
+def test_queued_jobs_wait_for_a_free_worker(supervisor, events, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SPOTDL_SONGS", "3")
+    monkeypatch.setenv("FAKE_SPOTDL_RATE", "20")
+    queue = make_queue(supervisor, events, tmp_path, max_workers=1)
+    first = queue.submit(URL, []).job_id
+    second = queue.submit(URL + "x", []).job_id
+    assert events.wait(second).state == JobState.FINISHED
+    assert events.wait(first).state == JobState.FINISHED
+    log = log_of(tmp_path)
+    assert log.index("[#2] Starting") > log.index("[#1] Downloaded successfully")
+
+
+def test_stopped_job_resumes_from_its_journal(
+    supervisor, events, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("FAKE_SPOTDL_SONGS", "20")
+    monkeypatch.setenv("FAKE_SPOTDL_RATE", "20")
+    monkeypatch.setenv("FAKE_SPOTDL_FAIL", "0")
+    journal = JobJournal(tmp_path / "journal")
+    queue = make_queue(supervisor, events, tmp_path, journal=journal)
+    first = queue.submit(URL, []).job_id
+    events.wait(first, until=lambda job: job.done >= 5)
+    queue.stop(first)
+    events.wait(first)
+    completed = journal.completed(URL)
+    assert 5 <= len(completed) < 20
+
+    job = events.wait(queue.submit(URL, []).job_id)
+    assert job.state == JobState.FINISHED
+    assert job.resumed == len(completed)
+    assert (job.done, job.total) == (20, 20)
+    assert f"[#2] {len(completed)} of 20 tracks are already done" in log_of(tmp_path)
+    assert journal.completed(URL) == set()  # cleared once finished
+
+
+def test_new_bandwidth_share_restarts_the_job_where_it_was(
+    supervisor, events, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("FAKE_SPOTDL_SONGS", "40")
+    monkeypatch.setenv("FAKE_SPOTDL_RATE", "20")
+    monkeypatch.setenv("FAKE_SPOTDL_FAIL", "0")
+    journal = JobJournal(tmp_path / "journal")
+    queue = make_queue(supervisor, events, tmp_path, journal=journal)
+    job_id = queue.submit(URL, []).job_id
+    events.wait(job_id, until=lambda job: job.done >= 3)
+    queue.set_bandwidth(2**20)
+    job = events.wait(job_id)
+    assert job.state == JobState.FINISHED
+    assert (job.done, job.failed, job.total) == (40, 0, 40)
+    log = log_of(tmp_path)
+    assert "[#1] Restarting with a new bandwidth share" in log
+    assert "[#1] Limiting each of 4 downloads to 256 KiB/s" in log
+    restarted = log.split("Restarting with a new bandwidth share")[1]
+    assert " of 40 tracks are already done" in restarted
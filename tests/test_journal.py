@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from journal import JobJournal, song_display_name
+
+URL = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return JobJournal(tmp_path / "journal")
+
+
+def test_nothing_completed_at_first(journal):
+    assert journal.completed(URL) == set()
+
+
+def test_recorded_tracks_are_completed(journal):
+    journal.record(URL, "A - One", "downloaded")
+    journal.record(URL, "A - Two", "skipped")
+    journal.record(URL + "x", "B - Three", "downloaded")
+    assert journal.completed(URL) == {"A - One", "A - Two"}
+    assert journal.completed(f"  {URL}\n") == {"A - One", "A - Two"}
+    entry, _ = journal.path_for(URL).read_text(encoding="utf-8").splitlines()
+    assert json.loads(entry)["status"] == "downloaded"
+
+
+def test_lines_cut_short_are_ignored(journal):
+    journal.record(URL, "A - One", "downloaded")
+    with open(journal.path_for(URL), "a", encoding="utf-8") as file:
+        file.write('{"song": "A - Tw')  # the app crashed while writing
+    assert journal.completed(URL) == {"A - One"}
+
+
+def test_remaining(journal):
+    songs = [
+        {"name": "One", "artist": "A"},
+        {"name": "Two", "artists": ["A", "B"]},
+        {"name": "Three", "artist": "A"},
+    ]
+    assert [song_display_name(song) for song in songs] == [
+        "A - One",
+        "A, B - Two",
+        "A - Three",
+    ]
+    assert journal.remaining(songs, {"A - One", "A, B - Two"}) == songs[2:]
+
+
+def test_clear_removes_the_journal_and_the_save_file(journal):
+    journal.record(URL, "A - One", "downloaded")
+    journal.save_file_for(URL).write_text("[]", encoding="utf-8")
+    journal.clear(URL)
+    journal.clear(URL)  # nothing left to remove
+    assert journal.completed(URL) == set()
+    assert not journal.save_file_for(URL).exists()
+
+
+def test_survives_a_new_instance(journal, tmp_path):
+    journal.record(URL, "A - One", "downloaded")
+    assert JobJournal(tmp_path / "journal").completed(URL) == {"A - One"}
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from library import TrackIndex, normalize, song_keys
+
+SONG = {"name": "Señorita!", "artists": ["Shawn Mendes", "Camila Cabello"]}
+
+
+@pytest.fixture
+def music(tmp_path):
+    folder = tmp_path / "music"
+    (folder / "Album").mkdir(parents=True)
+    return folder
+
+
+def make_index(music, tmp_path) -> TrackIndex:
+    return TrackIndex(str(music), index_dir=tmp_path / "index")
+
+
+def add(path) -> None:
+    """Writes an empty file and moves its folder's mtime on, as a copy would."""
+    path.write_bytes(b"")
+    stamp = os.stat(path.parent).st_mtime_ns + 10**9
+    os.utime(path.parent, ns=(stamp, stamp))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Shawn Mendes, Camila Cabello - Senorita",
+        "SHAWN MENDES, CAMILA CABELLO - SEÑORITA!",
+        "Shawn Mendes, Camila Cabello - Señorita?",  # "?" is stripped by spotdl
+    ],
+)
+def test_normalize(text):
+    assert normalize(text) == "shawn mendes camila cabello senorita"
+
+
+def test_song_keys_cover_the_first_artist_alone():
+    assert song_keys({**SONG, "artist": "Shawn Mendes"}) == {
+        "shawn mendes camila cabello senorita",
+        "shawn mendes senorita",
+    }
+
+
+def test_present_tracks_count_only_in_their_format(music, tmp_path):
+    add(music / "Album" / "Shawn Mendes, Camila Cabello - Señorita.mp3")
+    add(music / "Shawn Mendes, Camila Cabello - Señorita.txt")
+    index = make_index(music, tmp_path)
+    assert index.refresh() == 1
+    assert len(index) == 1
+    assert index.contains(SONG)
+    assert index.contains(SONG, "mp3") and index.contains(SONG, ".MP3")
+    assert not index.contains(SONG, "m4a")
+    other = {"name": "Other", "artists": ["Shawn Mendes"]}
+    assert index.missing([SONG, other], "mp3") == [other]
+
+
+def test_rescans_read_only_what_changed(music, tmp_path):
+    add(music / "Album" / "A - One.mp3")
+    add(music / "Album" / "A - Two.mp3")
+    index = make_index(music, tmp_path)
+    assert index.refresh() == 2
+    assert index.refresh() == 0  # no folder changed
+    add(music / "Album" / "A - Three.mp3")
+    assert index.refresh() == 1  # only the new file is read
+    (music / "Album" / "A - One.mp3").unlink()
+    stamp = os.stat(music / "Album").st_mtime_ns + 10**9
+    os.utime(music / "Album", ns=(stamp, stamp))
+    assert index.refresh() == 0
+    assert len(index) == 2
+    assert not index.contains({"name": "One", "artists": ["A"]})
+
+
+def test_index_survives_a_new_instance(music, tmp_path):
+    add(music / "Album" / "A - One.flac")
+    make_index(music, tmp_path).refresh()
+    index = make_index(music, tmp_path)
+    assert index.contains({"name": "One", "artists": ["A"]}, "flac")
+    assert index.refresh() == 0
+
+
+def test_broken_index_file_is_rebuilt(music, tmp_path):
+    add(music / "Album" / "A - One.flac")
+    index = make_index(music, tmp_path)
+    index.index_file.parent.mkdir()
+    index.index_file.write_text("{", encoding="utf-8")
+    index = make_index(music, tmp_path)
+    assert len(index) == 0
+    assert index.refresh() == 1
+
+
+def test_missing_root_is_empty(tmp_path):
+    index = make_index(tmp_path / "nowhere", tmp_path)
+    assert index.refresh() == 0
+    assert index.missing([SONG]) == [SONG]
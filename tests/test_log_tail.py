@@ -0,0 +1,78 @@
+import os
+
+from log_tail import LogTail
+
+
+def append(path, text: str) -> None:
+    with open(path, "a", encoding="utf-8", newline="") as file:
+        file.write(text)
+
+
+def test_returns_only_appended_text(tmp_path):
+    path = tmp_path / "log.txt"
+    tail = LogTail(str(path))
+    assert tail.read() == ("", False)
+    append(path, "one\n")
+    assert tail.read() == ("one\n", True)  # the file appeared
+    assert tail.read() == ("", False)
+    append(path, "two\nthr")
+    append(path, "ee\n")
+    assert tail.read() == ("two\nthree\n", False)
+
+
+def test_reads_in_chunks(tmp_path):
+    path = tmp_path / "log.txt"
+    append(path, "x" * 250)
+    tail = LogTail(str(path), chunk_size=100)
+    chunks = []
+    while True:
+        text, _reset = tail.read()
+        if not text:
+            break
+        chunks.append(text)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+def test_multibyte_characters_split_across_reads(tmp_path):
+    path = tmp_path / "log.txt"
+    data = "Beyoncé – Halo\n".encode("utf-8")
+    split = data.index("é".encode("utf-8")) + 1  # inside the character
+    tail = LogTail(str(path))
+    with open(path, "wb") as file:
+        file.write(data[:split])
+    first, _reset = tail.read()
+    with open(path, "ab") as file:
+        file.write(data[split:])
+    second, _reset = tail.read()
+    assert first + second == "Beyoncé – Halo\n"
+    assert "�" not in first + second
+
+
+def test_truncated_file_starts_over(tmp_path):
+    path = tmp_path / "log.txt"
+    append(path, "old output\n")
+    tail = LogTail(str(path))
+    tail.read()
+    path.write_text("new\n", encoding="utf-8")
+    assert tail.read() == ("new\n", True)
+
+
+def test_replaced_file_starts_over(tmp_path):
+    path = tmp_path / "log.txt"
+    append(path, "first log\n")
+    tail = LogTail(str(path))
+    tail.read()
+    rotated = tmp_path / "log.txt.1"
+    os.replace(path, rotated)
+    append(path, "second log, longer than the first\n")
+    assert tail.read() == ("second log, longer than the first\n", True)
+
+
+def test_deleted_file_is_reported_once(tmp_path):
+    path = tmp_path / "log.txt"
+    append(path, "output\n")
+    tail = LogTail(str(path))
+    tail.read()
+    path.unlink()
+    assert tail.read() == ("", True)
+    assert tail.read() == ("", False)
@@ -0,0 +1,68 @@
+import tracemalloc
+
+from log_view import LogBuffer
+
+LINE = '[#1] Downloaded "Artist - Title {number}": https://music.youtube.com/watch?v={number:011d}\n'
+
+
+def chunk(start: int, count: int) -> str:
+    return "".join(LINE.format(number=number) for number in range(start, start + count))
+
+
+def test_memory_stays_bounded_over_a_million_lines(tmp_path):
+    buffer = LogBuffer(str(tmp_path / "log.txt"), capacity=5000)
+    lines, step = 1_000_000, 1000
+    # Made up front so only the buffer allocates while tracing
+    chunks = [chunk(start, step) for start in range(0, 10 * step, step)]
+    tracemalloc.start()
+    try:
+        for text in chunks * 2:  # fill the ring buffer first
+            buffer.append(text)
+        filled, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        dropped = 0
+        for number in range(20, lines // step):
+            dropped += buffer.append(chunks[number % len(chunks)])
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(buffer) == 5000
+    assert dropped == lines - 20 * step
+    assert buffer.text() == "".join(chunks[5:])
+    # The last 5000 lines take about 0.7 MiB; a million would take 130 MiB.
+    assert current - filled < 256 * 1024
+    assert peak - filled < 2 * 2**20
+
+
+def test_dropped_lines_are_reported(tmp_path):
+    buffer = LogBuffer(str(tmp_path / "log.txt"), capacity=3)
+    assert buffer.append("a\nb\n") == 0
+    assert buffer.append("c\nd") == 0  # "d" is not a complete line yet
+    assert buffer.append("\ne\n") == 2
+    assert buffer.text() == "c\nd\ne\n"
+
+
+def test_older_pages_back_through_the_file(tmp_path):
+    path = tmp_path / "log.txt"
+    text = chunk(0, 20_000)
+    path.write_text(text, encoding="utf-8", newline="")
+    buffer = LogBuffer(str(path), capacity=5000, page=1000)
+    buffer.append(text)
+    expected = text.splitlines(keepends=True)[:15_000]
+    pages = []
+    while True:
+        page = buffer.older()
+        if not page:
+            break
+        pages.insert(0, page)
+    assert "".join(pages) == "".join(expected)
+    assert len(pages) == 15
+    # Starts over from the lines in memory afterwards
+    assert buffer.older() == "".join(expected[-1000:])
+
+
+def test_clear(tmp_path):
+    buffer = LogBuffer(str(tmp_path / "log.txt"))
+    buffer.append("a\nb")
+    buffer.clear()
+    assert len(buffer) == 0 and buffer.text() == "" and buffer.first_offset == 0
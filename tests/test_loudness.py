@@ -0,0 +1,66 @@
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from loudness import RATE, LoudnessAnalyzer, integrated_loudness, wav_layout
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def sine(dbfs: float, seconds: float = 10, channels: int = 2, frequency=997):
+    np = pytest.importorskip("numpy")
+    time = np.arange(int(seconds * RATE)) / RATE
+    wave = 10 ** (dbfs / 20) * np.sin(2 * np.pi * frequency * time)
+    return np.repeat(wave[:, None], channels, axis=1).astype(np.float32)
+
+
+@pytest.mark.parametrize("dbfs", [-23.0, -18.0, -40.0])
+def test_stereo_tone_at_dbfs_measures_as_many_lufs(dbfs):
+    # EBU Tech 3341, case 1 and 2: a 997 Hz stereo sine at -23 dBFS is -23 LUFS
+    assert integrated_loudness(sine(dbfs)) == pytest.approx(dbfs, abs=0.1)
+
+
+def test_mono_counts_one_channel():
+    assert integrated_loudness(sine(-23.0, channels=1)) == pytest.approx(-26, abs=0.1)
+
+
+def test_quiet_part_below_the_relative_gate_is_ignored():
+    np = pytest.importorskip("numpy")
+    samples = np.concatenate([sine(-23.0, 10), sine(-50.0, 10)])
+    assert integrated_loudness(samples) == pytest.approx(-23.0, abs=0.1)
+
+
+def test_silent_or_short_audio_has_no_loudness():
+    np = pytest.importorskip("numpy")
+    assert integrated_loudness(np.zeros((RATE, 2), dtype=np.float32)) is None
+    assert integrated_loudness(sine(-23.0, seconds=0.3)) is None
+    with pytest.raises(ValueError):
+        integrated_loudness(sine(-23.0), rate=44100)
+
+
+def test_wav_layout():
+    fmt = struct.pack("<HHIIHH", 3, 2, RATE, RATE * 8, 8, 32)
+    header = b"RIFF\xff\xff\xff\xffWAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    data = header + b"LIST\x03\x00\x00\x00abc\x00" + b"data\xff\xff\xff\xff"
+    assert wav_layout(data) == (2, len(data))
+    with pytest.raises(RuntimeError):
+        wav_layout(b"not a wav stream")
+
+
+def test_importing_does_not_import_numpy():
+    code = "import sys, loudness; print('numpy' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == "False", result.stderr
+
+
+def test_cache_keeps_both_digests(tmp_path):
+    analyzer = LoudnessAnalyzer(tmp_path / "loudness.sqlite3")
+    analyzer.put("before", "after", (-20.5, 0.9))
+    assert analyzer.get("before") == ((-20.5, 0.9), False)
+    assert analyzer.get("after") == ((-20.5, 0.9), True)
+    assert analyzer.get("other") is None
@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from match_cache import MatchCache, audio_provider, provider_of
+
+YTM = "https://music.youtube.com/watch?v="
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        self.now += 1  # every call is later than the one before
+        return self.now
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**kwargs):
+        return MatchCache(tmp_path / "matches.sqlite3", clock=Clock(), **kwargs)
+
+    return make
+
+
+def track(number: int) -> str:
+    return f"https://open.spotify.com/track/{number:022d}"
+
+
+def songs(*numbers) -> list:
+    return [{"url": track(number)} for number in numbers]
+
+
+def known(cache, *numbers, provider="youtube-music") -> list:
+    listed = songs(*numbers)
+    cache.apply(listed, provider)
+    return [number for number, song in zip(numbers, listed) if "download_url" in song]
+
+
+def test_apply_fills_in_known_matches(make_cache):
+    cache = make_cache()
+    cache.put(track(1), YTM + "a", "youtube-music")
+    listed = songs(1, 2) + [{"url": track(3), "download_url": YTM + "own"}]
+    assert cache.apply(listed) == 1
+    assert [song.get("download_url") for song in listed] == [
+        YTM + "a",
+        None,
+        YTM + "own",
+    ]
+    assert cache.stats() == {
+        "entries": 1,
+        "bytes": cache.stats()["bytes"],
+        "hits": 1,
+        "misses": 1,
+    }
+
+
+def test_matches_are_kept_per_provider(make_cache):
+    cache = make_cache()
+    cache.put(track(1), YTM + "a", "youtube-music")
+    cache.put(track(1), "https://soundcloud.com/a/b", "soundcloud")
+    assert known(cache, 1, provider="youtube") == []
+    listed = songs(1)
+    cache.apply(listed, "soundcloud")
+    assert listed[0]["download_url"] == "https://soundcloud.com/a/b"
+    assert cache.stats()["entries"] == 2
+
+
+def test_least_recently_used_are_evicted_beyond_max_entries(make_cache):
+    cache = make_cache(max_entries=3)
+    for number in range(3):
+        cache.put(track(number), YTM + str(number), "youtube-music")
+    assert known(cache, 0) == [0]  # used, so 1 is now the oldest
+    cache.put(track(3), YTM + "3", "youtube-music")
+    assert known(cache, 0, 1, 2, 3) == [0, 2, 3]
+    assert cache.stats()["entries"] == 3
+
+
+def test_least_recently_used_are_evicted_beyond_max_bytes(make_cache):
+    size = len(track(0).encode()) + len((YTM + "0").encode())
+    cache = make_cache(max_bytes=3 * size)
+    for number in range(3):
+        cache.put(track(number), YTM + str(number), "youtube-music")
+    assert cache.stats()["bytes"] == 3 * size
+    known(cache, 0)
+    cache.put(track(3), YTM + "3", "youtube-music")
+    assert known(cache, 0, 1, 2, 3) == [0, 2, 3]
+    assert cache.stats()["bytes"] == 3 * size
+
+
+def test_forget_drops_every_match_of_a_download_url(make_cache):
+    cache = make_cache()
+    cache.put_many([(track(1), YTM + "gone"), (track(2), YTM + "gone")])
+    cache.put(track(3), YTM + "fine", "youtube-music")
+    assert cache.forget(YTM + "gone") == 2
+    assert cache.forget(YTM + "gone") == 0
+    assert known(cache, 1, 2, 3) == [3]
+
+
+def test_warm_imports_spotdl_files(make_cache, tmp_path):
+    folder = tmp_path / "music"
+    folder.mkdir()
+    saved = songs(1, 2) + [{"url": track(3), "download_url": None}, "junk"]
+    saved[0]["download_url"] = YTM + "a"
+    saved[1]["download_url"] = "https://soundcloud.com/a/b"
+    (folder / "list.spotdl").write_text(json.dumps(saved), encoding="utf-8")
+    (folder / "broken.spotdl").write_text("{", encoding="utf-8")
+    cache = make_cache()
+    assert cache.warm(str(folder)) == (2, 1)
+    assert known(cache, 1, 2) == [1]
+    assert known(cache, 2, provider="soundcloud") == [2]
+
+
+def test_clear_and_reopen(make_cache):
+    cache = make_cache()
+    cache.put(track(1), YTM + "a", "youtube-music")
+    assert known(make_cache(), 1) == [1]
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize(
+    "options, provider",
+    [
+        ([], "youtube-music"),
+        (["--format=mp3", "--audio=soundcloud"], "soundcloud"),
+        (["--audio="], "youtube-music"),
+    ],
+)
+def test_audio_provider(options, provider):
+    assert audio_provider(options) == provider
+
+
+@pytest.mark.parametrize(
+    "url, provider",
+    [
+        (YTM + "x", "youtube-music"),
+        ("https://www.youtube.com/watch?v=x", "youtube"),
+        ("https://youtu.be/x", "youtube"),
+        ("https://m.soundcloud.com/a/b", "soundcloud"),
+        ("https://artist.bandcamp.com/track/x", "bandcamp"),
+        ("https://hayqbhgr.slider.kz/x", "slider-kz"),
+        ("https://example.org/x", "example.org"),
+    ],
+)
+def test_provider_of(url, provider):
+    assert provider_of(url) == provider
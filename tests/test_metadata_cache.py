@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from metadata_cache import MetadataCache, normalize_url
+
+URL = "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
+SONGS = [{"name": "Title", "artists": ["Artist"]}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Resolver:
+    """Stands in for ``spotdl save``: returns the next result and counts calls."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    async def __call__(self, url):
+        self.calls.append(url)
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return MetadataCache(tmp_path / "metadata.sqlite3", ttl=60, clock=clock)
+
+
+def track_list(cache, url, resolver):
+    return asyncio.run(cache.track_list(url, resolver))
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        URL,
+        URL + "?si=abc123",
+        "https://open.spotify.com/intl-de/playlist/37i9dQZF1DXcBWIGoYBM5M",
+        "spotify:playlist:37i9dQZF1DXcBWIGoYBM5M",
+        f"  {URL}/\n",
+    ],
+)
+def test_normalize_url(url):
+    assert normalize_url(url) == URL
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC",
+        "https://open.spotify.com/artist/0OdUWJ0sBjDrqHygGUXeCF",
+        "https://example.com/playlist/37i9dQZF1DXcBWIGoYBM5M",
+        "spotify:track:4uLU6hMCjMI75M1A2tKUQC",
+        "Artist - Title",
+    ],
+)
+def test_other_urls_are_not_cached(cache, url):
+    assert normalize_url(url) is None
+    resolver = Resolver(SONGS, SONGS)
+    assert track_list(cache, url, resolver) == (SONGS, "resolved")
+    assert track_list(cache, url, resolver) == (SONGS, "resolved")
+    assert len(resolver.calls) == 2
+
+
+def test_fresh_entries_are_used_until_the_ttl(cache, clock):
+    resolver = Resolver(SONGS)
+    assert track_list(cache, URL, resolver) == (SONGS, "resolved")
+    clock.now += 59
+    assert track_list(cache, URL + "?si=x", resolver) == (SONGS, "cached")
+    assert resolver.calls == [URL]
+    assert cache.get(URL) == (SONGS, 59)
+
+
+def test_expired_entries_are_resolved_again(cache, clock):
+    changed = SONGS + [{"name": "New", "artists": ["Artist"]}]
+    resolver = Resolver(SONGS, SONGS, changed)
+    track_list(cache, URL, resolver)
+    clock.now += 60
+    assert track_list(cache, URL, resolver) == (SONGS, "unchanged")
+    assert cache.get(URL)[1] == 0  # refreshed
+    clock.now += 60
+    assert track_list(cache, URL, resolver) == (changed, "resolved")
+    assert cache.get(URL)[0] == changed
+
+
+def test_stale_entry_when_resolving_fails(cache, clock):
+    resolver = Resolver(SONGS, None)
+    track_list(cache, URL, resolver)
+    clock.now += 3600
+    assert track_list(cache, URL, resolver) == (SONGS, "stale")
+    assert cache.get(URL) == (SONGS, 3600)  # kept, not refreshed
+
+
+def test_failed_without_an_entry(cache):
+    assert track_list(cache, URL, Resolver(None)) == (None, "failed")
+    assert cache.get(URL) is None
+
+
+def test_ttl_0_always_resolves(cache):
+    cache.ttl = 0
+    resolver = Resolver(SONGS, SONGS)
+    track_list(cache, URL, resolver)
+    assert track_list(cache, URL, resolver) == (SONGS, "unchanged")
+    assert len(resolver.calls) == 2
+
+
+def test_invalidate(cache):
+    other = "https://open.spotify.com/album/4aawyAB9vmqN3uQ7FjRGTy"
+    cache.put(URL, SONGS)
+    cache.put(other, SONGS)
+    cache.invalidate(URL + "?si=x")
+    assert cache.get(URL) is None
+    assert cache.get(other) is not None
+    cache.invalidate()
+    assert cache.get(other) is None
+
+
+def test_entries_survive_a_new_instance(cache, tmp_path, clock):
+    cache.put(URL, SONGS)
+    reopened = MetadataCache(tmp_path / "metadata.sqlite3", clock=clock)
+    assert reopened.get(URL) == (SONGS, 0)
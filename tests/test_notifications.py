@@ -0,0 +1,99 @@
+from notifications import Notifier
+
+
+class Timers:
+    """Stands in for ``threading.Timer``: callbacks run when time is advanced."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.scheduled = []
+
+    def call_later(self, delay, callback):
+        timer = Timer(self.now + delay, callback)
+        self.scheduled.append(timer)
+        return timer
+
+    def advance(self, seconds: float) -> None:
+        end = self.now + seconds
+        while True:
+            due = [t for t in self.scheduled if t.due <= end and not t.cancelled]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t.due)
+            self.scheduled.remove(timer)
+            self.now = timer.due
+            timer.callback()
+        self.now = end
+
+
+class Timer:
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+def make_notifier(**kwargs):
+    timers, posts = Timers(), []
+    notifier = Notifier(
+        lambda key, value: posts.append((key, value)),
+        coalesce=0.3,
+        display=6,
+        call_later=timers.call_later,
+        **kwargs,
+    )
+    return notifier, timers, posts
+
+
+def test_messages_in_quick_succession_share_a_line():
+    notifier, timers, posts = make_notifier()
+    notifier.notify("spotdl 4.2.5 found")
+    timers.advance(0.2)
+    notifier.notify("FFmpeg found")
+    notifier.notify("FFmpeg found")  # repeated while pending
+    assert posts == []
+    timers.advance(0.1)
+    assert posts == [("-status-", ("spotdl 4.2.5 found | FFmpeg found", False))]
+
+
+def test_informational_lines_are_cleared_after_a_while():
+    notifier, timers, posts = make_notifier()
+    notifier.notify("Download finished")
+    timers.advance(6.2)
+    assert len(posts) == 1
+    timers.advance(0.1)
+    assert posts[-1] == ("-status-", ("", False))
+
+
+def test_errors_stay_until_the_next_message():
+    notifier, timers, posts = make_notifier()
+    notifier.notify("Saved")
+    notifier.notify("spotdl is not installed", error=True)
+    timers.advance(60)
+    assert posts == [("-status-", ("Saved | spotdl is not installed", True))]
+    notifier.notify("spotdl installed")
+    timers.advance(0.3)
+    assert posts[-1] == ("-status-", ("spotdl installed", False))
+
+
+def test_a_newer_line_is_not_cleared_by_an_older_ones_timer():
+    notifier, timers, posts = make_notifier()
+    notifier.notify("first")
+    timers.advance(5)
+    notifier.notify("second")
+    timers.advance(1.5)  # the first line's display time is over
+    assert posts[-1] == ("-status-", ("second", False))
+    timers.advance(5)
+    assert posts[-1] == ("-status-", ("", False))
+    assert len(posts) == 3
+
+
+def test_only_the_latest_messages_are_shown():
+    notifier, timers, posts = make_notifier(max_shown=2)
+    for number in range(5):
+        notifier.notify(f"message {number}")
+    timers.advance(0.3)
+    assert posts == [("-status-", ("message 3 | message 4 (+3 more)", False))]
@@ -0,0 +1,133 @@
+from dataclasses import fields
+from typing import Optional
+
+import pytest
+
+from bandwidth import with_rate_limit
+from options import DownloadOptions, default_threads
+
+OPTIONS = {option.name: option for option in fields(DownloadOptions)}
+FLAGS = [name for name, option in OPTIONS.items() if option.type is bool]
+NUMBERS = [name for name, option in OPTIONS.items() if option.type == Optional[int]]
+TEXTS = [name for name, option in OPTIONS.items() if option.type is str]
+WIDGETS = [name for name in OPTIONS if OPTIONS[name].metadata["key"] is not None]
+
+SAMPLE_TEXT = {
+    "audio_source": "youtube-music",
+    "lyrics_source": "genius",
+    "format": "opus",
+    "bitrate": "192k",
+    "ffmpeg_args": "-vn",
+    "log_level": "DEBUG",
+    "output_dir": "/music/{artist}",
+    "yt_dlp_args": "--no-check-certificate",
+    "proxy": "http://127.0.0.1:8080",
+    "host": "0.0.0.0",
+}
+
+
+def values(**fields_by_name) -> dict:
+    return {
+        OPTIONS[name].metadata["key"]: value for name, value in fields_by_name.items()
+    }
+
+
+def test_every_option_is_covered():
+    assert sorted(FLAGS + NUMBERS + TEXTS) == sorted(OPTIONS)
+    assert set(SAMPLE_TEXT) == set(TEXTS)
+
+
+def test_defaults_build_no_arguments():
+    assert DownloadOptions().to_argv("https://open.spotify.com/playlist/x") == []
+    assert DownloadOptions.from_values({}).to_argv() == []
+
+
+@pytest.mark.parametrize("name", FLAGS)
+def test_flag(name):
+    options = DownloadOptions.from_values(values(**{name: True}))
+    argv = options.to_argv("https://open.spotify.com/playlist/abc?si=1")
+    flag = OPTIONS[name].metadata["flag"]
+    assert argv[0] == flag
+    if name == "save_file":
+        assert argv == [flag, "./abc.spotdl"]
+    else:
+        assert argv == [flag]
+    assert DownloadOptions.from_values(values(**{name: False})).to_argv() == []
+
+
+@pytest.mark.parametrize("name", TEXTS)
+def test_text(name):
+    value = SAMPLE_TEXT[name]
+    options = DownloadOptions.from_values(values(**{name: f"  {value} "}))
+    assert getattr(options, name) == value
+    assert options.to_argv() == [f"{OPTIONS[name].metadata['flag']}={value}"]
+
+
+@pytest.mark.parametrize("name", NUMBERS)
+def test_number(name):
+    minimum = OPTIONS[name].metadata["minimum"]
+    flag = OPTIONS[name].metadata["flag"]
+    build = DownloadOptions.from_values
+    if name in WIDGETS:
+        options = build(values(**{name: f" {minimum + 2} "}))
+        assert getattr(options, name) == minimum + 2
+        assert build(values(**{name: ""})).to_argv() == []
+    else:
+        options = build({}, **{name: minimum + 2})
+    assert options.to_argv() == [f"{flag}={minimum + 2}"]
+
+    with pytest.raises(ValueError, match="whole number"):
+        build({}, **{name: "many"})
+    with pytest.raises(ValueError, match=f"at least {minimum}"):
+        build({}, **{name: minimum - 1})
+    maximum = OPTIONS[name].metadata.get("maximum")
+    if maximum is not None:
+        assert getattr(build({}, **{name: maximum}), name) == maximum
+        with pytest.raises(ValueError, match=f"at most {maximum}"):
+            build({}, **{name: maximum + 1})
+
+
+def test_values_without_a_widget_are_ignored():
+    options = DownloadOptions.from_values({"THREADS": "3", "URL": "x"})
+    assert options.threads is None
+
+
+@pytest.mark.parametrize("cores, threads", [(8, 7), (2, 1), (1, 1), (None, 1)])
+def test_default_threads_leave_a_core_free(monkeypatch, cores, threads):
+    monkeypatch.setattr("os.cpu_count", lambda: cores)
+    assert default_threads() == threads
+    options = DownloadOptions.from_values({}, threads=default_threads())
+    assert options.to_argv() == [f"--threads={threads}"]
+
+
+def test_save_file_goes_to_the_output_folder():
+    options = DownloadOptions(save_file=True, output_dir="out")
+    argv = options.to_argv("https://open.spotify.com/album/xyz/")
+    assert argv == ["--output=out", "--save-file", "out/xyz.spotdl"]
+
+
+def test_detect_formats_takes_the_format():
+    options = DownloadOptions(detect_formats=True, format="m4a")
+    assert options.to_argv() == ["--format=m4a", "--detect-formats", "m4a"]
+
+
+def test_proxy_must_be_a_url():
+    with pytest.raises(ValueError, match="Proxy"):
+        DownloadOptions.from_values(values(proxy="127.0.0.1:8080"))
+
+
+def test_values_starting_with_a_dash_stay_attached():
+    argv = DownloadOptions(ffmpeg_args="-vn -ar 44100").to_argv()
+    assert argv == ["--ffmpeg-args=-vn -ar 44100"]
+
+
+@pytest.mark.parametrize("name", ["ffmpeg_args", "yt_dlp_args"])
+def test_arguments_must_split_like_a_command_line(name):
+    with pytest.raises(ValueError, match="No closing quotation"):
+        DownloadOptions(**{name: '--postprocessor-args "-ar 44100'}).validated()
+    DownloadOptions(**{name: "--postprocessor-args '-ar 44100'"}).validated()
+
+
+def test_rate_limit_reports_unbalanced_quotes():
+    with pytest.raises(ValueError, match="Yt dlp args"):
+        with_rate_limit(["--yt-dlp-args=--proxy 'socks5://host"], 65536)
@@ -0,0 +1,120 @@
+from progress import ProgressReporter
+
+LINES = 10000
+
+
+class Timers:
+    """
+    A virtual clock and ``call_later`` for the reporter: time only passes,
+    and scheduled callbacks only run, when the test advances it.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.scheduled = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def call_later(self, delay, callback):
+        timer = Timer(self.now + delay, callback)
+        self.scheduled.append(timer)
+        return timer
+
+    def advance(self, seconds: float) -> None:
+        end = self.now + seconds
+        while True:
+            due = [t for t in self.scheduled if t.due <= end and not t.cancelled]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t.due)
+            self.scheduled.remove(timer)
+            self.now = timer.due
+            timer.callback()
+        self.now = end
+
+
+class Timer:
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Posts:
+    """Records what the reporter posts, like ``Window.write_event_value``."""
+
+    def __init__(self):
+        self.values = []
+
+    def __call__(self, key, value):
+        assert key == "-progress-"
+        self.values.append(value)
+
+
+def make_reporter(fps: float):
+    timers, posts = Timers(), Posts()
+    reporter = ProgressReporter(
+        posts, fps=fps, call_later=timers.call_later, clock=timers.clock
+    )
+    return reporter, timers, posts
+
+
+def test_first_update_is_posted_at_once():
+    reporter, _timers, posts = make_reporter(fps=1)
+    reporter.update(1, 5)
+    assert posts.values == [(1, 5)]
+
+
+def test_updates_within_a_frame_post_only_the_latest():
+    reporter, timers, posts = make_reporter(fps=20)
+    reporter.update(1, 9)
+    timers.advance(0.01)
+    reporter.update(2, 9)
+    reporter.update(3, 9)
+    timers.advance(0.039)
+    assert posts.values == [(1, 9)]
+    timers.advance(0.001)  # the trailing edge of the frame
+    assert posts.values == [(1, 9), (3, 9)]
+    timers.advance(1)
+    assert len(posts.values) == 2
+
+
+def test_update_after_a_quiet_frame_is_posted_at_once():
+    reporter, timers, posts = make_reporter(fps=20)
+    reporter.update(1, None)
+    timers.advance(0.05)
+    reporter.update(2, None)
+    assert posts.values == [(1, None), (2, None)]
+    assert timers.scheduled == []
+
+
+def test_flush_posts_the_pending_value():
+    reporter, timers, posts = make_reporter(fps=1)
+    reporter.update(1, None)
+    reporter.update(2, None)
+    reporter.update(3, 9)
+    assert posts.values == [(1, None)]
+    reporter.flush()
+    assert posts.values == [(1, None), (3, 9)]
+    reporter.flush()
+    timers.advance(1)  # the cancelled trailing update does not fire
+    assert len(posts.values) == 2
+
+
+def test_bursts_are_throttled_to_the_frame_rate():
+    reporter, timers, posts = make_reporter(fps=20)
+    for line in range(1, LINES + 1):
+        reporter.update(line, LINES)
+        if line % 100 == 0:
+            timers.advance(0.005)  # lines arrive in bursts, as from spotdl
+    timers.advance(0.05)
+    assert posts.values[-1] == (LINES, LINES)
+    currents = [current for current, _maximum in posts.values]
+    assert currents == sorted(currents)
+    # One frame per interval, plus the first update and the trailing one
+    assert len(posts.values) <= timers.now * 20 + 2
+    assert len(posts.values) < LINES / 10
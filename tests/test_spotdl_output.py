@@ -0,0 +1,54 @@
+"""
+Golden tests for the spotdl output parser.
+
+``data/spotdl_output.log`` holds recorded lines of every format the parser
+knows and some it must ignore; ``data/spotdl_output.golden`` the ``repr`` of
+the event each one parses to.  After an intended change of the parser,
+rewrite the golden file with ``UPDATE_GOLDEN=1 python -m pytest`` and review
+its diff.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from spotdl_output import TRACK_DONE, Found, parse_line
+
+DATA = Path(__file__).resolve().parent / "data"
+LOG = DATA / "spotdl_output.log"
+GOLDEN = DATA / "spotdl_output.golden"
+
+
+def read_lines(path: Path) -> list:
+    with open(path, encoding="utf-8", newline="") as file:
+        return file.read().splitlines()
+
+
+def test_golden():
+    parsed = [repr(parse_line(line)) for line in read_lines(LOG)]
+    if os.environ.get("UPDATE_GOLDEN"):
+        GOLDEN.write_text("\n".join(parsed) + "\n", encoding="utf-8")
+    assert parsed == read_lines(GOLDEN)
+
+
+@pytest.mark.parametrize("ending", ["", "\n", "\r\n"])
+def test_line_endings(ending):
+    assert parse_line("Found 3 songs in X (Album)" + ending) == Found(3, "X (Album)")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        'Downloaded "A - B": https://music.youtube.com/watch?v=x',
+        "Skipping A - B (skip file found)",
+        "LookupError: No results found for song: A - B",
+    ],
+)
+def test_track_done(line):
+    assert isinstance(parse_line(line), TRACK_DONE)
+
+
+def test_unrelated_lines():
+    for line in ["", "   ", "Found songs in X", "Skipping track: 2 local tracks"]:
+        assert parse_line(line) is None
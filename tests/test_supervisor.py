@@ -0,0 +1,88 @@
+import asyncio
+import sys
+
+import pytest
+
+from supervisor import STDERR, STDOUT, ProcessSupervisor
+
+# Writes 8 MiB to stderr in 1 KiB lines, far beyond any pipe buffer, with a
+# numbered stdout line after every 1024 of them.
+FLOOD = """
+import sys
+line = "w" * 1023 + "\\n"
+for number in range(8 * 1024):
+    sys.stderr.write(line)
+    if number % 1024 == 1023:
+        sys.stderr.flush()
+        print(number // 1024, flush=True)
+"""
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = ProcessSupervisor(terminate_grace=1)
+    yield supervisor
+    supervisor.close()
+
+
+def run(supervisor, argv, **kwargs):
+    lines = []
+
+    def on_line(stream, line):
+        lines.append((stream, line))
+
+    code = supervisor.submit(supervisor.run(argv, on_line, **kwargs)).result(60)
+    return code, lines
+
+
+def test_megabytes_on_stderr_do_not_block(supervisor):
+    code, lines = run(supervisor, [sys.executable, "-c", FLOOD], idle_timeout=30)
+    assert code == 0
+    stderr = [line for stream, line in lines if stream == STDERR]
+    stdout = [line for stream, line in lines if stream == STDOUT]
+    assert len(stderr) == 8 * 1024
+    assert sum(map(len, stderr)) == 8 * 2**20
+    assert stdout == [f"{number}\n" for number in range(8)]
+
+
+def test_streams_are_tagged_in_order(supervisor):
+    script = (
+        "import sys\n"
+        "for n in range(500):\n"
+        "    print(n, file=sys.stderr if n % 2 else sys.stdout, flush=True)\n"
+    )
+    code, lines = run(supervisor, [sys.executable, "-c", script])
+    assert code == 0
+    assert [line for stream, line in lines if stream == STDOUT] == [
+        f"{n}\n" for n in range(0, 500, 2)
+    ]
+    assert [line for stream, line in lines if stream == STDERR] == [
+        f"{n}\n" for n in range(1, 500, 2)
+    ]
+
+
+def test_slow_consumer_holds_the_child_back(supervisor):
+    consumed = []
+
+    async def on_line(stream, line):
+        await asyncio.sleep(0)
+        consumed.append(stream)
+
+    code = supervisor.submit(
+        supervisor.run([sys.executable, "-c", FLOOD], on_line)
+    ).result(60)
+    assert code == 0
+    assert consumed.count(STDERR) == 8 * 1024
+
+
+def test_exit_code_and_stdin(supervisor):
+    script = "import sys; print(input()); sys.exit(3)"
+    code, lines = run(supervisor, [sys.executable, "-c", script], stdin_data="y\n")
+    assert code == 3
+    assert lines == [(STDOUT, "y\n")]
+
+
+def test_idle_timeout_stops_the_child(supervisor):
+    script = "import time; print('started', flush=True); time.sleep(30)"
+    with pytest.raises(asyncio.TimeoutError):
+        run(supervisor, [sys.executable, "-c", script], idle_timeout=0.5)
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import stat
+import time
+from pathlib import Path
+
+import pytest
+
+import supervisor as supervisor_module
+import transcode
+from transcode import (
+    ENCODERS,
+    Transcoder,
+    TranscodeTask,
+    ffmpeg_command,
+    file_name,
+    native_format,
+    split_options,
+)
+
+CODECS = {".m4a": "aac", ".opus": "opus"}
+
+
+def probe_extension(path: str):
+    return CODECS.get(os.path.splitext(path)[1])
+
+
+def write_mode(task: TranscodeTask) -> None:
+    """Stands in for FFmpeg, writing whether it was asked to copy or encode."""
+    Path(task.target).write_text("copy" if task.copy else "encode")
+
+
+def wait_for_go(task: TranscodeTask) -> None:
+    """Encodes only once a file named "go" appears next to the source."""
+    go = Path(task.source).parent / "go"
+    deadline = time.monotonic() + 10
+    while not go.exists():
+        if time.monotonic() > deadline:
+            raise RuntimeError("never told to go")
+        time.sleep(0.01)
+    write_mode(task)
+
+
+def source(tmp_path, name: str) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"audio")
+    return str(path)
+
+
+def convert(transcoder: Transcoder, task: TranscodeTask):
+    async def run():
+        return await (await transcoder.put(task))
+
+    try:
+        return asyncio.run(run())
+    finally:
+        transcoder.close()
+
+
+@pytest.mark.parametrize(
+    "name, format, ffmpeg_args, copied",
+    [
+        ("a.m4a", "m4a", "", True),
+        ("a.opus", "opus", "", True),
+        ("a.opus", "ogg", "", False),  # Ogg holds Vorbis, not Opus
+        ("a.m4a", "mp3", "", False),
+        ("a.m4a", "m4a", "-af volume=0.5", False),  # may filter the audio
+        ("a.wav", "wav", "", False),  # unknown codec
+    ],
+)
+def test_remux_when_the_codec_fits_the_format(
+    tmp_path, name, format, ffmpeg_args, copied
+):
+    task = TranscodeTask(
+        source(tmp_path, name),
+        str(tmp_path / "out" / f"b.{format}"),
+        format,
+        ffmpeg_args=ffmpeg_args,
+    )
+    transcoder = Transcoder(1, encoder=write_mode, prober=probe_extension)
+    conversion = convert(transcoder, task)
+    assert conversion.codec == probe_extension(task.source)
+    assert conversion.copied is copied
+    assert Path(task.target).read_text() == ("copy" if copied else "encode")
+    assert not os.path.exists(task.source)
+
+
+def test_no_prober_always_encodes(tmp_path):
+    task = TranscodeTask(source(tmp_path, "a.m4a"), str(tmp_path / "b.m4a"), "m4a")
+    conversion = convert(Transcoder(1, encoder=write_mode, prober=None), task)
+    assert (conversion.codec, conversion.copied) == (None, False)
+
+
+def refuse(task: TranscodeTask) -> None:
+    raise RuntimeError("FFmpeg failed: unsupported")
+
+
+def test_encoder_errors_reach_the_future_and_keep_the_source(tmp_path):
+    task = TranscodeTask(source(tmp_path, "a.m4a"), str(tmp_path / "b.mp3"), "mp3")
+    with pytest.raises(RuntimeError, match="unsupported"):
+        convert(Transcoder(1, encoder=refuse, prober=None), task)
+    assert os.path.exists(task.source)
+
+
+def test_put_waits_while_the_queue_is_full(tmp_path):
+    tasks = [
+        TranscodeTask(source(tmp_path, f"{n}.m4a"), str(tmp_path / f"{n}.mp3"), "mp3")
+        for n in range(3)
+    ]
+    transcoder = Transcoder(1, queue_size=1, encoder=wait_for_go, prober=None)
+
+    async def run():
+        first = await transcoder.put(tasks[0])
+        await asyncio.sleep(0.2)  # the worker takes it off the queue
+        second = await transcoder.put(tasks[1])
+        third = asyncio.ensure_future(transcoder.put(tasks[2]))
+        await asyncio.sleep(0.2)
+        blocked = not third.done()
+        (tmp_path / "go").touch()
+        results = await asyncio.gather(first, second, await third)
+        return blocked, results
+
+    try:
+        blocked, results = asyncio.run(run())
+    finally:
+        transcoder.close()
+    assert blocked
+    assert [conversion.copied for conversion in results] == [False] * 3
+    assert all(os.path.exists(task.target) for task in tasks)
+
+
+def test_cancelled_tasks_are_dropped(tmp_path):
+    tasks = [
+        TranscodeTask(source(tmp_path, f"{n}.m4a"), str(tmp_path / f"{n}.mp3"), "mp3")
+        for n in range(2)
+    ]
+    transcoder = Transcoder(1, encoder=wait_for_go, prober=None)
+
+    async def run():
+        first = await transcoder.put(tasks[0])
+        second = await transcoder.put(tasks[1])
+        second.cancel()
+        (tmp_path / "go").touch()
+        await first
+        await transcoder._queue.join()
+
+    try:
+        asyncio.run(run())
+    finally:
+        transcoder.close()
+    assert os.path.exists(tasks[0].target)
+    assert not os.path.exists(tasks[1].target)
+    assert os.path.exists(tasks[1].source)
+
+
+def arguments(task: TranscodeTask) -> list:
+    return ffmpeg_command(task, "out.part")[1:]  # without FFmpeg's path
+
+
+def test_ffmpeg_command_encodes_mp3_with_cover_and_id3v23():
+    argv = arguments(TranscodeTask("a.opus", "a.mp3", "mp3", bitrate="128k"))
+    assert argv[:8] == ["-nostdin", "-y", "-v", "error", "-i", "a.opus", "-map", "0:a"]
+    assert argv[8:12] == ["-map", "0:v?", "-c:v", "copy"]
+    assert argv[12:14] == ["-map_metadata", "0:s:a:0"]  # Opus tags the stream
+    assert argv[14:] == ENCODERS["mp3"] + [
+        "-b:a",
+        "128k",
+        "-id3v2_version",
+        "3",
+        "-f",
+        "mp3",
+        "out.part",
+    ]
+
+
+def test_ffmpeg_command_copies_into_m4a():
+    argv = arguments(TranscodeTask("a.m4a", "b.m4a", "m4a", bitrate="128k", copy=True))
+    assert argv[argv.index("-map_metadata") + 1] == "0"
+    copy = ["-codec:a", "copy", "-movflags", "+faststart", "-f", "ipod"]
+    assert argv[-7:] == copy + ["out.part"]
+    assert "-b:a" not in argv
+
+
+@pytest.mark.parametrize(
+    "bitrate, expected",
+    [("0", ["-q:a", "0"]), ("320k", ["-b:a", "320k"]), ("auto", []), ("", [])],
+)
+def test_ffmpeg_command_bitrate(bitrate, expected):
+    argv = arguments(TranscodeTask("a.opus", "a.ogg", "ogg", bitrate=bitrate))
+    assert "0:v?" not in argv  # Ogg keeps no cover stream
+    rate = argv.index("libvorbis") + 1
+    assert argv[rate : rate + len(expected)] == expected
+    assert argv[rate + len(expected) :] == ["-f", "ogg", "out.part"]
+
+
+def test_ffmpeg_command_appends_user_arguments():
+    task = TranscodeTask("a.m4a", "a.flac", "flac", ffmpeg_args='-af "volume=0.5"')
+    assert arguments(task)[-5:] == ["-af", "volume=0.5", "-f", "flac", "out.part"]
+
+
+def test_find_ffmpeg_in_spotdls_folder(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delitem(supervisor_module._executables, "ffmpeg", raising=False)
+    assert transcode.find_ffmpeg() is None
+    folder = tmp_path / ".spotdl"
+    folder.mkdir()
+    (folder / "ffmpeg").touch()
+    assert transcode.find_ffmpeg() == str(folder / "ffmpeg")
+    program = tmp_path / "bin" / "ffmpeg"
+    program.parent.mkdir()
+    program.touch()
+    program.chmod(stat.S_IRWXU)
+    assert transcode.find_ffmpeg() == str(program)
+    supervisor_module._executables.pop("ffmpeg", None)
+
+
+@pytest.mark.parametrize(
+    "options, rest, encoding",
+    [
+        ([], [], {"format": "mp3", "bitrate": "", "ffmpeg_args": ""}),
+        (
+            ["--threads=2", "--format=opus", "--bitrate=auto", "--ffmpeg-args=-ac 1"],
+            ["--threads=2"],
+            {"format": "opus", "bitrate": "auto", "ffmpeg_args": "-ac 1"},
+        ),
+    ],
+)
+def test_split_options(options, rest, encoding):
+    assert split_options(options) == (rest, encoding)
+
+
+@pytest.mark.parametrize(
+    "song, name",
+    [
+        ({"artists": ["A", "B"], "name": "Title"}, "A, B - Title.m4a"),
+        ({"artist": "A", "name": "Why?"}, "A - Why.m4a"),
+        (
+            {"artists": ["AC/DC"], "name": 'Say "Hi":  Live'},
+            "ACDC - Say 'Hi'- Live.m4a",
+        ),
+    ],
+)
+def test_file_name(song, name):
+    assert file_name(song, "m4a") == name
+
+
+@pytest.mark.parametrize(
+    "target, native",
+    [("mp3", "m4a"), ("m4a", "m4a"), ("ogg", "opus"), ("opus", "opus")],
+)
+def test_native_format(target, native):
+    assert native_format(target) == native
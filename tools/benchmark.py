@@ -0,0 +1,794 @@
+"""
+Benchmarks for the download pipeline, run against the offline fake spotdl.
+
+    python tools/benchmark.py                       # writes benchmark-results.json
+    python tools/benchmark.py --quick --output new.json --compare old.json
+
+Every benchmark returns a flat dict of numbers, and the results are written
+as JSON together with the commit and the Python version they were measured
+with.  ``--compare`` prints the relative change of every number against an
+earlier results file.  Benchmarks that need something the machine does not
+have (a display for the GUI latency) record why they were skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from download_queue import DownloadQueue  # noqa: E402
+from journal import JobJournal  # noqa: E402
+from library import TrackIndex  # noqa: E402
+from log_tail import LogTail  # noqa: E402
+from log_view import LogBuffer  # noqa: E402
+from spotdl_output import parse_line  # noqa: E402
+from loudness import RATE, LoudnessAnalyzer, integrated_loudness  # noqa: E402
+from supervisor import ProcessSupervisor  # noqa: E402
+from transcode import (  # noqa: E402
+    TranscodeTask,
+    Transcoder,
+    cpu_time,
+    ffmpeg_encode,
+    find_ffmpeg,
+)
+
+FAKE_SPOTDL = Path(__file__).resolve().parent / "fake_spotdl.py"
+GOLDEN_LOG = ROOT / "tests" / "data" / "spotdl_output.log"
+
+# Runs the app until its window is on screen and prints when that was.
+FIRST_FRAME = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import main
+from layout import sg, window
+
+def read(*args, **kwargs):
+    end = time.time() + 10
+    while not window.TKroot.winfo_viewable() and time.time() < end:
+        window.TKroot.update()
+    print(json.dumps({"shown": time.time()}), flush=True)
+    return sg.WIN_CLOSED, None
+
+window.read = read
+main.main_gui()
+"""
+
+# Runs the app until its dependency check is done, then measures the CPU the
+# whole process uses while the main loop blocks in window.read(), and while
+# it polls with window.read(1) as it used to.
+IDLE_CPU = """
+import json, sys, threading, time
+sys.path.insert(0, sys.argv[1])
+import main
+from layout import sg, window
+
+seconds = float(sys.argv[2])
+real_read = window.read
+
+def measure(wait):
+    cpu, wall = time.process_time(), time.perf_counter()
+    wait()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return 100 * cpu / wall
+
+def blocking():
+    threading.Timer(seconds, window.write_event_value, ("-wake-", None)).start()
+    while real_read()[0] != "-wake-":
+        pass
+
+def polling():
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        real_read(1)
+
+def read(*args, **kwargs):
+    event, values = real_read(*args, **kwargs)
+    if event != "-dependencies-":
+        return event, values
+    result = {"blocking": measure(blocking), "polling": measure(polling)}
+    print(json.dumps(result), flush=True)
+    return sg.WIN_CLOSED, None
+
+window.read = read
+main.main_gui()
+"""
+
+
+def install(directory: Path, **settings) -> None:
+    """
+    Puts the fake spotdl on the PATH of this process and its children.
+
+    :param directory: (Path) Where the ``spotdl`` launcher is created.
+    :param settings: ``FAKE_SPOTDL_*`` settings, e.g. ``songs=1000, rate=0``.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    if os.name == "nt":
+        launcher = directory / "spotdl.cmd"
+        launcher.write_text(f'@"{sys.executable}" "{FAKE_SPOTDL}" %*\n')
+    else:
+        launcher = directory / "spotdl"
+        launcher.write_text(
+            f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SPOTDL}" "$@"\n'
+        )
+        launcher.chmod(0o755)
+    os.environ["PATH"] = f"{directory}{os.pathsep}{os.environ['PATH']}"
+    configure(**settings)
+
+
+def configure(**settings) -> None:
+    for name, value in settings.items():
+        os.environ[f"FAKE_SPOTDL_{name.upper()}"] = str(value)
+
+
+class EventCounter:
+    """Stands in for ``Window.write_event_value``."""
+
+    def __init__(self):
+        self.events: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def write_event_value(self, key, _value) -> None:
+        with self._lock:
+            self.events[key] = self.events.get(key, 0) + 1
+
+
+def stub_encode(task: TranscodeTask) -> None:
+    """
+    Stands in for FFmpeg: spends ``FAKE_SPOTDL_ENCODE`` CPU seconds (a
+    twentieth of it for a remux) and copies the file.
+    """
+    cost = float(os.environ.get("FAKE_SPOTDL_ENCODE", 0))
+    end = time.process_time() + (cost / 20 if task.copy else cost)
+    while time.process_time() < end:
+        pass
+    shutil.copyfile(task.source, task.target)
+
+
+def run_app(work: Path, script: str, *args: str) -> Tuple[float, dict]:
+    """
+    Runs a script that drives the app in a fresh interpreter, with a home
+    folder of its own, and returns when it was started and the JSON object
+    it printed last.  Raises RuntimeError with the reason if it printed none,
+    e.g. because there is no display.
+    """
+    home = work / "app-home"
+    home.mkdir(exist_ok=True)
+    env = dict(os.environ, HOME=str(home), USERPROFILE=str(home))
+    started = time.time()
+    try:
+        done = subprocess.run(
+            [sys.executable, "-c", script, str(ROOT), *args],
+            cwd=work,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError("the app did not finish in time")
+    for line in reversed(done.stdout.splitlines()):
+        if line.startswith("{"):
+            return started, json.loads(line)
+    errors = done.stderr.strip().splitlines()
+    raise RuntimeError(errors[-1] if errors else f"exit status {done.returncode}")
+
+
+def make_corpus(directory: Path, count: int) -> List[Path]:
+    """Writes a minute of sine in AAC and Opus files alternately with FFmpeg."""
+    directory.mkdir(exist_ok=True)
+    files = []
+    for number in range(count):
+        extension, codec = ("m4a", "aac") if number % 2 else ("opus", "libopus")
+        path = directory / f"track{number}.{extension}"
+        subprocess.run(
+            [find_ffmpeg() or "ffmpeg", "-v", "error", "-f", "lavfi", "-i"]
+            + [f"sine=frequency={220 + number * 20}:duration=60"]
+            + ["-codec:a", codec, "-b:a", "128k", str(path)],
+            check=True,
+        )
+        files.append(path)
+    return files
+
+
+def meter_noise(seed: int) -> Optional[float]:
+    """Measures three minutes of stereo noise, like one decoded track."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    samples = 0.1 * rng.standard_normal((180 * RATE, 2), dtype=np.float32)
+    return integrated_loudness(samples)
+
+
+def bench_exec_command(work: Path, scale: float) -> dict:
+    """Lines per second through ``exec_command`` into the log file."""
+    from main import exec_command  # imports layout, but needs no display
+
+    songs = int(20000 * scale)
+    configure(songs=songs, rate=0, noise=3)
+    output_file = work / "exec_command.log"
+    window = EventCounter()
+    supervisor = ProcessSupervisor()
+    try:
+        started = time.perf_counter()
+        supervisor.submit(
+            exec_command(
+                supervisor,
+                ["spotdl", "https://open.spotify.com/playlist/bench"],
+                str(output_file),
+                window,
+            )
+        ).result()
+        elapsed = time.perf_counter() - started
+    finally:
+        supervisor.close()
+    with open(output_file, "rb") as file:
+        lines = sum(
+            chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 20), b"")
+        )
+    return {
+        "lines": lines,
+        "seconds": elapsed,
+        "lines_per_second": lines / elapsed,
+        "output_events": window.events.get("-output-", 0),
+    }
+
+
+def bench_download_queue(work: Path, scale: float) -> dict:
+    """Tracks per second through ``DownloadQueue`` with parsing and journaling."""
+    jobs, songs = 4, int(2000 * scale)
+    configure(songs=songs, rate=0, noise=1)
+    window = EventCounter()
+    supervisor = ProcessSupervisor()
+    queue = DownloadQueue(
+        supervisor,
+        window.write_event_value,
+        str(work / "queue.log"),
+        max_workers=2,
+        journal=JobJournal(work / "journal"),
+        skip_present=False,
+    )
+    try:
+        started = time.perf_counter()
+        for number in range(jobs):
+            queue.submit(f"https://open.spotify.com/playlist/{number}", [])
+        while any(job.active for job in queue.jobs):
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    finally:
+        supervisor.close()
+    tracks = sum(job.processed for job in queue.jobs)
+    return {
+        "tracks": tracks,
+        "seconds": elapsed,
+        "tracks_per_second": tracks / elapsed,
+        "job_events": window.events.get("-job-", 0),
+        "output_events": window.events.get("-output-", 0),
+    }
+
+
+def bench_spotdl_output(work: Path, scale: float) -> dict:
+    """
+    Lines per second through ``parse_line`` over a recorded corpus: the
+    output of a large fake spotdl run, its lines once more in the format of
+    ``--log-level DEBUG``, and the lines of the parser's golden tests.
+    """
+    configure(songs=int(50000 * scale), rate=0, skip=0.05, fail=0.05, noise=3)
+    recorded = subprocess.run(
+        ["spotdl", "https://open.spotify.com/playlist/corpus"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    lines = (recorded.stdout + recorded.stderr).splitlines()
+    lines += [
+        f"[12:00:00] DEBUG    asyncio_{n % 8} - {line}    downloader.py:{n % 900}"
+        for n, line in enumerate(lines)
+    ]
+    lines += GOLDEN_LOG.read_text(encoding="utf-8").splitlines()
+    events: Dict[str, int] = {}
+    times = []
+    for _ in range(3):
+        started = time.perf_counter()
+        parsed = [parse_line(line) for line in lines]
+        times.append(time.perf_counter() - started)
+    for event in parsed:
+        name = type(event).__name__ if event is not None else "none"
+        events[name] = events.get(name, 0) + 1
+    elapsed = min(times)
+    return {
+        "lines": len(lines),
+        "seconds": elapsed,
+        "lines_per_second": len(lines) / elapsed,
+        "us_per_line": elapsed / len(lines) * 1e6,
+        **{f"events_{name}": count for name, count in sorted(events.items())},
+    }
+
+
+def bench_spawn_latency(work: Path, scale: float) -> dict:
+    """
+    Time from starting a process to its first line of output, over 1,000
+    launches of a stand-in executable: through ``ProcessSupervisor.run`` from
+    an argument list, and through a shell as the app used to start spotdl.
+    """
+    echo = shutil.which("echo")
+    argv = [echo, "ready"] if echo else [sys.executable, "-c", "print('ready')"]
+    launches = max(50, int(1000 * scale))
+    command = subprocess.list2cmdline(argv) if os.name == "nt" else " ".join(argv)
+
+    async def first_output(shell: bool) -> float:
+        started = time.perf_counter()
+        if shell:
+            process = await asyncio.create_subprocess_shell(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            await process.stdout.readline()
+            first = time.perf_counter()
+            await process.communicate()
+            return first - started
+        lines: List[float] = []
+        await supervisor.run(
+            argv, lambda _stream, _line: lines.append(time.perf_counter())
+        )
+        return lines[0] - started
+
+    def percentiles(times: List[float], prefix: str) -> dict:
+        times = sorted(times)
+        return {
+            f"{prefix}_p50_ms": times[len(times) // 2] * 1000,
+            f"{prefix}_p95_ms": times[int(len(times) * 0.95)] * 1000,
+            f"{prefix}_max_ms": times[-1] * 1000,
+        }
+
+    supervisor = ProcessSupervisor()
+    try:
+        results = {"launches": launches}
+        for name, shell in (("argv", False), ("shell", True)):
+            times = [
+                supervisor.submit(first_output(shell)).result() for _ in range(launches)
+            ]
+            results.update(percentiles(times, name))
+    finally:
+        supervisor.close()
+    return results
+
+
+def bench_transcode_pipeline(work: Path, scale: float) -> dict:
+    """
+    One playlist converted by spotdl itself versus by the ``Transcoder`` with
+    a stub encoder of the same cost, overlapping with the download.
+    """
+    songs = max(10, int(400 * scale))
+    configure(songs=songs, rate=20, encode=0.04, skip=0, fail=0, noise=0)
+    result = {"tracks": songs}
+    for mode in ("inline", "pipeline"):
+        transcoder = Transcoder(encoder=stub_encode) if mode == "pipeline" else None
+        supervisor = ProcessSupervisor()
+        queue = DownloadQueue(
+            supervisor,
+            EventCounter().write_event_value,
+            str(work / f"{mode}.log"),
+            skip_present=False,
+            transcoder=transcoder,
+        )
+        try:
+            started = time.perf_counter()
+            queue.submit(
+                f"https://open.spotify.com/playlist/{mode}",
+                ["--format=mp3"],
+                str(work / mode),
+            )
+            while any(job.active for job in queue.jobs):
+                time.sleep(0.01)
+            result[f"{mode}_seconds"] = time.perf_counter() - started
+        finally:
+            supervisor.close()
+            if transcoder is not None:
+                transcoder.close()
+    result["speedup"] = result["inline_seconds"] / result["pipeline_seconds"]
+    return result
+
+
+def bench_remux(work: Path, scale: float) -> dict:
+    """
+    CPU seconds saved by remuxing instead of re-encoding to the same format,
+    on a corpus of AAC and Opus files made with FFmpeg's test source.
+    """
+    if find_ffmpeg() is None or find_ffmpeg("ffprobe") is None:
+        return {"skipped": "ffmpeg or ffprobe not found"}
+    files = make_corpus(work / "corpus", max(2, int(20 * scale)))
+    result = {"files": len(files)}
+    for mode in ("encode", "remux"):
+        cpu, started = cpu_time(), time.perf_counter()
+        for path in files:
+            extension = path.suffix[1:]
+            ffmpeg_encode(
+                TranscodeTask(
+                    str(path),
+                    str(work / f"{mode}-{path.name}"),
+                    extension,
+                    bitrate="128k",
+                    copy=mode == "remux",
+                )
+            )
+        result[f"{mode}_cpu_seconds"] = cpu_time() - cpu
+        result[f"{mode}_seconds"] = time.perf_counter() - started
+    result["cpu_seconds_saved"] = (
+        result["encode_cpu_seconds"] - result["remux_cpu_seconds"]
+    )
+    return result
+
+
+def bench_replaygain(work: Path, scale: float) -> dict:
+    """
+    Files per second through the ReplayGain stage: the NumPy meter alone on
+    three minutes of noise per file, then decoding, measuring and tagging a
+    corpus, first cold and then again from the cache.
+    """
+    if not LoudnessAnalyzer.available():
+        return {"skipped": "NumPy is not installed"}
+    count = max(2, int(20 * scale))
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        started = time.perf_counter()
+        list(pool.map(meter_noise, range(count)))
+        elapsed = time.perf_counter() - started
+    result = {
+        "files": count,
+        "workers": workers,
+        "meter_files_per_second": count / elapsed,
+    }
+    if find_ffmpeg() is None:
+        result["skipped"] = "ffmpeg not found, corpus not measured"
+        return result
+
+    paths = [str(path) for path in make_corpus(work / "replaygain", count)]
+    analyzer = LoudnessAnalyzer(work / "loudness.sqlite3", workers)
+    try:
+        for mode in ("cold", "cached"):
+            started = time.perf_counter()
+            asyncio.run(analyzer.analyze_all(paths))
+            elapsed = time.perf_counter() - started
+            result[f"{mode}_files_per_second"] = count / elapsed
+    finally:
+        analyzer.close()
+    return result
+
+
+def bench_library_scan(work: Path, scale: float) -> dict:
+    """
+    ``TrackIndex`` over a synthetic output directory of 50k empty audio files
+    in artist/album folders: a cold scan, a rescan with nothing changed, a
+    rescan after one album in a hundred got a new track, and the lookup of a
+    playlist of a thousand songs.
+    """
+    root = work / "library"
+    count = int(50000 * scale)
+    per_album = 10
+    for number in range(count):
+        artist, album = divmod(number // per_album, 20)
+        folder = root / f"Artist {artist}" / f"Album {album}"
+        if number % per_album == 0:
+            folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"Artist {artist} - Title {number}.mp3").touch()
+
+    index = TrackIndex(str(root), work / "index")
+    started = time.perf_counter()
+    scanned = index.refresh()
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    unchanged = TrackIndex(str(root), work / "index").refresh()
+    warm = time.perf_counter() - started
+
+    albums = sorted({path.parent for path in root.glob("*/*/*.mp3")})
+    for album in albums[::100]:
+        (album / f"{album.parent.name} - New.mp3").touch()
+    started = time.perf_counter()
+    rescanned = index.refresh()
+    incremental = time.perf_counter() - started
+
+    songs = [
+        {"name": f"Title {number}", "artists": [f"Artist {number // 200}"]}
+        for number in range(0, 2 * count, max(1, 2 * count // 1000))
+    ]
+    started = time.perf_counter()
+    missing = index.missing(songs, "mp3")
+    lookup = time.perf_counter() - started
+    return {
+        "files": len(index),
+        "cold_seconds": cold,
+        "cold_files_per_second": scanned / cold,
+        "unchanged_seconds": warm,
+        "unchanged_files_read": unchanged,
+        "incremental_seconds": incremental,
+        "incremental_files_read": rescanned,
+        "lookup_songs": len(songs),
+        "lookup_missing": len(missing),
+        "lookup_ms": lookup * 1000,
+    }
+
+
+def bench_log_tail(work: Path, scale: float) -> dict:
+    """
+    Cost of one refresh of the log view as the log grows: ``LogTail``
+    reading what was appended, against re-reading the whole file as the GUI
+    used to.
+    """
+    path = work / "tail.log"
+    tail = LogTail(str(path))
+    line = '[#1] 1. Downloaded "Artist - Song": https://music.youtube.com/watch?v=x\n'
+    refreshes = int(1000 * scale)
+    tail_times, full_times = [], []
+    with open(path, "w", encoding="utf-8") as file:
+        for _ in range(refreshes):
+            file.write(line * 100)
+            file.flush()
+            started = time.perf_counter()
+            while tail.read()[0]:
+                pass
+            tail_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            with open(path, encoding="utf-8") as log:
+                log.read()
+            full_times.append(time.perf_counter() - started)
+
+    def tenths(times: list, prefix: str) -> dict:
+        tenth = max(1, len(times) // 10)
+        return {
+            f"{prefix}_first_tenth_ms": statistics.fmean(times[:tenth]) * 1000,
+            f"{prefix}_last_tenth_ms": statistics.fmean(times[-tenth:]) * 1000,
+        }
+
+    return {
+        "refreshes": refreshes,
+        "log_lines": refreshes * 100,
+        **tenths(tail_times, "tail"),
+        **tenths(full_times, "full_read"),
+    }
+
+
+def bench_log_refresh(work: Path, scale: float) -> dict:
+    """Cost of one GUI log refresh (``LogTail`` plus ``LogBuffer``) as the log grows."""
+    import tracemalloc
+
+    path = work / "refresh.log"
+    tail, buffer = LogTail(str(path)), LogBuffer(str(path))
+    line = '[#1] 1. Downloaded "Artist - Song": https://music.youtube.com/watch?v=x\n'
+    refreshes = int(2000 * scale)
+    times = []
+    tracemalloc.start()
+    with open(path, "w", encoding="utf-8") as file:
+        for _ in range(refreshes):
+            file.write(line * 100)
+            file.flush()
+            started = time.perf_counter()
+            while True:
+                text, reset = tail.read()
+                if reset:
+                    buffer.clear()
+                if not text:
+                    break
+                buffer.append(text)
+            times.append(time.perf_counter() - started)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "refreshes": refreshes,
+        "log_lines": refreshes * 100,
+        "mean_ms": statistics.fmean(times) * 1000,
+        "p95_ms": sorted(times)[int(len(times) * 0.95)] * 1000,
+        "first_tenth_mean_ms": statistics.fmean(times[: len(times) // 10]) * 1000,
+        "last_tenth_mean_ms": statistics.fmean(times[-len(times) // 10 :]) * 1000,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def bench_idle_cpu(work: Path, scale: float) -> dict:
+    """
+    CPU used by the supervisor and an empty queue while nothing happens;
+    ``gui_idle_cpu`` measures the whole app with its window.
+    """
+    supervisor = ProcessSupervisor()
+    DownloadQueue(supervisor, EventCounter().write_event_value, str(work / "idle.log"))
+    seconds = max(1.0, 3 * scale)
+    try:
+        cpu, wall = time.process_time(), time.perf_counter()
+        time.sleep(seconds)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    finally:
+        supervisor.close()
+    return {"seconds": wall, "cpu_seconds": cpu, "cpu_percent": 100 * cpu / wall}
+
+
+def bench_first_frame(work: Path, scale: float) -> dict:
+    """
+    Time from starting ``main.py`` in a fresh interpreter to its window
+    being on screen, against the 500 ms target.  The first run has no probe
+    cache yet; the dependency check runs in the background either way.
+    """
+    runs = max(3, int(10 * scale))
+    times = []
+    for _ in range(runs):
+        try:
+            started, result = run_app(work, FIRST_FRAME)
+        except RuntimeError as e:
+            return {"skipped": str(e)}
+        times.append(result["shown"] - started)
+    first, times = times[0], sorted(times)
+    return {
+        "runs": runs,
+        "first_run_ms": first * 1000,
+        "p50_ms": times[len(times) // 2] * 1000,
+        "max_ms": times[-1] * 1000,
+        "runs_under_500_ms": sum(1 for seconds in times if seconds < 0.5),
+    }
+
+
+def bench_gui_idle_cpu(work: Path, scale: float) -> dict:
+    """
+    CPU used by the whole app while its window sits idle: the main loop
+    blocking in ``window.read()``, compared with the ``window.read(1)`` busy
+    poll it replaced.
+    """
+    seconds = max(1.0, 5 * scale)
+    try:
+        _started, result = run_app(work, IDLE_CPU, str(seconds))
+    except RuntimeError as e:
+        return {"skipped": str(e)}
+    return {
+        "seconds": seconds,
+        "blocking_cpu_percent": result["blocking"],
+        "polling_cpu_percent": result["polling"],
+    }
+
+
+def bench_gui_event_latency(work: Path, scale: float) -> dict:
+    """
+    Time from ``write_event_value`` on a worker thread to ``window.read``
+    returning it, with every event appending a line to a Multiline.
+    """
+    import PySimpleGUI as sg
+
+    try:
+        window = sg.Window("benchmark", [[sg.Multiline(key="OUTPUT", size=(80, 20))]])
+        window.finalize()
+    except Exception as e:  # tkinter.TclError without a display
+        return {"skipped": str(e).splitlines()[0]}
+
+    count = int(500 * scale)
+    sent: Dict[int, float] = {}
+
+    def producer() -> None:
+        for number in range(count):
+            sent[number] = time.perf_counter()
+            window.write_event_value("-bench-", number)
+            time.sleep(0.002)
+
+    latencies = []
+    threading.Thread(target=producer, daemon=True).start()
+    while len(latencies) < count:
+        event, values = window.read(timeout=1000)
+        if event == "-bench-":
+            latencies.append(time.perf_counter() - sent[values[event]])
+            window["OUTPUT"].update(f"event {values[event]}\n", append=True)
+        elif event in (sg.WIN_CLOSED, sg.TIMEOUT_KEY):
+            break
+    window.close()
+    if not latencies:
+        return {"skipped": "no events arrived"}
+    latencies.sort()
+    return {
+        "events": len(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+BENCHMARKS: Dict[str, Callable[[Path, float], dict]] = {
+    "exec_command": bench_exec_command,
+    "download_queue": bench_download_queue,
+    "spotdl_output": bench_spotdl_output,
+    "spawn_latency": bench_spawn_latency,
+    "transcode_pipeline": bench_transcode_pipeline,
+    "remux": bench_remux,
+    "replaygain": bench_replaygain,
+    "library_scan": bench_library_scan,
+    "log_tail": bench_log_tail,
+    "log_refresh": bench_log_refresh,
+    "idle_cpu": bench_idle_cpu,
+    "first_frame": bench_first_frame,
+    "gui_idle_cpu": bench_gui_idle_cpu,
+    "gui_event_latency": bench_gui_event_latency,
+}
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('date')}):")
+    for name, metrics in results["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name, {})
+        for metric, value in metrics.items():
+            before = old.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(
+                before, (int, float)
+            ):
+                continue
+            change = (value - before) / before * 100 if before else 0.0
+            print(f"  {name}.{metric}: {before:.4g} -> {value:.4g} ({change:+.1f}%)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", metavar="FILE", help="Earlier results file.")
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Run every benchmark at a tenth of its size.",
+    )
+    parser.add_argument(
+        "--only", action="append", choices=sorted(BENCHMARKS), help="Run only these."
+    )
+    args = parser.parse_args(argv)
+    scale = 0.1 if args.quick else 1.0
+
+    results = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="spotifydl-bench-") as temp:
+        work = Path(temp)
+        install(work / "bin")
+        for name in args.only or BENCHMARKS:
+            print(f"{name}...", end=" ", flush=True)
+            result = BENCHMARKS[name](work, scale)
+            results["benchmarks"][name] = result
+            print(
+                ", ".join(
+                    f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                    for k, v in result.items()
+                )
+            )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
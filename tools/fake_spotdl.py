@@ -0,0 +1,192 @@
+"""
+Offline stand-in for the spotdl executable.
+
+Prints what spotdl 4.x prints for a playlist download, without touching the
+network, so the app can be benchmarked and tried out offline.  It understands
+the calls the app makes:
+
+    fake_spotdl.py <url or .spotdl file> [--output=DIR] [--threads=N] ...
+    fake_spotdl.py save <url> --save-file FILE
+    fake_spotdl.py --download-ffmpeg | --version
+
+``benchmark.install`` puts it on the PATH as ``spotdl``.  The run is shaped by
+environment variables:
+
+    FAKE_SPOTDL_SONGS   tracks in every playlist (default 50)
+    FAKE_SPOTDL_RATE    tracks finished per second, 0 for no delay (default 20)
+    FAKE_SPOTDL_SKIP    share of tracks reported as already present (default 0.05)
+    FAKE_SPOTDL_FAIL    share of tracks that fail (default 0.02)
+    FAKE_SPOTDL_NOISE   yt-dlp progress lines on stderr per track (default 3)
+    FAKE_SPOTDL_SEED    random seed, so runs are reproducible (default 0)
+    FAKE_SPOTDL_ENCODE  CPU seconds spent converting each downloaded track,
+                        unless run with --bitrate disable (default 0)
+
+With ``--output`` an empty audio file is written for every downloaded track,
+so skipping tracks that are already present can be exercised as well.  The
+output may be a folder or a template using ``{artists}``, ``{title}``,
+``{track-id}`` and ``{output-ext}``.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+FORMATS = ("mp3", "flac", "ogg", "opus", "m4a", "wav")
+
+
+def _setting(name: str, default: float) -> float:
+    return float(os.environ.get(f"FAKE_SPOTDL_{name}", default))
+
+
+def _option(argv, flag: str, default=None):
+    for i, arg in enumerate(argv):
+        if arg.startswith(flag + "="):
+            return arg.split("=", 1)[1]
+        if arg == flag and i + 1 < len(argv):
+            return argv[i + 1]
+    return default
+
+
+def burn(seconds: float) -> None:
+    """Keeps a core busy for ``seconds`` of CPU time, like an encoder would."""
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def playlist(url: str, count: int) -> list:
+    """Returns the tracks of a playlist in spotdl's save file format."""
+    playlist_id = zlib.crc32(url.encode("utf-8"))
+    return [
+        {
+            "name": f"Song {number}",
+            "artist": f"Artist {playlist_id % 97}",
+            "artists": [f"Artist {playlist_id % 97}"],
+            "album_name": f"Album {playlist_id}",
+            "duration": 180 + number % 120,
+            "song_id": f"{playlist_id:08x}{number:06d}",
+            "url": f"https://open.spotify.com/track/{playlist_id:08x}{number:06d}",
+        }
+        for number in range(1, count + 1)
+    ]
+
+
+def save(argv) -> int:
+    url = argv[1]
+    path = _option(argv, "--save-file")
+    songs = playlist(url, int(_setting("SONGS", 50)))
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(songs, file)
+    print(f"Found {len(songs)} songs in Fake Playlist (Playlist)")
+    print(f"Saved {len(songs)} songs to {path}")
+    return 0
+
+
+def output_path(output: str, song: dict, extension: str) -> str:
+    if "{" not in output:
+        output = os.path.join(output, "{artists} - {title}.{output-ext}")
+    for field, value in (
+        ("{artists}", ", ".join(song.get("artists") or [song["artist"]])),
+        ("{title}", song["name"]),
+        ("{track-id}", song.get("song_id", "")),
+        ("{output-ext}", extension),
+    ):
+        output = output.replace(field, value)
+    return output
+
+
+def download(argv) -> int:
+    query = argv[0]
+    listed = query.endswith(".spotdl")
+    if listed:
+        with open(query, encoding="utf-8") as file:
+            songs = json.load(file)
+    else:
+        songs = playlist(query, int(_setting("SONGS", 50)))
+    rate = _setting("RATE", 20)
+    skip = _setting("SKIP", 0.05)
+    fail = _setting("FAIL", 0.02)
+    noise = int(_setting("NOISE", 3))
+    encode = _setting("ENCODE", 0)
+    if _option(argv, "--bitrate") == "disable":
+        encode = 0
+    rng = random.Random(_setting("SEED", 0))
+    output = _option(argv, "--output")
+    extension = _option(argv, "--format", "mp3")
+    if extension not in FORMATS:
+        extension = "mp3"
+
+    if not listed:  # like spotdl, which only logs it for URLs it resolved
+        print(f"Found {len(songs)} songs in Fake Playlist (Playlist)", flush=True)
+    started = time.monotonic()
+    for number, song in enumerate(songs, 1):
+        name = f"{song['artist']} - {song['name']}"
+        video = f"https://music.youtube.com/watch?v={rng.getrandbits(40):010x}"
+        video = song.get("download_url") or video  # no search, as in spotdl
+        for step in range(noise):
+            print(
+                f"[download] {100 * (step + 1) / noise:5.1f}% of 3.52MiB "
+                f"at 1.21MiB/s ETA 00:0{noise - step}",
+                file=sys.stderr,
+            )
+        roll = rng.random()
+        if roll < fail / 2:
+            print(f"LookupError: No results found for song: {name}")
+        elif roll < fail:
+            print(f"AudioProviderError: YT-DLP download error - {video}")
+            print(f"Failed to download {name}", file=sys.stderr)
+        elif roll < fail + skip:
+            print(f"Skipping {name} (file already exists) (duplicate)")
+        else:
+            if rng.random() < 0.1:
+                print(f"No lyrics found for song: {name}")
+            if encode > 0:
+                # Converting holds this track's thread up, as in spotdl
+                converting = time.monotonic()
+                burn(encode)
+                started += time.monotonic() - converting
+            if output:  # in place before the track is reported, as in spotdl
+                path = output_path(output, song, extension)
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                open(path, "wb").close()
+            print(f'Downloaded "{name}": {video}')
+        sys.stdout.flush()
+        if rate > 0:
+            # Keep to the schedule instead of sleeping a fixed time per track
+            delay = started + number / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    return 0
+
+
+def main(argv) -> int:
+    if not argv:
+        print("usage: spotdl [operation] <query> [options]", file=sys.stderr)
+        return 2
+    if argv[0] == "--version":
+        print("4.2.5 (fake)")
+        return 0
+    if argv[0] == "--download-ffmpeg":
+        print(
+            "FFmpeg is already installed. Do you want to overwrite it? (y/N): ",
+            end="",
+            flush=True,
+        )
+        if sys.stdin.readline().strip().lower() != "y":
+            print("\nNot overwriting FFmpeg")
+            return 0
+        print("\nFFmpeg downloaded successfully (fake)")
+        return 0
+    if argv[0] == "save":
+        return save(argv)
+    return download(argv)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        sys.exit(130)
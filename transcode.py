@@ -0,0 +1,329 @@
+"""
+Transcode stage that runs FFmpeg apart from the downloads.
+
+Normally every spotdl thread downloads a track and then converts it to the
+chosen format itself, so a track's network and CPU work run back to back.  In
+pipeline mode the download queue has spotdl keep the provider's own stream
+(``--bitrate disable`` makes spotdl move or copy the file instead of encoding
+it) and hands each finished file to a ``Transcoder``:
+
+* tasks wait in a bounded ``asyncio.Queue`` on the supervisor loop; when it
+  is full, the download queue stops reading spotdl's output, which in turn
+  stalls spotdl until the encoders catch up;
+* encoding runs in a ``ProcessPoolExecutor`` with one worker per core, so it
+  overlaps with the downloads and never blocks the supervisor loop.
+
+Before encoding, the source is probed with ffprobe.  When its codec is the
+one the target format holds anyway (AAC for m4a, Opus for opus), the stream
+is copied into the target container instead of encoded again at the chosen
+bitrate, which costs a fraction of the CPU and no quality.  FFmpeg arguments
+set by the user always force an encode, since they may filter the audio.
+
+The encoder and the prober are picklable callables; the defaults run FFmpeg
+and ffprobe, and tests can pass stubs that only write the target file.
+FFmpeg is looked for where spotdl looks for it, so the copy installed by
+``spotdl --download-ffmpeg`` is used as well; when there is none the queue
+leaves the conversion to spotdl.
+"""
+
+import asyncio
+import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from supervisor import resolve_executable
+
+# Codec arguments of every output format, as spotdl uses them
+ENCODERS = {
+    "mp3": ["-codec:a", "libmp3lame"],
+    "flac": ["-codec:a", "flac", "-sample_fmt", "s16"],
+    "ogg": ["-codec:a", "libvorbis"],
+    "opus": ["-codec:a", "libopus"],
+    "m4a": ["-codec:a", "aac"],
+    "wav": ["-codec:a", "pcm_s16le"],
+}
+
+# FFmpeg muxer of every output format, given explicitly because the file is
+# written under a temporary name first
+MUXERS = {
+    "mp3": "mp3",
+    "flac": "flac",
+    "ogg": "ogg",
+    "opus": "opus",
+    "m4a": "ipod",
+    "wav": "wav",
+}
+
+# Codec of the source that a format can take without encoding
+COPYABLE_CODECS = {
+    "mp3": "mp3",
+    "flac": "flac",
+    "ogg": "vorbis",
+    "opus": "opus",
+    "m4a": "aac",
+}
+
+# Formats whose container keeps the cover art as an attached picture stream
+COVER_FORMATS = ("mp3", "flac", "m4a")
+
+
+def find_ffmpeg(program: str = "ffmpeg") -> Optional[str]:
+    """
+    Returns the path of FFmpeg (or ffprobe) the way spotdl finds it: on the
+    PATH, else in spotdl's own folder, where ``spotdl --download-ffmpeg``
+    installs it.  None if it is in neither.
+    """
+    path = resolve_executable(program)
+    if path != program:
+        return path
+    name = program + (".exe" if os.name == "nt" else "")
+    home = Path.home()
+    for folder in (home / ".config" / "spotdl", home / ".spotdl"):
+        if (folder / name).is_file():
+            return str(folder / name)
+    return None
+
+
+def native_format(target: str) -> str:
+    """
+    Returns the format spotdl downloads in for a target format: YouTube's
+    Opus stream for Ogg targets, its AAC stream for everything else.  Either
+    is saved by spotdl without encoding when the bitrate is disabled.
+    """
+    return "opus" if target in ("opus", "ogg") else "m4a"
+
+
+def file_name(song: dict, extension: str) -> str:
+    """
+    Returns the file name spotdl gives a ``.spotdl`` song with its default
+    ``{artists} - {title}.{output-ext}`` template.
+    """
+    artists = ", ".join(song.get("artists") or [song.get("artist", "")])
+    name = f"{artists} - {song.get('name', '')}"
+    name = "".join(char for char in name if char not in "/?\\*|<>")
+    name = " ".join(name.split()).replace('"', "'").replace(":", "-")
+    return f"{name}.{extension}"
+
+
+def split_options(options: List[str]) -> Tuple[List[str], dict]:
+    """
+    Splits the spotdl arguments of a job into those that are not about
+    encoding and the ``format``, ``bitrate`` and ``ffmpeg_args`` values.
+    """
+    flags = {
+        "--format=": "format",
+        "--bitrate=": "bitrate",
+        "--ffmpeg-args=": "ffmpeg_args",
+    }
+    rest, encoding = [], {"format": "mp3", "bitrate": "", "ffmpeg_args": ""}
+    for option in options:
+        for flag, name in flags.items():
+            if option.startswith(flag):
+                encoding[name] = option[len(flag) :]
+                break
+        else:
+            rest.append(option)
+    return rest, encoding
+
+
+@dataclass(frozen=True)
+class TranscodeTask:
+    source: str
+    target: str
+    format: str
+    bitrate: str = ""
+    ffmpeg_args: str = ""
+    copy: bool = False  # remux the audio stream instead of encoding it
+
+
+@dataclass(frozen=True)
+class Conversion:
+    """What was done with a ``TranscodeTask``, as its future's result."""
+
+    codec: Optional[str]
+    copied: bool
+    seconds: float
+    cpu_seconds: float
+
+
+def ffmpeg_command(task: TranscodeTask, output: str) -> List[str]:
+    """Returns the FFmpeg command line that encodes or remuxes ``task`` to ``output``."""
+    argv = [find_ffmpeg() or "ffmpeg", "-nostdin", "-y", "-v", "error"]
+    argv += ["-i", task.source, "-map", "0:a"]
+    if task.format in COVER_FORMATS:
+        argv += ["-map", "0:v?", "-c:v", "copy"]
+    # Ogg keeps the tags on the audio stream, MP4 on the container
+    source_tags = "0:s:a:0" if task.source.endswith((".opus", ".ogg")) else "0"
+    argv += ["-map_metadata", source_tags]
+    if task.copy:
+        argv += ["-codec:a", "copy"]
+    else:
+        argv += ENCODERS[task.format]
+        if task.bitrate and task.bitrate not in ("auto", "disable"):
+            quality = task.bitrate.isdigit()
+            argv += ["-q:a" if quality else "-b:a", task.bitrate]
+    if task.format == "mp3":
+        argv += ["-id3v2_version", "3"]
+    elif task.format == "m4a":
+        argv += ["-movflags", "+faststart"]
+    argv += shlex.split(task.ffmpeg_args)
+    return argv + ["-f", MUXERS[task.format], output]
+
+
+def ffmpeg_encode(task: TranscodeTask) -> None:
+    """Encodes or remuxes ``task.source`` to ``task.target`` with FFmpeg."""
+    partial = task.target + ".part"
+    result = subprocess.run(
+        ffmpeg_command(task, partial),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    if result.returncode != 0:
+        if os.path.exists(partial):
+            os.remove(partial)
+        lines = result.stderr.strip().splitlines() or [f"exit code {result.returncode}"]
+        raise RuntimeError(f"FFmpeg failed: {lines[-1]}")
+    os.replace(partial, task.target)
+
+
+def probe_codec(path: str) -> Optional[str]:
+    """Returns the codec of the first audio stream of a file, None if unknown."""
+    try:
+        result = subprocess.run(
+            [
+                find_ffmpeg("ffprobe") or "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "a:0",
+                "-show_entries",
+                "stream=codec_name",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            errors="replace",
+        )
+    except OSError:
+        return None  # no ffprobe, so always encode
+    codec = result.stdout.strip()
+    return codec if result.returncode == 0 and codec else None
+
+
+def cpu_time() -> float:
+    """CPU seconds used by this process and its finished children (FFmpeg)."""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def _transcode(
+    encoder: Callable[[TranscodeTask], None],
+    prober: Optional[Callable[[str], Optional[str]]],
+    task: TranscodeTask,
+) -> Conversion:
+    # Runs in a pool process
+    started, cpu = time.perf_counter(), cpu_time()
+    directory = os.path.dirname(task.target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    codec = prober(task.source) if prober is not None else None
+    copy = codec is not None and codec == COPYABLE_CODECS.get(task.format)
+    copy = copy and not task.ffmpeg_args
+    encoder(replace(task, copy=copy))
+    os.remove(task.source)
+    return Conversion(codec, copy, time.perf_counter() - started, cpu_time() - cpu)
+
+
+class Transcoder:
+    """A bounded queue of ``TranscodeTask`` drained by a process pool."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        encoder: Callable[[TranscodeTask], None] = ffmpeg_encode,
+        prober: Optional[Callable[[str], Optional[str]]] = probe_codec,
+    ):
+        """
+        :param workers: (int, optional) Encodes run at once; the number of
+            cores by default.
+        :param queue_size: (int, optional) Tasks waiting for a worker before
+            ``put`` blocks; twice the number of workers by default.
+        :param encoder: (callable) Picklable function that writes
+            ``task.target`` from ``task.source`` and raises on failure;
+            ``task.copy`` asks it to copy the audio stream.
+        :param prober: (callable, optional) Picklable function returning the
+            audio codec of a file, or None to always encode.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 2 * self.workers
+        self.encoder = encoder
+        self.prober = prober
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Task] = []
+
+    def available(self) -> bool:
+        """Returns False when the encoder needs FFmpeg and it cannot be found."""
+        return self.encoder is not ffmpeg_encode or find_ffmpeg() is not None
+
+    def _start(self) -> None:
+        # The pool and the queue are created on first use, on the loop
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._queue = asyncio.Queue(self.queue_size)
+        self._consumers = [
+            asyncio.ensure_future(self._consume()) for _ in range(self.workers)
+        ]
+
+    async def put(self, task: TranscodeTask) -> asyncio.Future:
+        """
+        Queues a task, waiting while the queue is full.  Must be awaited on
+        the loop the transcoder is used from.
+
+        :return: (asyncio.Future) Resolves to a ``Conversion`` once the task
+            is done, or raises its error.  Cancel it to drop the task.
+        """
+        if self._queue is None:
+            self._start()
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((task, done))
+        return done
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            task, done = await self._queue.get()
+            try:
+                if done.cancelled():
+                    continue  # the job was stopped while the task waited
+                try:
+                    conversion = await loop.run_in_executor(
+                        self._pool, _transcode, self.encoder, self.prober, task
+                    )
+                except Exception as e:
+                    if not done.done():
+                        done.set_exception(e)
+                else:
+                    if not done.done():
+                        done.set_result(conversion)
+            finally:
+                self._queue.task_done()
+
+    def close(self) -> None:
+        """
+        Shuts the pool down without waiting for queued encodes; call it after
+        ``ProcessSupervisor.close``, which cancels the consumers.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)